@@ -0,0 +1,244 @@
+import argparse
+import datetime
+import json
+import os
+import subprocess
+import sys
+import time
+import cv2
+import numpy as np
+
+from floating_image_detector import FloatingImageDetector
+from screen_capture import IMAGE_EXTENSIONS, SyntheticCapture
+from template_matching import FFTMatcher
+
+# 存放"未检测"样本的文件夹名称
+NONE_LABELS = ("none", "未检测")
+DEFAULT_FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark", "fixtures")
+
+
+def percentiles(values):
+    """计算耗时分布（毫秒）"""
+    if not values:
+        return {"count": 0}
+    data = np.asarray(values, dtype=np.float64)
+    return {
+        "count": int(data.size),
+        "mean": round(float(data.mean()), 3),
+        "p50": round(float(np.percentile(data, 50)), 3),
+        "p90": round(float(np.percentile(data, 90)), 3),
+        "p99": round(float(np.percentile(data, 99)), 3),
+        "max": round(float(data.max()), 3),
+    }
+
+
+def load_fixtures(fixtures_dir):
+    """读取录制的屏幕截图，返回[(期望界面名称, 文件路径, 灰度图), ...]
+
+    目录结构为 fixtures_dir/<界面名称>/*.png，界面名称为 none 或 未检测 的文件夹表示没有可识别的界面。
+    """
+    fixtures = []
+    for label in sorted(os.listdir(fixtures_dir)):
+        label_dir = os.path.join(fixtures_dir, label)
+        if not os.path.isdir(label_dir):
+            continue
+        expected = "未检测" if label in NONE_LABELS else label
+        for filename in sorted(os.listdir(label_dir)):
+            if not filename.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            path = os.path.join(label_dir, filename)
+            gray = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+            if gray is None:
+                print(f"无法读取样本: {path}")
+                continue
+            fixtures.append((expected, path, gray))
+    return fixtures
+
+
+def generate_fixtures(detector, fixtures_dir, count, size=(1080, 1920), seed=0):
+    """用参考图像合成样本截图：每种界面类型把其所有参考图像贴到随机背景上"""
+    synthetic = SyntheticCapture(size=size, seed=seed)
+    jobs = [(name, templates) for name, templates in detector._source_reference_images.items()]
+    jobs.append(("none", []))
+    for label, templates in jobs:
+        label_dir = os.path.join(fixtures_dir, label)
+        os.makedirs(label_dir, exist_ok=True)
+        for index in range(count):
+            # 模板按实际宽度放置，互不重叠
+            screen = synthetic.random_scene(templates)
+            cv2.imwrite(os.path.join(label_dir, f"synthetic_{index:03d}.png"), screen)
+    print(f"已在 {fixtures_dir} 生成 {len(jobs) * count} 张合成样本")
+
+
+def git_revision():
+    """获取当前提交哈希，便于比较不同提交之间的结果"""
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+def run_benchmark(detector, fixtures, repeat=3, warm=False):
+    """逐帧回放样本并统计分类耗时、单模板耗时和准确率
+
+    Args:
+        detector: 无界面模式的FloatingImageDetector
+        fixtures: load_fixtures()的返回值
+        repeat: 每张样本回放的次数
+        warm: 为True时保留跨帧状态（ROI、画面变化门控），模拟实时检测；
+              为False时每帧前清除状态，测量完整分类的耗时
+    """
+    frame_latencies = []
+    template_latencies = {}
+    per_label = {}
+    correct = total = 0
+    misclassified = []
+    for _ in range(repeat):
+        for expected, path, gray in fixtures:
+            if not warm:
+                detector.reset_detection_state()
+            started = time.perf_counter()
+            screen_gray = detector.preprocess_frame(gray)
+            result = detector.classify_frame(screen_gray)
+            frame_latencies.append((time.perf_counter() - started) * 1000)
+            for key, (elapsed_ms, _, _) in detector.last_template_timings.items():
+                template_latencies.setdefault(detector.template_name(key), []).append(elapsed_ms)
+
+            stats = per_label.setdefault(expected, {"total": 0, "correct": 0, "predicted": {}})
+            stats["total"] += 1
+            stats["predicted"][result] = stats["predicted"].get(result, 0) + 1
+            total += 1
+            if result == expected:
+                correct += 1
+                stats["correct"] += 1
+            elif len(misclassified) < 50:
+                misclassified.append({"fixture": path, "expected": expected, "predicted": result})
+
+    return {
+        "frames": total,
+        "latency_ms": percentiles(frame_latencies),
+        "per_template_ms": {name: percentiles(values) for name, values in sorted(template_latencies.items())},
+        "accuracy": round(correct / total, 4) if total else None,
+        "per_label": {label: dict(stats, accuracy=round(stats["correct"] / stats["total"], 4))
+                      for label, stats in sorted(per_label.items())},
+        "misclassified": misclassified,
+    }
+
+
+def downsample_report(runs):
+    """汇总不同降采样倍数的准确率和耗时
+
+    Args:
+        runs: [(降采样倍数, run_benchmark()的结果), ...]，加速比相对第一项计算
+
+    Returns:
+        list: 每个倍数一行的字典
+    """
+    baseline = runs[0][1]["latency_ms"].get("mean")
+    rows = []
+    for factor, result in runs:
+        latency = result["latency_ms"]
+        rows.append({
+            "downsample": factor,
+            "accuracy": result["accuracy"],
+            "mean_ms": latency.get("mean"),
+            "p50_ms": latency.get("p50"),
+            "p90_ms": latency.get("p90"),
+            "speedup": round(baseline / latency["mean"], 3) if baseline and latency.get("mean") else None,
+            "misclassified": result["frames"] - round((result["accuracy"] or 0) * result["frames"]),
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="界面检测性能基准测试（无需显示器）")
+    parser.add_argument("fixtures", nargs="?", default=DEFAULT_FIXTURES_DIR,
+                        help="样本截图目录，结构为 <目录>/<界面名称>/*.png")
+    parser.add_argument("--repeat", type=int, default=3, help="每张样本回放次数")
+    parser.add_argument("--warm", action="store_true", help="保留跨帧状态，模拟连续的实时检测")
+    parser.add_argument("--workers", type=int, default=None, help="模板匹配线程数，默认与检测器一致")
+    parser.add_argument("--no-gating", action="store_true", help="关闭画面变化门控")
+    parser.add_argument("--matcher", default="pyramid", choices=["pyramid", "fft"],
+                        help="模板匹配引擎：pyramid（由粗到细的金字塔匹配）或fft（共享屏幕频谱的精确匹配）")
+    parser.add_argument("--downsample", default="1",
+                        help="降采样倍数，逗号分隔时依次测试每个倍数并输出准确率与耗时的对比，例如 1,2,3")
+    parser.add_argument("--output", help="将结果写入JSON文件")
+    parser.add_argument("--generate", type=int, metavar="N",
+                        help="先用参考图像为每种界面合成N张样本截图")
+    args = parser.parse_args()
+
+    # 参考图像路径相对于程序目录
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    detector = FloatingImageDetector(headless=True)
+    detector.scale_search = False
+    if args.workers is not None:
+        detector.match_workers = max(1, args.workers)
+    if args.no_gating:
+        detector.change_gating = False
+    if args.matcher == "fft":
+        detector.matcher = FFTMatcher()
+        detector.scale_calibrator.matcher = detector.matcher
+
+    if args.generate:
+        generate_fixtures(detector, args.fixtures, args.generate)
+    if not os.path.isdir(args.fixtures):
+        print(f"样本目录不存在: {args.fixtures}（可使用 --generate 生成合成样本）")
+        return 1
+    fixtures = load_fixtures(args.fixtures)
+    if not fixtures:
+        print(f"样本目录中没有可用的截图: {args.fixtures}")
+        return 1
+
+    factors = [int(value) for value in args.downsample.split(",") if value.strip()]
+    runs = []
+    try:
+        for factor in factors:
+            detector.set_downsample(factor)
+            runs.append((factor, run_benchmark(detector, fixtures, repeat=args.repeat, warm=args.warm)))
+    finally:
+        detector.stop_detection()
+    # 详细结果以第一个倍数为准，多个倍数时另附对比表
+    report = runs[0][1]
+    report = {
+        "revision": git_revision(),
+        "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "config": {
+            "fixtures": os.path.abspath(args.fixtures),
+            "repeat": args.repeat,
+            "warm": args.warm,
+            "match_workers": detector.match_workers,
+            "change_gating": detector.change_gating,
+            "matcher": args.matcher,
+            "downsample": factors[0],
+        },
+        **report,
+    }
+    if len(runs) > 1:
+        report["downsample_report"] = downsample_report(runs)
+
+    latency = report["latency_ms"]
+    print(f"帧数: {report['frames']}，准确率: {report['accuracy']:.2%}")
+    print(f"单帧耗时(ms): mean={latency['mean']} p50={latency['p50']} p90={latency['p90']} "
+          f"p99={latency['p99']} max={latency['max']}")
+    for name, stats in report["per_template_ms"].items():
+        print(f"  {name}: mean={stats['mean']}ms p90={stats['p90']}ms ({stats['count']}次)")
+
+    if len(runs) > 1:
+        print("\n降采样倍数对比（加速比相对第一个倍数的平均耗时）:")
+        print(f"{'倍数':>4}{'准确率':>8}{'mean':>10}{'p50':>10}{'p90':>10}{'加速比':>7}{'误判':>6}")
+        for row in report["downsample_report"]:
+            print(f"{row['downsample']:>6}{row['accuracy']:>11.2%}{row['mean_ms']:>10.2f}{row['p50_ms']:>10.2f}"
+                  f"{row['p90_ms']:>10.2f}{row['speedup']:>10.2f}{row['misclassified']:>8}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"结果已写入: {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,97 @@
+import cv2
+import numpy as np
+
+
+class FrameChanges:
+    """一帧相对上一帧的变化区域（按图块划分）"""
+
+    def __init__(self, grid, tile_size, frame_shape):
+        """
+        Args:
+            grid: 二维布尔数组，True表示该图块发生了变化；None表示整帧都视为变化
+            tile_size: 图块在原分辨率下的边长（像素）
+            frame_shape: 原分辨率帧的(高, 宽)
+        """
+        self.grid = grid
+        self.tile_size = tile_size
+        self.frame_shape = frame_shape
+        self.bbox = self._compute_bbox()
+
+    @property
+    def everything(self):
+        """是否整帧都视为变化（首帧或分辨率变化）"""
+        return self.grid is None
+
+    @property
+    def is_empty(self):
+        """画面是否完全没有变化"""
+        return self.grid is not None and self.bbox is None
+
+    def _compute_bbox(self):
+        """计算所有变化图块的外接矩形(x0, y0, x1, y1)，没有变化时返回None"""
+        height, width = self.frame_shape
+        if self.grid is None:
+            return (0, 0, width, height)
+        rows = np.flatnonzero(self.grid.any(axis=1))
+        if rows.size == 0:
+            return None
+        cols = np.flatnonzero(self.grid.any(axis=0))
+        tile = self.tile_size
+        return (int(cols[0]) * tile, int(rows[0]) * tile,
+                min(width, (int(cols[-1]) + 1) * tile), min(height, (int(rows[-1]) + 1) * tile))
+
+    def intersects(self, x, y, w, h):
+        """矩形区域(x, y, w, h)是否与任一变化图块相交"""
+        if self.grid is None:
+            return True
+        if self.bbox is None:
+            return False
+        tile = self.tile_size
+        tx0, ty0 = max(0, x // tile), max(0, y // tile)
+        tx1, ty1 = (x + w - 1) // tile, (y + h - 1) // tile
+        return bool(self.grid[ty0:ty1 + 1, tx0:tx1 + 1].any())
+
+
+class FrameChangeDetector:
+    """基于降采样分块绝对差的画面变化检测器
+
+    将每帧缩小downsample倍后与上一帧逐像素求绝对差，再按图块取最大值，
+    超过阈值的图块视为发生变化。整帧比较的开销远小于一次模板匹配。
+    """
+
+    def __init__(self, tile_size=64, downsample=4, threshold=10):
+        """初始化变化检测器
+
+        Args:
+            tile_size: 图块在原分辨率下的边长（像素），需为downsample的整数倍
+            downsample: 比较前的降采样倍数
+            threshold: 图块内最大灰度差超过该值时视为变化
+        """
+        self.tile_size = tile_size
+        self.downsample = downsample
+        self.threshold = threshold
+        self._previous = None
+
+    def reset(self):
+        """清除上一帧，下一帧将视为整帧变化"""
+        self._previous = None
+
+    def update(self, gray):
+        """输入新的一帧灰度图，返回相对上一帧的FrameChanges"""
+        height, width = gray.shape[:2]
+        small = cv2.resize(gray, (max(1, width // self.downsample), max(1, height // self.downsample)),
+                           interpolation=cv2.INTER_AREA)
+        previous = self._previous
+        self._previous = small
+        if previous is None or previous.shape != small.shape:
+            return FrameChanges(None, self.tile_size, (height, width))
+
+        diff = cv2.absdiff(small, previous)
+        # 补齐到图块的整数倍后按图块取最大差值
+        cell = max(1, self.tile_size // self.downsample)
+        rows = -(-diff.shape[0] // cell)
+        cols = -(-diff.shape[1] // cell)
+        padded = np.zeros((rows * cell, cols * cell), dtype=diff.dtype)
+        padded[:diff.shape[0], :diff.shape[1]] = diff
+        tile_max = padded.reshape(rows, cell, cols, cell).max(axis=(1, 3))
+        return FrameChanges(tile_max > self.threshold, cell * self.downsample, (height, width))
@@ -4,12 +4,26 @@ import datetime
 import csv
 import glob
 
+from timetable import Timetable, day_name
+
 class CourseManager:
-    def __init__(self, data_file="courses.json", csv_file="courses.csv"):
-        """初始化课程管理器"""
+    def __init__(self, data_file="courses.json", csv_file="courses.csv", clock=None):
+        """初始化课程管理器
+        
+        Args:
+            data_file: JSON课程数据文件名
+            csv_file: CSV课程数据文件名
+            clock: 返回当前时间（datetime）的可调用对象，用于当前课程、今日课程等查询，None表示datetime.datetime.now
+        """
         self.data_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), data_file)
         self.csv_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), csv_file)
+        self.clock = clock or datetime.datetime.now
+        # 周课表索引（课程变化时失效，下次查询时重新构建）；给courses赋值时自动失效
+        self._timetable = None
         self.courses = []
+        # 课程图标路径缓存（按img/course目录的修改时间失效）
+        self._icon_path_cache = {}
+        self._icon_dir_mtime = None
         # 尝试从CSV加载数据，如果CSV不存在则从JSON加载
         if not self.load_courses_from_csv():
             self.load_courses_from_json()
@@ -17,6 +31,17 @@ class CourseManager:
             if self.courses:
                 self.save_courses_to_csv()
     
+    @property
+    def courses(self):
+        """课程列表"""
+        return self._courses
+    
+    @courses.setter
+    def courses(self, courses):
+        """替换课程列表并使周课表索引失效（原地修改列表后需自行将_timetable置为None）"""
+        self._courses = courses
+        self._timetable = None
+    
     def load_courses_from_json(self):
         """从JSON文件加载课程数据"""
         try:
@@ -37,7 +62,7 @@ class CourseManager:
         """从CSV文件加载课程数据"""
         try:
             if os.path.exists(self.csv_file):
-                self.courses = []
+                courses = []
                 with open(self.csv_file, 'r', encoding='utf-8-sig') as f:
                     reader = csv.DictReader(f)
                     for row in reader:
@@ -53,7 +78,8 @@ class CourseManager:
                         }
                         if "updated_at" in row:
                             course["updated_at"] = row["updated_at"]
-                        self.courses.append(course)
+                        courses.append(course)
+                self.courses = courses
                 print(f"成功从CSV加载 {len(self.courses)} 门课程")
                 return True
             else:
@@ -126,6 +152,7 @@ class CourseManager:
             "created_at": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         }
         self.courses.append(course)
+        self._timetable = None
         return course_id
     
     def update_course(self, course_id, day=None, start_time=None, end_time=None, 
@@ -144,6 +171,7 @@ class CourseManager:
                 if course_name is not None:
                     course["course_name"] = course_name
                 course["updated_at"] = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                self._timetable = None
                 return True
         return False
     
@@ -153,6 +181,13 @@ class CourseManager:
         self.courses = [course for course in self.courses if course["id"] != course_id]
         return len(self.courses) < original_length
     
+    def get_timetable(self):
+        """获取周课表索引（Timetable），课程未变化时返回同一个实例"""
+        timetable = self._timetable
+        if timetable is None:
+            timetable = self._timetable = Timetable(self.courses)
+        return timetable
+    
     def get_all_courses(self):
         """获取所有课程"""
         return self.courses
@@ -170,17 +205,11 @@ class CourseManager:
     
     def get_current_course(self):
         """获取当前时间正在进行的课程"""
-        now = datetime.datetime.now()
-        current_day = "周" + "一二三四五六日"[now.weekday()]
-        current_time = now.strftime("%H:%M")
-        
-        # 查找当前星期几且时间在上课时间范围内的课程
-        for course in self.courses:
-            if course["day"] == current_day:
-                if course["start_time"] <= current_time <= course["end_time"]:
-                    return course
-        
-        return None
+        return self.get_timetable().current_course(self.clock())
+    
+    def get_today_courses(self):
+        """获取今天的所有课程（按开始时间排序）"""
+        return self.get_timetable().courses_on(day_name(self.clock()))
     
     def search_courses(self, keyword):
         """根据关键字搜索课程"""
@@ -208,8 +237,14 @@ class CourseManager:
             # 构建保存目录路径
             icon_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "img", "course")
             
-            if not os.path.exists(icon_dir):
+            # 目录内文件增删会改变目录的修改时间，据此使路径缓存失效
+            try:
+                icon_dir_mtime = os.path.getmtime(icon_dir)
+            except OSError:
                 return None
+            if icon_dir_mtime != self._icon_dir_mtime:
+                self._icon_path_cache = {}
+                self._icon_dir_mtime = icon_dir_mtime
             
             # 清理课程名称（与GUI中的处理方式保持一致）
             import re
@@ -218,6 +253,19 @@ class CourseManager:
             if not sanitized_name:
                 return None
             
+            if sanitized_name in self._icon_path_cache:
+                return self._icon_path_cache[sanitized_name]
+            
+            icon_path = self._find_course_icon(icon_dir, sanitized_name)
+            self._icon_path_cache[sanitized_name] = icon_path
+            return icon_path
+        except Exception as e:
+            print(f"获取课程图标路径时发生错误: {str(e)}")
+            return None
+    
+    def _find_course_icon(self, icon_dir, sanitized_name):
+        """在图标目录中查找课程图标文件，找不到时返回None"""
+        try:
             # 查找匹配的图片文件
             # 尝试不同的图片扩展名
             extensions = ['.png', '.jpg', '.jpeg', '.gif', '.bmp']
@@ -1,6 +1,7 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
 from course_gui import CourseGUI
+from log_viewer import LogViewerFrame
 import os
 import datetime
 
@@ -27,9 +28,10 @@ def main():
     monitor_tab = ttk.Frame(tab_control)
     tab_control.add(monitor_tab, text="监测设置")
     
-    # 创建操作日志标签页（预留）
+    # 创建操作日志标签页：按时间、类别和关键字查询logs文件夹中的日志
     log_tab = ttk.Frame(tab_control)
     tab_control.add(log_tab, text="操作日志")
+    LogViewerFrame(log_tab).pack(fill=tk.BOTH, expand=True)
     
     # 放置标签页控件
     tab_control.pack(expand=1, fill="both")
@@ -1,21 +1,51 @@
-import tkinter as tk
-from tkinter import ttk
-import pyautogui
 import cv2
 import numpy as np
 import os
+import asyncio
 import threading
 import time
-from PIL import Image, ImageTk
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from frame_bus import FrameBus
+from screen_capture import ScreenCapture
+from template_matching import PyramidMatcher
+from scale_calibration import ScaleCalibrator, geometry_key, scale_template
+from change_detection import FrameChangeDetector
+from interface_events import InterfaceEventChannel, TemplateMatch
+from monitor_loop import MonitorLoop, TkBridge
+from polling_policy import AdaptivePolling, load_polling_config
+
+# 单个模板在一帧中的匹配结果：是否匹配、最高分数（None表示未重新匹配，沿用上次的分数）、
+# 匹配后该模板的TemplateMatch（None表示清除上次的位置）、耗时（毫秒）
+# 匹配线程只计算结果，由调用线程统一写回检测器的跨帧状态
+TemplateOutcome = namedtuple("TemplateOutcome", ["matched", "score", "match", "elapsed_ms"])
 
 class FloatingImageDetector:
-    def __init__(self, parent=None, embedded=False):
-        # 如果提供了父窗口且设置为嵌入模式，则不创建新窗口
+    def __init__(self, parent=None, embedded=False, allocation_free=False, headless=False,
+                 monitor_loop=None, ui_bridge=None, capture_backend=None):
+        """
+        Args:
+            parent: 嵌入模式下的父容器
+            embedded: 是否嵌入到其他窗口中
+            allocation_free: 是否复用预分配的截屏缓冲区（仅在使用默认的ScreenCapture时有效）
+            headless: 无界面模式
+            monitor_loop: 共享的MonitorLoop事件循环，None时自行创建
+            ui_bridge: 共享的TkBridge界面更新桥，None时自行创建（无界面模式不需要）
+            capture_backend: 屏幕采集后端（提供grab_gray()、close()和monitor属性），None时使用ScreenCapture
+        """
+        # 无界面模式：不创建任何Tk组件，供基准测试和后台服务直接调用检测逻辑
         self.embedded = embedded
-        if embedded and parent:
+        self.headless = headless
+        if headless:
+            self.root = None
+            self.is_embedded = False
+        # 如果提供了父窗口且设置为嵌入模式，则不创建新窗口
+        elif embedded and parent:
             self.root = parent
             self.is_embedded = True
         else:
+            # 只有独立窗口模式才需要Tk，无界面的检测器和监控引擎不导入tkinter
+            import tkinter as tk
             # 创建主窗口
             self.root = tk.Tk()
             self.root.title("界面检测工具")
@@ -26,21 +56,100 @@ class FloatingImageDetector:
             self.is_embedded = False
         
         # 只有在非嵌入模式下才绑定拖动和退出事件
-        if not self.embedded:
+        if not self.embedded and not headless:
             # 使窗口可拖动
             self.root.bind("<Button-1>", self.start_drag)
             self.root.bind("<B1-Motion>", self.drag)
             self.root.bind("<Escape>", self.exit_program)
         
         # 设置窗口背景
-        self.root.configure(bg="#2c3e50")
+        if not headless:
+            self.root.configure(bg="#2c3e50")
+        
+        # 采集和检测作为协程运行在事件循环中，界面更新通过TkBridge批量交给主线程
+        self.monitor_loop = monitor_loop or MonitorLoop()
+        self._owns_monitor_loop = monitor_loop is None
+        self.ui_bridge = ui_bridge
+        if self.ui_bridge is None and not headless:
+            self.ui_bridge = TkBridge(self.root)
+            self.ui_bridge.start()
         
         # 初始化变量
         self.is_detecting = False
-        self.detection_thread = None
-        self.reference_images = {}  # 改为字典，key为文件夹名称，value为该文件夹下的所有参考图像
+        self.reference_images = {}  # 改为字典，key为文件夹名称，value为该文件夹下的所有参考图像（已按缩放比例调整）
+        self._source_reference_images = {}  # 未缩放的原始参考图像，结构同reference_images
+        self._reference_index = {}  # 已加载参考图像的索引，{文件夹名称: [(文件名, 修改时间), ...]}
+        self._scanned_index = {}  # 最近一次扫描到的全部图片（包括无法解码的），结构同_reference_index
+        self.reload_interval = 2.0  # 检测过程中检查参考图像变化的间隔（秒）
         self.detection_result = "未检测"
         self.current_interface = "未检测"
+        self.last_frame = None  # 最近一次完成分类的帧（Frame，由检测器持有），供点击逻辑复用同一画面
+        self._last_frame_lock = threading.Lock()  # 替换last_frame与点击逻辑取得它的持有互斥
+        self.interface_events = InterfaceEventChannel()  # 界面切换事件，控制逻辑阻塞等待而不是轮询
+        
+        # 持久化采集会话；allocation_free 模式下复用缓冲池中的灰度缓冲区
+        self.screen_capture = capture_backend or ScreenCapture(allocation_free=allocation_free)
+        self._blur_buffer = None  # 检测线程复用的模糊结果缓冲区
+        
+        # 共享帧总线：单一采集协程发布灰度帧，检测与点击逻辑共同使用；
+        # 帧的缓冲区按持有数复用，持有与释放交给采集后端
+        self.frame_bus = FrameBus(self.grab_screen_gray, interval=0.3,
+                                  retain_func=getattr(self.screen_capture, "retain", None),
+                                  release_func=getattr(self.screen_capture, "release", None))
+        
+        # 按当前界面调整采集间隔、要检查的界面类型和搜索区域，None表示每帧检查全部界面
+        self.polling = AdaptivePolling(load_polling_config())
+        self._search_regions = {}  # 本帧各界面类型模板的全屏搜索区域（比例坐标）
+        self.last_scan = None  # 最近一帧的检查范围："unchanged"、"full"、"subset"或"fallback"（子集未命中后补查其余界面）
+        
+        # 由粗到细的金字塔模板匹配引擎
+        self.matcher = PyramidMatcher()
+        
+        # DPI感知的模板缩放：每种显示器几何只做一次多尺度搜索，结果持久化
+        self.scale_search = True  # 是否启用缩放比例搜索
+        self.scale_calibrator = ScaleCalibrator(matcher=self.matcher)
+        self.template_scale = 1.0  # 当前使用的模板缩放比例
+        self._scale_geometry = None  # 当前缩放比例对应的显示器几何
+        self.calibration_interval = 10  # 未校准时每隔多少帧尝试一次校准
+        self._frames_since_calibration = 0
+        # 缩放比例确定后连续revalidate_after帧未识别任何界面时重新校准；校准没有改变比例时等待帧数加倍
+        # （最多revalidate_max_after帧），识别到界面后恢复，避免iClicker关闭期间反复进行多尺度搜索
+        self.revalidate_after = 30
+        self.revalidate_max_after = 3840
+        self._revalidate_threshold = self.revalidate_after
+        self._frames_without_match = 0
+        
+        # 降采样快速路径：屏幕按整数倍区域平均降采样（不再做高斯模糊），模板预先按同样的倍数缩小；1表示原分辨率
+        self.downsample = 1
+        self._downsample_buffer = None  # 检测线程复用的降采样结果缓冲区
+        
+        # 并行模板匹配：cv2.matchTemplate会释放GIL，可在线程池中同时匹配多个模板
+        self.match_workers = max(1, min(8, os.cpu_count() or 1))  # 线程池大小，1表示逐个匹配
+        self._match_executor = None
+        # 正在线程池中执行的截屏和分类调用数；停止检测时仍有调用未结束的，由最后结束的调用释放线程池和采集会话
+        self._work_lock = threading.Lock()
+        self._active_work = 0
+        self._release_pending = False
+        self.interface_results = {}  # 最近一帧各界面类型的匹配结果，{界面名称: 是否匹配}
+        self.on_interface_result = None  # 单个界面类型得出结果时的回调，参数为(界面名称, 是否匹配)
+        
+        # 基于模板上次匹配位置的感兴趣区域（ROI）搜索
+        # key为(界面名称, 模板序号)，value为最近一次成功匹配的TemplateMatch（位置、分数、帧序号）
+        self.template_matches = {}
+        self._current_frame_id = None  # 正在分类的帧序号
+        self.roi_padding = 40  # ROI在模板四周额外扩展的像素数
+        self.full_scan_interval = 10  # 每隔多少帧强制进行一次全屏搜索
+        self._frames_since_full_scan = 0
+        
+        # 画面变化门控：画面未变化时沿用上次结果，局部变化时只重新匹配受影响的模板
+        self.change_gating = True
+        self.change_detector = FrameChangeDetector()
+        self._template_results = {}  # key为(界面名称, 模板序号)，value为上次匹配是否成功
+        self._last_classification = None  # 上一次完整分类的结果
+        self._template_scores = {}  # key为(界面名称, 模板序号)，value为最近一次匹配的最高分数
+        self.last_template_timings = {}  # 最近一帧各模板的匹配耗时，{(界面名称, 模板序号): (耗时毫秒, 是否匹配, 分数)}
+        self.last_stage_timings = {}  # 最近一帧各处理阶段的耗时（毫秒），{"preprocess_ms": ..., "classify_ms": ...}
+        self.telemetry = None  # TelemetryRecorder，设置后每处理一帧写一条结构化记录
         
         # 定义特殊处理的界面名称
         self.special_interfaces = {
@@ -51,6 +160,10 @@ class FloatingImageDetector:
         # 加载参考图像
         self.load_reference_images()
         
+        # 无界面模式到此为止
+        if headless:
+            return
+        
         # 创建界面组件
         self.create_widgets()
         
@@ -72,6 +185,7 @@ class FloatingImageDetector:
     
     def create_widgets(self):
         """创建界面组件，优化显示效果"""
+        import tkinter as tk
         # 创建标题标签
         title_label = tk.Label(
             self.root,
@@ -153,33 +267,8 @@ class FloatingImageDetector:
         try:
             base_dir = "img/test"
             if os.path.exists(base_dir):
-                # 获取base_dir下的所有子文件夹
-                subfolders = [f for f in os.listdir(base_dir) 
-                             if os.path.isdir(os.path.join(base_dir, f))]
-                
-                total_images = 0
-                for folder in subfolders:
-                    folder_path = os.path.join(base_dir, folder)
-                    folder_images = []
-                    
-                    # 加载该文件夹下的所有图片
-                    for filename in os.listdir(folder_path):
-                        if filename.lower().endswith((".png", ".jpg", ".jpeg")):
-                            img_path = os.path.join(folder_path, filename)
-                            try:
-                                # 读取图像并转换为灰度图
-                                img = cv2.imread(img_path, cv2.IMREAD_GRAYSCALE)
-                                if img is not None:
-                                    folder_images.append(img)
-                                    print(f"加载参考图像: {folder}/{filename}")
-                            except Exception as e:
-                                print(f"加载图像 {folder}/{filename} 时出错: {e}")
-                    
-                    if folder_images:
-                        self.reference_images[folder] = folder_images
-                        total_images += len(folder_images)
-                        print(f"文件夹 '{folder}' 加载 {len(folder_images)} 张图像")
-                
+                self._load_reference_index(self._scan_reference_index(base_dir), base_dir, verbose=True)
+                total_images = sum(len(templates) for templates in self._source_reference_images.values())
                 print(f"\n总共加载 {total_images} 张参考图像，来自 {len(self.reference_images)} 个文件夹")
                 print(f"可识别的界面类型: {list(self.reference_images.keys())}")
             else:
@@ -187,97 +276,753 @@ class FloatingImageDetector:
         except Exception as e:
             print(f"加载参考图像时出错: {e}")
     
+    def refresh_reference_images(self):
+        """热加载参考图像：只加载新增或修改过的图片、移除已删除的图片
+        
+        通过比较文件修改时间判断变化；新的参考图像字典构建完成后整体替换，
+        检测过程中不会看到更新到一半的reference_images。
+        
+        Returns:
+            bool: 参考图像是否发生变化
+        """
+        try:
+            base_dir = "img/test"
+            if not os.path.exists(base_dir):
+                return False
+            index = self._scan_reference_index(base_dir)
+            # 与上次扫描结果比较：无法解码的图片只在修改时间变化后重试，不会每次检查都重新加载
+            if index == self._scanned_index:
+                return False
+            changed = self._load_reference_index(index, base_dir, verbose=False)
+            if changed:
+                print(f"参考图像已热加载，变化的界面类型: {sorted(changed)}")
+            return bool(changed)
+        except Exception as e:
+            print(f"热加载参考图像时出错: {e}")
+            return False
+    
+    def _scan_reference_index(self, base_dir):
+        """扫描参考图像目录，返回{文件夹名称: [(文件名, 修改时间), ...]}"""
+        index = {}
+        # 获取base_dir下的所有子文件夹
+        for folder in os.listdir(base_dir):
+            folder_path = os.path.join(base_dir, folder)
+            if not os.path.isdir(folder_path):
+                continue
+            entries = []
+            for filename in os.listdir(folder_path):
+                if filename.lower().endswith((".png", ".jpg", ".jpeg")):
+                    try:
+                        entries.append((filename, os.path.getmtime(os.path.join(folder_path, filename))))
+                    except OSError:
+                        pass
+            index[folder] = entries
+        return index
+    
+    def _load_reference_index(self, index, base_dir, verbose=False):
+        """按扫描结果加载参考图像，未变化的图片直接复用已解码的结果
+        
+        Returns:
+            set: 内容发生变化（新增、修改或删除图片）的界面类型
+        """
+        previous_images = {}
+        for folder, entries in self._reference_index.items():
+            for (filename, mtime), template in zip(entries, self._source_reference_images.get(folder, [])):
+                previous_images[(folder, filename, mtime)] = template
+        
+        sources = {}
+        loaded_index = {}
+        for folder, entries in index.items():
+            folder_images = []
+            loaded_entries = []
+            
+            # 加载该文件夹下的所有图片
+            for filename, mtime in entries:
+                img = previous_images.get((folder, filename, mtime))
+                if img is None:
+                    try:
+                        # 读取图像并转换为灰度图
+                        img = cv2.imread(os.path.join(base_dir, folder, filename), cv2.IMREAD_GRAYSCALE)
+                        if img is not None:
+                            print(f"加载参考图像: {folder}/{filename}")
+                    except Exception as e:
+                        print(f"加载图像 {folder}/{filename} 时出错: {e}")
+                if img is not None:
+                    folder_images.append(img)
+                    loaded_entries.append((filename, mtime))
+            
+            if folder_images:
+                sources[folder] = folder_images
+                loaded_index[folder] = loaded_entries
+                if verbose:
+                    print(f"文件夹 '{folder}' 加载 {len(folder_images)} 张图像")
+        
+        changed = {folder for folder in set(loaded_index) | set(self._reference_index)
+                   if loaded_index.get(folder) != self._reference_index.get(folder)}
+        # _reference_index只记录成功加载的图片；暂时无法解码的图片（如尚未写完）在修改时间变化后重试
+        self._reference_index = {folder: loaded_index.get(folder, []) for folder in index}
+        self._scanned_index = index
+        self._source_reference_images = sources
+        # 按当前缩放比例一次性生成匹配用的模板，并整体替换参考图像字典
+        self.reference_images = self._build_scaled_references(self.template_scale)
+        self.template_matches = {key: match for key, match in self.template_matches.items()
+                                 if key[0] not in changed}
+        self._template_results = {key: matched for key, matched in self._template_results.items()
+                                  if key[0] not in changed}
+        if changed:
+            self._last_classification = None
+        return changed
+    
+    def _build_scaled_references(self, scale):
+        """根据原始参考图像生成按比例缩放（并按降采样倍数缩小）后的参考图像字典"""
+        scale = scale / self.downsample
+        return {folder: [scale_template(template, scale) for template in templates]
+                for folder, templates in self._source_reference_images.items()}
+    
+    def scale_template(self, template):
+        """将外部模板（如课程图标、点击按钮）按当前显示缩放比例调整"""
+        return scale_template(template, self.template_scale)
+    
+    def apply_template_scale(self, scale):
+        """切换模板缩放比例，整体替换参考图像字典并清空过期的ROI位置"""
+        if abs(scale - self.template_scale) < 1e-6:
+            return
+        self.reference_images = self._build_scaled_references(scale)
+        self.template_scale = scale
+        self.template_matches = {}
+        self._template_results = {}
+        self._template_scores = {}
+        self._last_classification = None
+        print(f"模板缩放比例更新为: {scale}")
+    
+    def set_downsample(self, factor):
+        """切换降采样倍数（1表示原分辨率匹配），重新生成模板并清除跨帧状态"""
+        factor = max(1, int(factor))
+        if factor == self.downsample:
+            return
+        self.downsample = factor
+        self._downsample_buffer = None
+        self.reference_images = self._build_scaled_references(self.template_scale)
+        self.reset_detection_state()
+        print(f"检测降采样倍数更新为: {factor}")
+    
+    def update_template_scale(self, screen_gray):
+        """根据当前显示器几何确定模板缩放比例
+        
+        已缓存的几何直接使用缓存的比例；未校准的几何定期在当前帧上进行多尺度搜索，
+        直到屏幕上出现可识别的界面为止。不可靠的结果（只有一个模板勉强匹配）先使用但不缓存，
+        继续校准直到结果可靠；回放和合成画面不读写缓存。
+        """
+        if not self.scale_search:
+            return
+        key = geometry_key(getattr(self.screen_capture, "monitor", None))
+        if key is None:
+            return
+        if key == self._scale_geometry:
+            return
+        live = getattr(self.screen_capture, "live", True)
+        cached_scale = self.scale_calibrator.get_cached_scale(key) if live else None
+        if cached_scale is not None:
+            self.apply_template_scale(cached_scale)
+            self._scale_geometry = key
+            self._frames_without_match = 0
+            self._revalidate_threshold = self.revalidate_after
+            return
+        
+        # 未校准：限制校准频率，避免每帧都进行多尺度搜索
+        run_calibration = self._frames_since_calibration % self.calibration_interval == 0
+        self._frames_since_calibration += 1
+        if not run_calibration:
+            return
+        calibration = self.scale_calibrator.calibrate(screen_gray, self._calibration_templates())
+        if calibration is None:
+            return
+        self.apply_template_scale(calibration.scale)
+        if not self.scale_calibrator.is_reliable(calibration):
+            return
+        print(f"显示器 {key} 校准完成，模板缩放比例: {calibration.scale}")
+        if live:
+            self.scale_calibrator.set_scale(key, calibration.scale)
+        self._scale_geometry = key
+        self._frames_without_match = 0
+        self._revalidate_threshold = self.revalidate_after
+    
+    def revalidate_template_scale(self, screen_gray, interface_name):
+        """缩放比例确定后连续多帧没有识别到任何界面时重新校准（显示缩放可能已改变）
+        
+        只有可靠且与当前比例不同的校准结果才会替换当前比例；屏幕上确实没有可识别界面时保持不变，
+        并把下一次重新校准前的等待帧数加倍，识别到界面后恢复为revalidate_after。
+        """
+        if not self.scale_search or self._scale_geometry is None:
+            return
+        if interface_name != "未检测":
+            self._frames_without_match = 0
+            self._revalidate_threshold = self.revalidate_after
+            return
+        self._frames_without_match += 1
+        if self._frames_without_match < self._revalidate_threshold:
+            return
+        self._frames_without_match = 0
+        calibration = self.scale_calibrator.calibrate(screen_gray, self._calibration_templates())
+        if not self.scale_calibrator.is_reliable(calibration) or abs(calibration.scale - self.template_scale) < 1e-6:
+            self._revalidate_threshold = min(self._revalidate_threshold * 2, self.revalidate_max_after)
+            return
+        print(f"显示器 {self._scale_geometry} 的模板缩放比例已失效，重新校准为: {calibration.scale}")
+        if getattr(self.screen_capture, "live", True):
+            self.scale_calibrator.set_scale(self._scale_geometry, calibration.scale)
+        self.apply_template_scale(calibration.scale)
+        self._revalidate_threshold = self.revalidate_after
+    
+    def _calibration_templates(self):
+        """参与缩放校准的原始（未缩放）参考图像"""
+        return [template for templates in self._source_reference_images.values() for template in templates]
+    
+    def grab_screen_gray(self):
+        """直接截取整个虚拟屏幕并转换为灰度图（帧总线的采集函数）"""
+        try:
+            return self._run_tracked(self.screen_capture.grab_gray)
+        except Exception as e:
+            print(f"屏幕捕获出错: {e}")
+            return None
+    
+    def _run_tracked(self, func, *args):
+        """执行一次使用采集会话或匹配线程池的调用；停止检测后最后结束的调用负责释放这些资源"""
+        with self._work_lock:
+            self._active_work += 1
+        try:
+            return func(*args)
+        finally:
+            with self._work_lock:
+                self._active_work -= 1
+                release = self._release_pending and self._active_work == 0
+                if release:
+                    self._release_pending = False
+            if release:
+                self._release_resources()
+    
+    def _release_resources(self):
+        """关闭匹配线程池和采集会话"""
+        self._shutdown_match_executor()
+        self.screen_capture.close()
+    
+    def get_frame(self, timeout=1.0, retain=False):
+        """获取当前屏幕帧（Frame）
+        
+        帧总线运行时返回总线上的最新帧（尚无画面时等待第一帧），
+        否则直接截屏并发布到总线，保证所有消费者共用同一帧序号。
+        
+        Args:
+            timeout: 等待第一帧的最长时间（秒）
+            retain: 返回的帧是否由调用方持有，持有期间缓冲区不会被新帧覆盖，用完后调用release_frame()
+        """
+        if self.frame_bus.is_running:
+            frame = self.frame_bus.get_latest(retain=retain)
+            if frame is None:
+                frame = self.frame_bus.wait_for_frame(0, timeout=timeout, retain=retain)
+            return frame
+        gray = self.grab_screen_gray()
+        if gray is None:
+            return None
+        return self.frame_bus.publish(gray, retain=retain)
+    
+    def acquire_frame(self, timeout=1.0):
+        """获取供点击逻辑使用的屏幕帧并由调用方持有，用完后调用release_frame()
+        
+        检测进行中时返回最近一次完成分类的帧，使点击匹配的画面与界面判断一致；
+        尚未产生分类结果时返回帧总线上的最新帧。
+        """
+        with self._last_frame_lock:
+            frame = self.last_frame
+            if frame is not None and self.is_detecting:
+                self.frame_bus.retain(frame)
+                return frame
+        return self.get_frame(timeout, retain=True)
+    
+    def release_frame(self, frame):
+        """释放acquire_frame()或get_frame(retain=True)取得的帧"""
+        self.frame_bus.release(frame)
+    
+    def _replace_last_frame(self, frame):
+        """把已持有的一帧记为last_frame，并释放被取代的上一帧"""
+        with self._last_frame_lock:
+            previous = self.last_frame
+            self.last_frame = frame
+        if previous is not None:
+            self.frame_bus.release(previous)
+    
+    def preprocess_frame(self, gray, reuse_buffer=False):
+        """对灰度帧进行匹配前处理
+        
+        Args:
+            gray: 灰度帧
+            reuse_buffer: 是否将结果写入检测线程复用的缓冲区（仅供检测线程使用）
+        """
+        if self.downsample > 1:
+            # 区域平均降采样本身已经平滑了噪声，不再做高斯模糊
+            factor = self.downsample
+            size = (gray.shape[1] // factor, gray.shape[0] // factor)
+            if not reuse_buffer:
+                return cv2.resize(gray, size, interpolation=cv2.INTER_AREA)
+            if self._downsample_buffer is None or self._downsample_buffer.shape != (size[1], size[0]):
+                self._downsample_buffer = np.empty((size[1], size[0]), dtype=gray.dtype)
+            cv2.resize(gray, size, dst=self._downsample_buffer, interpolation=cv2.INTER_AREA)
+            return self._downsample_buffer
+        # 轻微高斯模糊以减少噪声影响
+        if not reuse_buffer:
+            return cv2.GaussianBlur(gray, (3, 3), 0)
+        if self._blur_buffer is None or self._blur_buffer.shape != gray.shape:
+            self._blur_buffer = np.empty_like(gray)
+        cv2.GaussianBlur(gray, (3, 3), 0, dst=self._blur_buffer)
+        return self._blur_buffer
+    
     def capture_screen(self):
-        """捕获当前屏幕画面，优化性能和错误处理"""
+        """捕获当前屏幕画面（已做匹配前处理），优化性能和错误处理"""
         try:
-            # 优先使用 mss 进行跨平台截图，失败则回退到 pyautogui
+            frame = self.get_frame(retain=True)
+            if frame is None:
+                return None
             try:
-                import mss
-                with mss.mss() as sct:
-                    # sct.monitors[0] 是整个虚拟屏幕（多显示器合并区域）
-                    monitor = sct.monitors[0]
-                    img = np.array(sct.grab(monitor))  # BGRA
-                    bgr = cv2.cvtColor(img, cv2.COLOR_BGRA2BGR)
-                    gray_screenshot = cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY)
-            except Exception:
-                # 回退到 pyautogui 截图
-                screenshot = pyautogui.screenshot()
-                screenshot = cv2.cvtColor(np.array(screenshot), cv2.COLOR_RGB2BGR)
-                gray_screenshot = cv2.cvtColor(screenshot, cv2.COLOR_BGR2GRAY)
-            
-            # 轻微高斯模糊以减少噪声影响
-            gray_screenshot = cv2.GaussianBlur(gray_screenshot, (3, 3), 0)
-            return gray_screenshot
+                return self.preprocess_frame(frame.gray)
+            finally:
+                self.release_frame(frame)
         except Exception as e:
             print(f"屏幕捕获出错: {e}")
             return None
     
-    def match_template(self, screen_gray, template, threshold=0.85):
-        """使用模板匹配算法进行图像比对，优化了匹配精度和性能"""
+    def locate_template(self, screen_gray, template):
+        """在图像中查找模板的最佳匹配
+        
+        Args:
+            screen_gray: 屏幕灰度图，或self.matcher.prepare()返回的金字塔图像
+            template: 模板灰度图
+        
+        Returns:
+            tuple: (最大匹配值, 最佳匹配左上角坐标)；图像比模板小或出错时返回(-1.0, None)
+        """
         try:
-            # 获取模板的高度和宽度
-            h, w = template.shape
-            
-            # 如果屏幕图像比模板小，直接返回不匹配
-            if screen_gray.shape[0] < h or screen_gray.shape[1] < w:
-                return False
-            
-            # 使用TM_CCOEFF_NORMED方法进行模板匹配（性能和准确性的平衡）
-            result = cv2.matchTemplate(screen_gray, template, cv2.TM_CCOEFF_NORMED)
-            
-            # 找出匹配度大于阈值的位置
-            max_val = cv2.minMaxLoc(result)[1]  # 获取最大匹配值
-            
-            # 如果最大匹配值大于阈值，认为匹配成功
-            return max_val >= threshold
+            # 使用金字塔匹配引擎（TM_CCOEFF_NORMED，分数与全分辨率匹配一致）
+            return self.matcher.locate(screen_gray, template)
         except Exception as e:
             print(f"模板匹配出错: {e}")
-            return False
+            return -1.0, None
+    
+    def match_template(self, screen_gray, template, threshold=0.85):
+        """使用模板匹配算法进行图像比对，优化了匹配精度和性能"""
+        max_val, _ = self.locate_template(screen_gray, template)
+        # 如果最大匹配值大于阈值，认为匹配成功
+        return max_val >= threshold
+    
+    def match_reference(self, screen_gray, key, template, last_match, full_scan=False, threshold=0.85):
+        """匹配一张参考图像，优先只搜索其上次匹配位置附近的ROI
+        
+        ROI未命中或需要全屏搜索时回退到整屏匹配。只计算结果、不修改检测器状态，可在匹配线程中调用。
+        
+        Args:
+            screen_gray: 预处理后的屏幕灰度图，或self.matcher.prepare()返回的金字塔图像
+            key: 模板标识，(界面名称, 模板序号)
+            template: 模板灰度图
+            last_match: 该模板上次的TemplateMatch，没有时为None
+            full_scan: 是否跳过ROI直接全屏搜索
+            threshold: 匹配阈值
+        
+        Returns:
+            tuple: (是否匹配, 最高分数, 新的TemplateMatch或None)
+        """
+        h, w = template.shape
+        if last_match is not None and not full_scan:
+            image = getattr(screen_gray, "image", screen_gray)
+            pad = max(1, self.roi_padding // self.downsample)
+            x0 = max(0, last_match.left - pad)
+            y0 = max(0, last_match.top - pad)
+            x1 = min(image.shape[1], last_match.left + w + pad)
+            y1 = min(image.shape[0], last_match.top + h + pad)
+            max_val, max_loc = self.locate_template(image[y0:y1, x0:x1], template)
+            if max_val >= threshold:
+                return True, max_val, self._make_match(key, template, x0 + max_loc[0], y0 + max_loc[1], max_val)
+        
+        # 轮询策略给出了搜索区域时只在该区域内搜索（定期全屏搜索的帧不受限制）
+        region = None if full_scan else self._search_regions.get(key[0])
+        if region is not None:
+            image = getattr(screen_gray, "image", screen_gray)
+            x0, y0, x1, y1 = self._region_bounds(region, image.shape, template.shape)
+            max_val, max_loc = self.locate_template(image[y0:y1, x0:x1], template)
+            if max_loc is not None:
+                max_loc = (x0 + max_loc[0], y0 + max_loc[1])
+        else:
+            max_val, max_loc = self.locate_template(screen_gray, template)
+        if max_loc is not None and max_val >= threshold:
+            return True, max_val, self._make_match(key, template, max_loc[0], max_loc[1], max_val)
+        return False, max_val, None
+    
+    @staticmethod
+    def _region_bounds(region, image_shape, template_shape):
+        """把比例坐标的搜索区域转换为像素范围(x0, y0, x1, y1)，区域至少与模板一样大"""
+        height, width = image_shape[:2]
+        h, w = template_shape[:2]
+        x0, y0 = int(region[0] * width), int(region[1] * height)
+        x1, y1 = max(x0 + w, int(round(region[2] * width))), max(y0 + h, int(round(region[3] * height)))
+        return max(0, min(x0, width - w)), max(0, min(y0, height - h)), min(width, x1), min(height, y1)
+    
+    def _make_match(self, key, template, left, top, score):
+        """构造一次成功的模板匹配记录（位置、分数和所在帧）"""
+        h, w = template.shape
+        return TemplateMatch(
+            self.template_name(key), left, top, w, h, float(score), self._current_frame_id, time.time())
+    
+    def _confirm_match(self, key):
+        """画面未变化时确认上次的匹配在当前帧仍然有效（更新帧序号和时间戳）"""
+        match = self.template_matches.get(key)
+        if match is not None:
+            self.template_matches[key] = match._replace(frame_id=self._current_frame_id, timestamp=time.time())
+    
+    def match_reference_gated(self, screen_gray, key, template, full_scan, changes, previous, last_match):
+        """结合画面变化区域匹配一张参考图像
+        
+        - 上次匹配成功且其位置未与变化图块相交：直接沿用匹配成功的结果
+        - 上次匹配失败：模板只可能出现在变化区域内，仅在变化区域外接矩形附近搜索
+        - 没有历史结果、整帧变化或未启用门控：按match_reference正常匹配
+        只计算结果、不修改检测器状态，可在匹配线程中调用；结果由_apply_outcome()写回。
+        
+        Args:
+            changes: 本帧的FrameChanges，为None时不做门控
+            previous: 该模板上次是否匹配，没有历史结果时为None
+            last_match: 该模板上次的TemplateMatch，没有时为None
+        
+        Returns:
+            TemplateOutcome: 匹配结果
+        """
+        started = time.perf_counter()
+        if changes is None or changes.everything or previous is None:
+            matched, score, match = self.match_reference(screen_gray, key, template, last_match, full_scan)
+        elif previous:
+            if last_match is None or changes.intersects(
+                    last_match.left, last_match.top, last_match.width, last_match.height):
+                matched, score, match = self.match_reference(screen_gray, key, template, last_match, full_scan)
+            else:
+                # 画面未变化的位置：确认上次的匹配在当前帧仍然有效
+                matched, score = True, None
+                match = last_match._replace(frame_id=self._current_frame_id, timestamp=time.time())
+        else:
+            matched, score, match = self._match_in_changed_region(screen_gray, key, template, changes, last_match)
+        return TemplateOutcome(matched, score, match, (time.perf_counter() - started) * 1000)
+    
+    def _apply_outcome(self, key, outcome):
+        """把一个模板的匹配结果写回跨帧状态（只在调用classify_frame的线程中执行）"""
+        self._template_results[key] = outcome.matched
+        if outcome.score is not None:
+            self._template_scores[key] = outcome.score
+        if outcome.match is not None:
+            self.template_matches[key] = outcome.match
+        else:
+            self.template_matches.pop(key, None)
+        self.last_template_timings[key] = (outcome.elapsed_ms, outcome.matched, self._template_scores.get(key))
+    
+    def _match_in_changed_region(self, screen_gray, key, template, changes, last_match, threshold=0.85):
+        """只在变化区域（按模板尺寸向外扩展）内搜索模板，返回(是否匹配, 最高分数, 新的TemplateMatch或None)"""
+        if changes.bbox is None:
+            return False, None, last_match
+        image = getattr(screen_gray, "image", screen_gray)
+        h, w = template.shape
+        x0, y0, x1, y1 = changes.bbox
+        x0, y0 = max(0, x0 - w), max(0, y0 - h)
+        x1, y1 = min(image.shape[1], x1 + w), min(image.shape[0], y1 + h)
+        max_val, max_loc = self.locate_template(image[y0:y1, x0:x1], template)
+        if max_loc is not None and max_val >= threshold:
+            return True, max_val, self._make_match(key, template, x0 + max_loc[0], y0 + max_loc[1], max_val)
+        return False, max_val, last_match
     
-    def detect_screen(self):
-        """检测屏幕上的界面类型，支持多界面识别和特殊情况处理"""
+    def reset_detection_state(self):
+        """清除ROI位置、画面变化门控等跨帧状态，下一帧将完整匹配所有模板"""
+        self.template_matches = {}
+        self._template_results = {}
+        self._template_scores = {}
+        self._last_classification = None
+        self._frames_since_full_scan = 0
+        self.change_detector.reset()
+    
+    def template_name(self, key):
+        """将模板标识(界面名称, 模板序号)转换为可读名称，例如 "course_menu/001.PNG" """
+        interface_name, index = key
+        entries = self._reference_index.get(interface_name, [])
+        if index < len(entries):
+            return f"{interface_name}/{entries[index][0]}"
+        return f"{interface_name}/{index}"
+    
+    def classify_frame(self, screen_gray, frame_id=None):
+        """对一帧预处理后的屏幕图像进行界面分类，返回界面名称
+        
+        Args:
+            screen_gray: 预处理后的屏幕灰度图
+            frame_id: 该帧在帧总线上的序号，记录在匹配结果中
+        """
+        self.last_template_timings = {}
+        self._current_frame_id = frame_id
+        # 定期全屏搜索，避免界面元素移动后ROI长期失效
+        self._frames_since_full_scan += 1
+        full_scan = self._frames_since_full_scan >= self.full_scan_interval
+        
+        # 画面变化门控：画面完全未变化时直接沿用上一次的分类结果
+        changes = None
+        if self.change_gating:
+            changes = self.change_detector.update(screen_gray)
+            if changes.is_empty and self._last_classification is not None:
+                for key in list(self.template_matches):
+                    self._confirm_match(key)
+                self.last_scan = "unchanged"
+                return self._last_classification
+        if full_scan:
+            self._frames_since_full_scan = 0
+            # 全屏搜索时不沿用任何历史结果
+            changes = None
+        # 本帧重新匹配：清除上一帧各界面类型的结果（本帧未检查的界面不应保留旧结果）
+        self.interface_results = {}
+        
+        # 同一帧的降采样金字塔只构建一次，供所有模板复用
+        screen_gray = self.matcher.prepare(screen_gray)
+        
+        # 重置特殊界面检测状态
+        for interface in self.special_interfaces:
+            self.special_interfaces[interface] = False
+        
+        # 整体替换式热加载：本帧始终使用同一份参考图像字典
+        reference_images = self.reference_images
+        # 轮询策略：按界面切换图只检查当前界面及其后继界面（定期全屏搜索的帧检查全部）
+        checked = reference_images
+        self._search_regions = {}
+        if self.polling is not None and not full_scan:
+            checked = self.polling.select(self.current_interface, reference_images)
+            self._search_regions = self.polling.policy_for(self.current_interface).regions
+        skipped = {name: templates for name, templates in reference_images.items() if name not in checked}
+        for interface_name, templates in skipped.items():
+            # 本帧未检查的模板没有结果，清除其历史结果以免之后误用
+            for index in range(len(templates)):
+                self._template_results.pop((interface_name, index), None)
+        results = self._match_interfaces(screen_gray, checked, full_scan, changes)
+        self.last_scan = "subset" if skipped else "full"
+        if skipped and not any(results.values()):
+            # 子集中没有任何界面匹配：本帧补查其余界面，避免误判为"未检测"
+            results.update(self._match_interfaces(screen_gray, skipped, full_scan, changes))
+            self.last_scan = "fallback"
+        
+        # 按参考图像文件夹顺序汇总检测到的界面
+        detected_interfaces = [name for name in reference_images if results.get(name)]
+        for interface_name in detected_interfaces:
+            # 更新特殊界面检测状态
+            if interface_name in self.special_interfaces:
+                self.special_interfaces[interface_name] = True
+        
+        # 处理特殊情况
+        self._last_classification = self._handle_special_cases(detected_interfaces)
+        return self._last_classification
+    
+    def _report_interface_result(self, interface_name, matched):
+        """记录单个界面类型的匹配结果并通知回调"""
+        self.interface_results[interface_name] = matched
+        if self.on_interface_result is not None:
+            try:
+                self.on_interface_result(interface_name, matched)
+            except Exception as e:
+                print(f"界面结果回调出错: {e}")
+    
+    def _match_interfaces(self, screen_gray, reference_images, full_scan, changes=None):
+        """匹配指定的界面类型（按match_workers选择并行或逐个匹配），返回{界面名称: 是否匹配}"""
+        if self.match_workers > 1:
+            return self._match_interfaces_parallel(screen_gray, reference_images, full_scan, changes)
+        return self._match_interfaces_sequential(screen_gray, reference_images, full_scan, changes)
+    
+    def _match_interfaces_sequential(self, screen_gray, reference_images, full_scan, changes=None):
+        """逐个匹配所有界面类型，返回{界面名称: 是否匹配}"""
+        results = {}
+        # 遍历所有参考图像文件夹进行检测
+        for interface_name, templates in reference_images.items():
+            # 检查该界面类型的所有模板是否都匹配
+            interface_matched = True
+            for index, template in enumerate(templates):
+                key = (interface_name, index)
+                outcome = self.match_reference_gated(screen_gray, key, template, full_scan, changes,
+                                                     self._template_results.get(key), self.template_matches.get(key))
+                self._apply_outcome(key, outcome)
+                if not outcome.matched:
+                    interface_matched = False
+                    # 被短路跳过的模板本帧没有结果，清除其历史结果以免下一帧误用
+                    for skipped in range(index + 1, len(templates)):
+                        self._template_results.pop((interface_name, skipped), None)
+                    break
+            results[interface_name] = interface_matched
+            self._report_interface_result(interface_name, interface_matched)
+        return results
+    
+    def _get_match_executor(self):
+        """获取模板匹配线程池（首次使用时创建）"""
+        if self._match_executor is None:
+            self._match_executor = ThreadPoolExecutor(
+                max_workers=self.match_workers, thread_name_prefix="template-match")
+        return self._match_executor
+    
+    def _shutdown_match_executor(self):
+        """关闭模板匹配线程池"""
+        executor = self._match_executor
+        self._match_executor = None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+    
+    def _match_reference_task(self, screen_gray, key, template, full_scan, changes, previous, last_match,
+                              folder_failed):
+        """线程池中的单模板匹配任务，返回TemplateOutcome；所属界面已有模板失败时直接跳过并返回None
+        
+        任务只读取提交时传入的历史结果，不修改检测器状态，结果由调用线程合并。
+        """
+        if folder_failed.is_set():
+            return None
+        return self.match_reference_gated(screen_gray, key, template, full_scan, changes, previous, last_match)
+    
+    def _match_interfaces_parallel(self, screen_gray, reference_images, full_scan, changes=None):
+        """在线程池中并行匹配所有模板，返回{界面名称: 是否匹配}
+        
+        保留逐个匹配时的短路语义：某个界面类型的任一模板匹配失败后，
+        取消该界面尚未开始的其余模板；每个界面得出结果后立即通过回调报告。
+        匹配线程只返回TemplateOutcome，ROI位置、分数、耗时等跨帧状态都在调用线程中写回。
+        """
+        executor = self._get_match_executor()
+        future_owners = {}
+        pending = {}  # 界面名称 -> [失败标志, 该界面的所有future, 尚未完成的匹配数量]
+        results = {}
+        for interface_name, templates in reference_images.items():
+            if not templates:
+                continue
+            folder_failed = threading.Event()
+            futures = []
+            for index, template in enumerate(templates):
+                key = (interface_name, index)
+                future = executor.submit(self._match_reference_task, screen_gray, key, template, full_scan, changes,
+                                         self._template_results.get(key), self.template_matches.get(key),
+                                         folder_failed)
+                future_owners[future] = key
+                futures.append(future)
+            pending[interface_name] = [folder_failed, futures, len(futures)]
+        
+        for future in as_completed(future_owners):
+            key = future_owners[future]
+            interface_name = key[0]
+            outcome = None
+            if not future.cancelled():
+                try:
+                    outcome = future.result()
+                except Exception as e:
+                    print(f"模板匹配任务出错: {e}")
+            if outcome is not None:
+                self._apply_outcome(key, outcome)
+            else:
+                # 被取消、短路跳过或出错的模板本帧没有结果，清除其历史结果以免下一帧误用
+                self._template_results.pop(key, None)
+            if interface_name in results:
+                # 该界面已判定失败，剩余任务的结果无需处理
+                continue
+            folder_failed, futures, remaining = pending[interface_name]
+            matched = outcome is not None and outcome.matched
+            if not matched:
+                folder_failed.set()
+                for other in futures:
+                    other.cancel()
+                results[interface_name] = False
+                self._report_interface_result(interface_name, False)
+            elif remaining == 1:
+                results[interface_name] = True
+                self._report_interface_result(interface_name, True)
+            else:
+                pending[interface_name][2] = remaining - 1
+        return results
+    
+    def process_frame(self, frame):
+        """对帧总线上的一帧进行预处理、缩放校准和界面分类，返回界面名称
+        
+        各阶段耗时记录在last_stage_timings中。
+        """
+        started = time.perf_counter()
+        screen_gray = self.preprocess_frame(frame.gray, reuse_buffer=True)
+        preprocessed = time.perf_counter()
+        
+        # 确定当前显示器的模板缩放比例（已校准的显示器无额外开销）；降采样时在原分辨率画面上校准
+        calibration_gray = frame.gray if self.downsample > 1 else screen_gray
+        self.update_template_scale(calibration_gray)
+        scaled = time.perf_counter()
+        
+        interface_name = self.classify_frame(screen_gray, frame.frame_id)
+        classified = time.perf_counter()
+        self.revalidate_template_scale(calibration_gray, interface_name)
+        self.last_stage_timings = {
+            "preprocess_ms": (preprocessed - started) * 1000,
+            "scale_ms": (scaled - preprocessed + time.perf_counter() - classified) * 1000,
+            "classify_ms": (classified - scaled) * 1000,
+        }
+        return interface_name
+    
+    def _classify_retained_frame(self, frame):
+        """在线程池中分类一帧已持有的画面，完成后这份持有转交给last_frame（出错时释放）
+        
+        持有由执行分类的线程负责转交或释放，检测协程被取消时分类仍在读取的缓冲区不会被提前复用。
+        """
+        try:
+            interface_name = self.process_frame(frame)
+        except BaseException:
+            self.frame_bus.release(frame)
+            raise
+        # 先记录分类所用的帧，再更新检测结果，保证读取方看到一致的画面
+        self._replace_last_frame(frame)
+        return interface_name
+    
+    async def detect_screen(self):
+        """检测协程：检测屏幕上的界面类型，支持多界面识别和特殊情况处理"""
+        last_frame_id = 0
+        last_reload_check = time.time()
         while self.is_detecting:
             try:
-                # 捕获当前屏幕
-                screen_gray = self.capture_screen()
-                if screen_gray is None:
-                    time.sleep(0.5)
-                    continue
+                # 定期检查img/test是否有新增、修改或删除的参考图像（采集暂停期间不检查）
+                if not self.frame_bus.paused and time.time() - last_reload_check >= self.reload_interval:
+                    last_reload_check = time.time()
+                    await self.monitor_loop.run_blocking(self.refresh_reference_images)
                 
-                # 重置特殊界面检测状态
-                for interface in self.special_interfaces:
-                    self.special_interfaces[interface] = False
-                
-                # 重置当前界面
-                detected_interfaces = []
-                
-                # 遍历所有参考图像文件夹进行检测
-                for interface_name, templates in self.reference_images.items():
-                    # 检查该界面类型的所有模板是否都匹配
-                    interface_matched = True
-                    for template in templates:
-                        if not self.match_template(screen_gray, template):
-                            interface_matched = False
-                            break
-                    
-                    if interface_matched:
-                        detected_interfaces.append(interface_name)
-                        # 更新特殊界面检测状态
-                        if interface_name in self.special_interfaces:
-                            self.special_interfaces[interface_name] = True
+                # 从帧总线等待一帧新画面（采集频率由帧总线控制）
+                frame = await self.frame_bus.wait_for_frame_async(last_frame_id, timeout=1.0, retain=True)
+                if frame is None:
+                    continue
+                last_frame_id = frame.frame_id
                 
-                # 处理特殊情况
-                current_interface = self._handle_special_cases(detected_interfaces)
+                # 模板匹配是CPU密集操作，交给线程池执行，事件循环保持响应
+                current_interface = await self.monitor_loop.run_blocking(
+                    self._run_tracked, self._classify_retained_frame, frame)
                 
-                # 更新检测结果
                 self._update_detection_result(current_interface)
-                
-                # 控制检测频率，避免CPU占用过高
-                time.sleep(0.3)
+                self.frame_bus.mark_consumed(frame.frame_id)
+                # 按分类结果调整下一次采集的间隔（连续未检测时指数退避）
+                if self.polling is not None and self.polling.adjust_interval:
+                    interval = self.polling.next_interval(current_interface)
+                    if interval != self.frame_bus.interval:
+                        self.frame_bus.set_interval(interval)
+                if self.telemetry is not None:
+                    self._record_telemetry(frame, current_interface)
                 
             except Exception as e:
                 print(f"检测过程中出错: {e}")
-                time.sleep(1)  # 出错时延长等待时间
+                await asyncio.sleep(1)  # 出错时延长等待时间
+    
+    def _record_telemetry(self, frame, interface_name):
+        """为刚处理完的一帧写一条遥测记录"""
+        templates = {}
+        for key, (elapsed_ms, _, score) in self.last_template_timings.items():
+            templates[self.template_name(key)] = [
+                round(elapsed_ms, 3), None if score is None else round(float(score), 4)]
+        record = {name: round(value, 3) for name, value in self.last_stage_timings.items()}
+        self.telemetry.record(
+            "detect",
+            frame_id=frame.frame_id,
+            capture_ms=None if frame.capture_ms is None else round(frame.capture_ms, 3),
+            # 从截屏完成到分类结果发布的总延迟
+            latency_ms=round((time.time() - frame.timestamp) * 1000, 3),
+            result=interface_name,
+            scan=self.last_scan,
+            templates=templates,
+            **record)
     
     def _handle_special_cases(self, detected_interfaces):
         """处理特殊界面识别情况"""
@@ -299,53 +1044,119 @@ class FloatingImageDetector:
             # 未检测到任何界面
             return "未检测"
     
+    def interface_matches(self, interface_name):
+        """获取指定界面各模板最近一次的匹配结果，{模板名称: TemplateMatch}（屏幕坐标）"""
+        matches = self.template_matches
+        factor = self.downsample
+        if factor == 1:
+            return {match.name: match for key, match in list(matches.items()) if key[0] == interface_name}
+        # 降采样时匹配位置是缩小后画面的坐标，换算回屏幕坐标
+        return {match.name: match._replace(left=match.left * factor, top=match.top * factor,
+                                           width=match.width * factor, height=match.height * factor)
+                for key, match in list(matches.items()) if key[0] == interface_name}
+    
+    def get_template_match(self, interface_name, filename, max_age=None):
+        """获取某个参考图像最近一次的匹配结果
+        
+        Args:
+            interface_name: 界面名称（参考图像所在文件夹）
+            filename: 参考图像文件名，例如 "join.PNG"
+            max_age: 允许的最长时间（秒），超过时视为过期；None表示不限制
+        
+        Returns:
+            TemplateMatch: 匹配结果；未匹配或已过期时返回None
+        """
+        match = self.interface_matches(interface_name).get(f"{interface_name}/{filename}")
+        if match is None:
+            return None
+        if max_age is not None and time.time() - match.timestamp > max_age:
+            return None
+        return match
+    
     def _update_detection_result(self, interface_name):
-        """更新检测结果显示"""
+        """更新检测结果显示，界面变化时发布切换事件"""
         if interface_name != self.current_interface:
+            previous = self.current_interface
             self.current_interface = interface_name
+            frame = self.last_frame
+            self.interface_events.publish(
+                interface_name, previous,
+                frame_id=frame.frame_id if frame is not None else None,
+                matches=self.interface_matches(interface_name))
+            
+            if self.ui_bridge is None:
+                print(f"检测到界面: {interface_name}")
+                return
             
-            # 更新状态显示
+            # 更新状态显示（由TkBridge在主线程中执行）
             display_name = interface_name.replace("_", " ").title()
-            self.status_var.set(f"当前界面：{display_name}")
+            self.ui_bridge.post("detector_status", self.status_var.set, f"当前界面：{display_name}")
             
             # 更新窗口背景色
             if interface_name == "未检测":
-                self.root.configure(bg="#2c3e50")  # 默认颜色
+                self.ui_bridge.post("detector_bg", self.root.configure, {"bg": "#2c3e50"})  # 默认颜色
             else:
-                self.root.configure(bg="#27ae60")  # 检测到目标时变绿色
+                self.ui_bridge.post("detector_bg", self.root.configure, {"bg": "#27ae60"})  # 检测到目标时变绿色
                 print(f"检测到界面: {interface_name}")
     
+    def start_detection(self):
+        """在事件循环中启动采集协程和检测协程，没有参考图像时返回False"""
+        if self.is_detecting:
+            return True
+        if not self.reference_images:
+            return False
+        self.is_detecting = True
+        with self._work_lock:
+            # 上次停止时尚未结束的调用不再释放资源，新的检测会继续使用它们
+            self._release_pending = False
+        self.monitor_loop.start()
+        # 启动共享帧总线
+        self.monitor_loop.spawn("frame_bus", self.frame_bus.run, self.monitor_loop.executor)
+        self.monitor_loop.spawn("detection", self.detect_screen)
+        return True
+    
+    def stop_detection(self):
+        """取消检测协程和采集协程，并释放匹配线程池与采集会话
+        
+        取消后任务立即结束，但已交给线程池的截屏或分类仍会执行完；
+        此时不在这里关闭线程池和采集会话，而是由最后结束的调用释放，不阻塞调用方（界面线程）。
+        """
+        self.is_detecting = False
+        self.frame_bus.stop()
+        self.monitor_loop.cancel("detection", timeout=2.0)
+        self.monitor_loop.cancel("frame_bus", timeout=2.0)
+        with self._work_lock:
+            busy = self._active_work > 0
+            self._release_pending = busy
+        if not busy:
+            self._release_resources()
+    
     def toggle_detection(self):
         """切换检测状态"""
         if self.is_detecting:
             # 停止检测
-            self.is_detecting = False
             self.detect_button.config(text="开始检测", bg="#27ae60")
-            self.status_var.set(f"检测已停止 - 最后识别：{self.current_interface.replace('_', ' ').title()}")
-            if self.detection_thread is not None:
-                self.detection_thread.join()
-            self.root.configure(bg="#2c3e50")  # 恢复默认颜色
+            self.stop_detection()
+            # 通过TkBridge登记，覆盖检测协程尚未执行的界面更新
+            self.ui_bridge.post("detector_status", self.status_var.set,
+                                f"检测已停止 - 最后识别：{self.current_interface.replace('_', ' ').title()}")
+            self.ui_bridge.post("detector_bg", self.root.configure, {"bg": "#2c3e50"})  # 恢复默认颜色
         else:
             # 开始检测
-            if not self.reference_images:
+            if not self.start_detection():
                 self.status_var.set("错误：未找到参考图像")
                 return
             
-            self.is_detecting = True
             self.detect_button.config(text="停止检测", bg="#e74c3c")
             self.status_var.set("正在检测界面...")
-            # 在新线程中执行检测
-            self.detection_thread = threading.Thread(target=self.detect_screen)
-            self.detection_thread.daemon = True
-            self.detection_thread.start()
     
     def exit_program(self, event=None):
         """退出程序"""
-        self.is_detecting = False
-        if self.detection_thread is not None:
-            self.detection_thread.join()
+        self.stop_detection()
+        if self._owns_monitor_loop:
+            self.monitor_loop.stop()
         # 只有在非嵌入模式下才销毁窗口
-        if not self.embedded:
+        if not self.embedded and self.root is not None:
             self.root.destroy()
 
 if __name__ == "__main__":
@@ -0,0 +1,234 @@
+import asyncio
+import threading
+import time
+from collections import namedtuple
+
+from monitor_loop import AsyncWaiters
+
+# 一帧屏幕画面：帧序号、采集时间戳（time.time()）、灰度图像、截屏耗时（毫秒，未知时为None）
+Frame = namedtuple("Frame", ["frame_id", "timestamp", "gray", "capture_ms"])
+Frame.__new__.__defaults__ = (None,)
+
+
+class FrameBus:
+    """共享屏幕帧总线
+
+    由单一的采集协程（run()）按固定间隔截取整个虚拟屏幕，并发布带有帧序号和时间戳的灰度帧。
+    界面检测和鼠标控制等消费者只读取最新帧或等待更新的帧，不再各自截屏，
+    从而保证分类器看到的画面与点击逻辑匹配的画面是同一帧。
+    线程中的消费者使用wait_for_frame()，事件循环中的协程使用wait_for_frame_async()。
+
+    采集函数可能复用缓冲区（见CaptureBackend的allocation_free模式）：总线持有最新一帧，
+    被新帧取代时释放；读取时传入retain=True的消费者在锁内获得一份持有，用完后调用release()。
+    """
+
+    def __init__(self, capture_func, interval=0.3, retain_func=None, release_func=None):
+        """初始化帧总线
+
+        Args:
+            capture_func: 采集函数，返回灰度图像（numpy数组，已为总线持有一次），失败时返回None
+            interval: 两次采集之间的间隔（秒）
+            retain_func: 增加一次灰度图缓冲区持有的函数，None表示缓冲区不会被复用
+            release_func: 释放一次灰度图缓冲区持有的函数
+        """
+        self.capture_func = capture_func
+        self.interval = interval
+        self.retain_func = retain_func
+        self.release_func = release_func
+        self._condition = threading.Condition()
+        self._latest_frame = None
+        self._next_frame_id = 1
+        self._running = False
+        self._async_waiters = AsyncWaiters()
+        # 逐帧模式：每帧被消费者确认处理后才采集下一帧（回放录制画面时保证不丢帧）
+        self.lockstep = False
+        self._consumed_frame_id = 0
+        # 采集间隔下限（功耗管理设置，None表示不限制），实际间隔取interval和它的较大值
+        self.min_interval = None
+        # 暂停时采集协程不再截屏；采集间隔或暂停状态变化时递增，使正在休眠的采集协程立即醒来
+        self.paused = False
+        self._schedule_version = 0
+
+    @property
+    def is_running(self):
+        """采集协程是否正在运行"""
+        return self._running
+
+    def stop(self):
+        """标记采集停止并唤醒所有等待中的消费者（采集协程由事件循环取消）"""
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        self._async_waiters.notify_all()
+
+    def set_interval(self, interval):
+        """修改采集间隔，正在等待下一次采集的协程按新间隔重新计时"""
+        with self._condition:
+            self.interval = interval
+            self._schedule_version += 1
+        self._async_waiters.notify_all()
+    
+    def set_min_interval(self, min_interval):
+        """设置采集间隔下限（None表示不限制），正在等待下一次采集的协程按新间隔重新计时"""
+        with self._condition:
+            self.min_interval = min_interval
+            self._schedule_version += 1
+        self._async_waiters.notify_all()
+    
+    @property
+    def effective_interval(self):
+        """实际使用的采集间隔（秒）"""
+        if self.min_interval is None:
+            return self.interval
+        return max(self.interval, self.min_interval)
+    
+    def pause(self):
+        """暂停采集（不停止采集协程，消费者仍可读取最后一帧）"""
+        with self._condition:
+            self.paused = True
+            self._schedule_version += 1
+        self._async_waiters.notify_all()
+    
+    def resume(self):
+        """恢复采集，立即采集下一帧"""
+        with self._condition:
+            self.paused = False
+            self._schedule_version += 1
+        self._async_waiters.notify_all()
+    
+    def publish(self, gray, capture_ms=None, retain=False):
+        """发布一帧新画面并唤醒等待者，返回发布的Frame
+
+        gray的一份持有转交给总线，被取代的上一帧由总线释放；retain为True时为调用方另外持有一次。
+        """
+        with self._condition:
+            frame = Frame(self._next_frame_id, time.time(), gray, capture_ms)
+            self._next_frame_id += 1
+            previous = self._latest_frame
+            self._latest_frame = frame
+            if retain:
+                self.retain(frame)
+            self._condition.notify_all()
+        if previous is not None:
+            self.release(previous)
+        self._async_waiters.notify_all()
+        return frame
+
+    def retain(self, frame):
+        """为已持有（或在锁内取得）的一帧增加一次持有"""
+        if self.retain_func is not None:
+            self.retain_func(frame.gray)
+
+    def release(self, frame):
+        """释放一次对帧的持有，之后不能再读取frame.gray"""
+        if self.release_func is not None:
+            self.release_func(frame.gray)
+
+    def get_latest(self, retain=False):
+        """获取最新一帧，尚无画面时返回None；retain为True时返回的帧由调用方持有，用完后调用release()"""
+        with self._condition:
+            frame = self._latest_frame
+            if retain and frame is not None:
+                self.retain(frame)
+            return frame
+
+    def wait_for_frame(self, after_frame_id=0, timeout=None, retain=False):
+        """等待一帧序号大于after_frame_id的画面
+
+        Args:
+            after_frame_id: 已处理过的最后帧序号，0表示接受任意帧
+            timeout: 最长等待时间（秒），None表示一直等待
+            retain: 返回的帧是否由调用方持有（用完后调用release()）
+
+        Returns:
+            Frame: 更新的画面；超时或总线停止时返回None
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        with self._condition:
+            while True:
+                frame = self._latest_frame
+                if frame is not None and frame.frame_id > after_frame_id:
+                    if retain:
+                        self.retain(frame)
+                    return frame
+                if not self._running:
+                    return None
+                if deadline is None:
+                    self._condition.wait()
+                else:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        return None
+                    self._condition.wait(remaining)
+
+    def mark_consumed(self, frame_id):
+        """消费者确认已处理完指定帧（逐帧模式下采集协程据此采集下一帧）"""
+        with self._condition:
+            self._consumed_frame_id = max(self._consumed_frame_id, frame_id)
+        self._async_waiters.notify_all()
+
+    async def wait_for_frame_async(self, after_frame_id=0, timeout=None, retain=False):
+        """协程版本的wait_for_frame()，等待期间不占用线程，可被取消"""
+        def check():
+            with self._condition:
+                frame = self._latest_frame
+                if frame is not None and frame.frame_id > after_frame_id:
+                    if retain:
+                        self.retain(frame)
+                    return True, frame
+                return not self._running, None
+
+        return await self._async_waiters.wait_for(check, timeout)
+
+    async def run(self, executor=None):
+        """采集协程：在事件循环中按固定间隔采集并发布画面，任务被取消时停止
+
+        Args:
+            executor: 执行截屏的线程池（截屏是阻塞操作），None表示使用事件循环的默认线程池
+        """
+        loop = asyncio.get_running_loop()
+        with self._condition:
+            self._running = True
+        try:
+            while self._running:
+                started = time.time()
+                frame = None
+                try:
+                    capture_started = time.perf_counter()
+                    gray = await loop.run_in_executor(executor, self.capture_func)
+                    if gray is not None:
+                        frame = self.publish(gray, (time.perf_counter() - capture_started) * 1000)
+                except Exception as e:
+                    print(f"帧总线采集出错: {e}")
+                if frame is not None and self.lockstep:
+                    await self._wait_consumed(frame.frame_id)
+                # 扣除本次采集耗时，保持稳定的采集间隔
+                await self._wait_next_capture(started)
+        finally:
+            self.stop()
+    
+    async def _wait_next_capture(self, started):
+        """等待到下一次采集的时间；间隔被修改时按新间隔重新计时，暂停期间一直等待"""
+        while self._running:
+            version = self._schedule_version
+            if self.paused:
+                remaining = None
+            else:
+                remaining = started + self.effective_interval - time.time()
+                if remaining <= 0:
+                    return
+            
+            def check():
+                return self._schedule_version != version or not self._running, None
+            
+            await self._async_waiters.wait_for(check, remaining)
+            if self._schedule_version == version and not self.paused:
+                return
+
+    async def _wait_consumed(self, frame_id):
+        """等待消费者确认处理完指定帧（采集停止时立即返回）"""
+        def check():
+            with self._condition:
+                return self._consumed_frame_id >= frame_id or not self._running, None
+
+        await self._async_waiters.wait_for(check)
@@ -0,0 +1,53 @@
+import time
+
+
+class PyAutoGuiInput:
+    """使用 pyautogui 控制真实鼠标的输入后端"""
+
+    def __init__(self, move_duration=0.2, settle_delay=0.1):
+        """
+        Args:
+            move_duration: 鼠标移动到目标位置的动画时长（秒）
+            settle_delay: 移动完成后、点击之前的等待时间（秒）
+        """
+        self.move_duration = move_duration
+        self.settle_delay = settle_delay
+
+    def position(self):
+        """获取当前鼠标位置"""
+        import pyautogui
+        return tuple(pyautogui.position())
+
+    def click(self, x, y):
+        """移动鼠标到(x, y)并单击"""
+        import pyautogui
+        pyautogui.moveTo(x, y, duration=self.move_duration)
+        time.sleep(self.settle_delay)  # 等待鼠标移动完成
+        pyautogui.click()
+
+
+class DryRunInput:
+    """只记录不执行的输入后端
+
+    用于无显示器的后台运行、基准测试和回放调试：点击只被记录在clicks中，不会移动真实鼠标。
+    """
+
+    def __init__(self, max_records=1000):
+        """
+        Args:
+            max_records: 最多保留的点击记录数
+        """
+        self.max_records = max_records
+        self.clicks = []  # [(时间戳, x, y), ...]
+        self._position = (0, 0)
+
+    def position(self):
+        """获取记录的鼠标位置（最后一次点击的位置）"""
+        return self._position
+
+    def click(self, x, y):
+        """记录一次点击"""
+        self._position = (x, y)
+        self.clicks.append((time.time(), x, y))
+        if len(self.clicks) > self.max_records:
+            del self.clicks[0]
@@ -1,25 +1,20 @@
 import tkinter as tk
 from tkinter import ttk
+import asyncio
 import datetime
-import threading
 import time
-import os
 import sys
-import pyautogui
-import cv2
-import numpy as np
 import keyboard
-from PIL import Image, ImageTk
 
 # 导入现有模块
 from course_manager import CourseManager
 from floating_image_detector import FloatingImageDetector
-
-# 确保日志文件夹存在
-LOG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs")
-os.makedirs(LOG_DIR, exist_ok=True)
+from monitor_engine import MonitorEngine, write_log
+from monitor_loop import MonitorLoop, TkBridge
 
 class IntegratedFloatingPanel:
+    """集成浮窗面板：MonitorEngine的Tk客户端，只负责显示状态和转发启动/停止操作"""
+    
     def __init__(self):
         """初始化集成浮窗面板"""
         # 创建主窗口
@@ -41,20 +36,14 @@ class IntegratedFloatingPanel:
         # 初始化变量
         self.is_running = False
         self.is_paused = False
-        self.mouse_control_running = False  # 鼠标控制功能状态
-        self.mouse_control_thread = None  # 鼠标控制线程
         self.manager = CourseManager()  # 课程管理器实例（独立实例，因为这是一个独立的程序）
-        self.image_detector = None  # 屏幕检测工具实例
-        self.detection_thread = None
-        
-        # 鼠标控制状态变量
-        self.current_main_behavior = "未启动"  # 当前大型行为状态
-        self.current_sub_behavior = "等待中"  # 当前小行为状态
+        self.image_detector = None  # 屏幕检测工具实例（嵌入面板显示）
+        self.engine = None  # 监控引擎，创建检测工具后初始化
         
-        # 答题点击间隔控制
-        self.last_answer_click_time = 0  # 上一次答题点击的时间戳（用于限制重复点击）
-        # 返回点击间隔控制
-        self.last_return_click_time = 0  # 上一次返回点击的时间戳（用于限制重复点击）
+        # 单一事件循环：时间刷新、屏幕采集、界面检测和鼠标控制都作为协程运行
+        self.monitor_loop = MonitorLoop()
+        # 后台协程的界面更新通过TkBridge批量交给主线程执行
+        self.ui = TkBridge(self.root)
         
         # 当前时间和日期
         self.current_time = datetime.datetime.now().strftime("%H:%M:%S")
@@ -64,10 +53,15 @@ class IntegratedFloatingPanel:
         # 创建界面组件
         self.create_widgets()
         
-        # 启动时间更新线程
-        self.time_update_thread = threading.Thread(target=self.update_time)
-        self.time_update_thread.daemon = True
-        self.time_update_thread.start()
+        # 监控引擎负责采集、分类、课程时间判断和鼠标操作，面板只订阅状态变化
+        self.engine = MonitorEngine(detector=self.image_detector, manager=self.manager,
+                                    monitor_loop=self.monitor_loop)
+        self.engine.on_status_change = self.show_behavior_status
+        
+        # 启动界面更新桥和事件循环，时间刷新作为协程运行
+        self.ui.start()
+        self.monitor_loop.start()
+        self.monitor_loop.spawn("clock", self.update_time)
         
         # 启动主循环
         self.root.mainloop()
@@ -83,26 +77,9 @@ class IntegratedFloatingPanel:
         y = self.root.winfo_pointery() - self.y
         self.root.geometry(f"+{x}+{y}")
     
-    def log_message(self, message_type, content):
-        """记录日志信息"""
-        try:
-            # 获取当前时间
-            current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            
-            # 日志文件路径
-            log_file = os.path.join(LOG_DIR, f"mouse_control_log_{datetime.datetime.now().strftime('%Y-%m-%d')}.log")
-            
-            # 构建日志消息
-            log_message = f"[{current_time}] [{message_type}] {content}"
-            
-            # 打印到控制台
-            print(log_message)
-            
-            # 写入日志文件
-            with open(log_file, "a", encoding="utf-8") as f:
-                f.write(log_message + "\n")
-        except Exception as e:
-            print(f"日志记录失败: {e}")
+    def log_message(self, message_type, content, *args):
+        """记录日志信息（content带args时延迟格式化）"""
+        write_log(message_type, content, *args)
     
     def create_widgets(self):
         """创建界面组件"""
@@ -233,7 +210,8 @@ class IntegratedFloatingPanel:
         self.detector_container.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
         
         # 初始化屏幕检测工具（嵌入模式）
-        self.image_detector = FloatingImageDetector(parent=self.detector_container, embedded=True)
+        self.image_detector = FloatingImageDetector(parent=self.detector_container, embedded=True,
+                                                    monitor_loop=self.monitor_loop, ui_bridge=self.ui)
         
         # 鼠标控制区域
         mouse_frame = tk.LabelFrame(
@@ -330,11 +308,8 @@ class IntegratedFloatingPanel:
     
     def load_today_courses(self):
         """加载今日课程信息"""
-        # 获取当前星期几
-        current_day = "周" + "一二三四五六日"[datetime.datetime.now().weekday()]
-        
-        # 获取今日课程
-        today_courses = self.manager.get_courses_by_day(current_day)
+        # 获取今日课程（与控制逻辑共用同一个周课表索引，按开始时间排序）
+        today_courses = self.manager.get_today_courses()
         
         # 清空现有课程列表
         for item in self.course_tree.get_children():
@@ -352,596 +327,46 @@ class IntegratedFloatingPanel:
             # 如果没有今日课程，显示提示信息
             self.course_tree.insert("", tk.END, values=("今日无课程", "", ""))
     
-    def update_time(self):
-        """实时更新时间"""
-        try:
-            while True:
+    async def update_time(self):
+        """实时更新时间（事件循环中的协程，对齐到每秒整点刷新）"""
+        while True:
+            try:
                 # 获取当前时间
                 now = datetime.datetime.now()
                 current_time = now.strftime("%H:%M:%S")
                 current_date = now.strftime("%Y-%m-%d")
                 current_day = "周" + "一二三四五六日"[now.weekday()]
                 
-                # 更新UI - 使用after方法确保在主线程中更新
                 self.current_time = current_time
                 self.current_date = current_date
                 self.current_day = current_day
                 
-                # 使用after方法在主线程中更新UI，使用默认参数避免闭包问题
-                self.root.after(0, lambda ct=current_time: self.time_var.set(ct))
-                self.root.after(0, lambda cd=current_date, cdy=current_day: self.date_var.set(f"{cd} {cdy}"))
+                # 通过TkBridge在主线程中更新UI
+                self.ui.post("time", self.time_var.set, current_time)
+                self.ui.post("date", self.date_var.set, f"{current_date} {current_day}")
                 
                 # 每分钟检查一次是否需要重新加载课程（比如日期变更）
-                if now.second == 0 and now.minute % 1 == 0:
-                    self.root.after(0, self.load_today_courses)
-                
-                # 每秒更新一次
-                time.sleep(1)
-        except Exception as e:
-            print(f"时间更新出错: {e}")
-            # 使用after方法在主线程中记录日志
-            self.root.after(0, lambda e=e: self.log_message("错误", f"时间更新出错: {e}"))
-            time.sleep(1)
-    
-    def update_behavior_status(self, main_behavior, sub_behavior=None):
-        """更新行为状态显示"""
-        # 更新时间分类（上课时间/课间时间）
-        if main_behavior != self.current_main_behavior:
-            self.current_main_behavior = main_behavior
-            self.root.after(0, lambda: self.main_behavior_var.set(f"当前时间分类: {main_behavior}"))
-            self.log_message("状态", f"时间分类更新为: {main_behavior}")
-        
-        # 更新小行为状态
-        if sub_behavior is not None and sub_behavior != self.current_sub_behavior:
-            self.current_sub_behavior = sub_behavior
-            self.root.after(0, lambda: self.sub_behavior_var.set(f"当前小行为: {sub_behavior}"))
-            self.log_message("状态", f"小行为状态更新为: {sub_behavior}")
-        elif sub_behavior is None and self.current_sub_behavior != "等待中":
-            self.current_sub_behavior = "等待中"
-            self.root.after(0, lambda: self.sub_behavior_var.set(f"当前小行为: 等待中"))
-            self.log_message("状态", f"小行为状态更新为: 等待中")
-    
-    def match_image(self, image_path, threshold=0.85):
-        """在屏幕上查找指定图片的位置"""
-        try:
-            # 加载目标图片
-            target_image = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
-            if target_image is None:
-                self.log_message("错误", f"无法加载图片: {image_path}")
-                return None
-            
-            # 优先使用 mss 截图，失败则回退到 pyautogui
-            try:
-                import mss
-                with mss.mss() as sct:
-                    monitor = sct.monitors[0]
-                    img = np.array(sct.grab(monitor))  # BGRA
-                    bgr = cv2.cvtColor(img, cv2.COLOR_BGRA2BGR)
-                    screen_gray = cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY)
-            except Exception:
-                screenshot = pyautogui.screenshot()
-                screen_gray = cv2.cvtColor(np.array(screenshot), cv2.COLOR_RGB2GRAY)
-            
-            # 使用模板匹配
-            result = cv2.matchTemplate(screen_gray, target_image, cv2.TM_CCOEFF_NORMED)
-            min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
-            
-            if max_val >= threshold:
-                # 获取图片中心点
-                h, w = target_image.shape
-                center_x = max_loc[0] + w // 2
-                center_y = max_loc[1] + h // 2
-                self.log_message("操作", f"在屏幕上找到图片: {os.path.basename(image_path)}，匹配度: {max_val:.2f}，位置: ({center_x}, {center_y})")
-                return (center_x, center_y, max_val)
-            else:
-                self.log_message("判断", f"未找到匹配的图片: {os.path.basename(image_path)}，最高匹配度: {max_val:.2f}")
-                return None
-        except Exception as e:
-            self.log_message("错误", f"图片匹配出错: {e}")
-            return None
-    
-    def find_all_matches(self, image_path, threshold=0.85):
-        """在屏幕上查找所有匹配的图片位置"""
-        try:
-            # 加载目标图片
-            target_image = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
-            if target_image is None:
-                self.log_message("错误", f"无法加载图片: {image_path}")
-                return []
-            
-            # 优先使用 mss 截图，失败则回退到 pyautogui
-            try:
-                import mss
-                with mss.mss() as sct:
-                    monitor = sct.monitors[0]
-                    img = np.array(sct.grab(monitor))  # BGRA
-                    bgr = cv2.cvtColor(img, cv2.COLOR_BGRA2BGR)
-                    screen_gray = cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY)
-            except Exception:
-                screenshot = pyautogui.screenshot()
-                screen_gray = cv2.cvtColor(np.array(screenshot), cv2.COLOR_RGB2GRAY)
-            
-            # 使用模板匹配
-            result = cv2.matchTemplate(screen_gray, target_image, cv2.TM_CCOEFF_NORMED)
-            
-            # 查找所有匹配度大于阈值的位置
-            h, w = target_image.shape
-            matches = []
-            while True:
-                min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
-                if max_val >= threshold:
-                    # 计算中心点
-                    center_x = max_loc[0] + w // 2
-                    center_y = max_loc[1] + h // 2
-                    matches.append((center_x, center_y, max_val))
-                    
-                    # 在结果中标记已找到的位置，避免重复匹配
-                    cv2.rectangle(result, max_loc, (max_loc[0] + w, max_loc[1] + h), (-1), -1)
-                else:
-                    break
-            
-            if matches:
-                self.log_message("操作", f"在屏幕上找到 {len(matches)} 个匹配的图片: {os.path.basename(image_path)}")
-            else:
-                self.log_message("判断", f"未找到匹配的图片: {os.path.basename(image_path)}")
-            
-            return matches
-        except Exception as e:
-            self.log_message("错误", f"查找所有匹配图片出错: {e}")
-            return []
-    
-    def perform_mouse_click(self, x, y, description="点击操作"):
-        """执行鼠标点击操作"""
-        try:
-            # 获取当前鼠标位置
-            current_x, current_y = pyautogui.position()
-            self.log_message("操作", f"移动鼠标: 从({current_x}, {current_y})到({x}, {y})")
-            
-            # 移动鼠标到目标位置
-            pyautogui.moveTo(x, y, duration=0.2)
-            time.sleep(0.1)  # 等待鼠标移动完成
-            
-            # 执行点击
-            pyautogui.click()
-            self.log_message("操作", f"执行{description}，位置: ({x}, {y})")
-            return True
-        except Exception as e:
-            self.log_message("错误", f"鼠标点击操作出错: {e}")
-            return False
-    
-    def get_next_course(self):
-        """获取下一节课的信息"""
-        try:
-            now = datetime.datetime.now()
-            current_day = "周" + "一二三四五六日"[now.weekday()]
-            current_time = now.strftime("%H:%M")
-            
-            # 获取今日课程
-            today_courses = self.manager.get_courses_by_day(current_day)
-            
-            # 按照开始时间排序
-            today_courses.sort(key=lambda x: x["start_time"])
-            
-            # 查找下一节课
-            for course in today_courses:
-                if course["start_time"] > current_time:
-                    self.log_message("判断", f"找到下一节课: {course['course_name']}，开始时间: {course['start_time']}")
-                    return course
-            
-            self.log_message("判断", "今日没有更多课程")
-            return None
-        except Exception as e:
-            self.log_message("错误", f"获取下一节课信息出错: {e}")
-            return None
-    
-    def get_current_course_status(self):
-        """获取当前时间分类（上课时间或课间时间）"""
-        try:
-            now = datetime.datetime.now()
-            current_day = "周" + "一二三四五六日"[now.weekday()]
-            current_time = now.strftime("%H:%M")
-            
-            # 获取今日课程
-            today_courses = self.manager.get_courses_by_day(current_day)
-            
-            # 检查当前是否处于上课时间（当前时间在某节课的开始时间到结束时间之间）
-            current_course = None
-            for course in today_courses:
-                if course["start_time"] <= current_time <= course["end_time"]:
-                    current_course = course
-                    break
-            
-            if current_course:
-                self.log_message("判断", f"当前处于上课时间: {current_course['course_name']}")
-                return "上课时间", current_course
-            
-            # 检查是否处于课间时间（当前时间不在任何课程的时间段内）
-            # 查找下一节课信息（如果有）
-            next_course = None
-            for course in today_courses:
-                if course["start_time"] > current_time:
-                    if not next_course or course["start_time"] < next_course["start_time"]:
-                        next_course = course
-            
-            # 查找上一节课信息（如果有）
-            last_course = None
-            for course in today_courses:
-                if course["end_time"] < current_time:
-                    if not last_course or course["end_time"] > last_course["end_time"]:
-                        last_course = course
-            
-            self.log_message("判断", "当前处于课间时间")
-            return "课间时间", (last_course, next_course)
-        except Exception as e:
-            self.log_message("错误", f"获取当前时间分类出错: {e}")
-            return "课间时间", None
-    
-    def course_before_behavior(self, course):
-        """课程开始前行为"""
-        try:
-            self.update_behavior_status("课程开始前", "进入课程界面")
-            
-            # 检查当前界面是否为Course Menu
-            current_interface = self.image_detector.current_interface if self.image_detector else "未检测"
-            self.log_message("判断", f"当前界面: {current_interface}")
-            
-            if current_interface != "course_menu":
-                self.log_message("判断", "当前不是课程菜单界面，等待中...")
-                self.update_behavior_status("课程开始前", "等待中")
-                return False
-            
-            # 获取课程图标路径
-            course_icon_path = self.manager.get_course_icon_path(course["course_name"])
-            if not course_icon_path:
-                self.log_message("错误", f"未找到课程图标: {course['course_name']}")
-                return False
-            
-            # 在屏幕上查找课程图标
-            match_result = self.match_image(course_icon_path)
-            if match_result:
-                center_x, center_y, match_score = match_result
-                # 执行点击操作
-                return self.perform_mouse_click(center_x, center_y, f"点击{course['course_name']}课程图标")
-            else:
-                self.log_message("错误", f"未在屏幕上找到{course['course_name']}课程图标")
-                return False
-        except Exception as e:
-            self.log_message("错误", f"课程开始前行为出错: {e}")
-            return False
-    
-    def enter_poll_behavior(self):
-        """进入答题行为"""
-        try:
-            self.update_behavior_status("课程进行中", "进入答题行为")
-            
-            # 检查当前界面是否为Course Starts
-            current_interface = self.image_detector.current_interface if self.image_detector else "未检测"
-            self.log_message("判断", f"当前界面: {current_interface}")
-            
-            if current_interface != "course_starts":
-                self.log_message("判断", "当前不是课程开始界面，不执行进入答题行为")
-                return False
-            
-            # 获取join按钮图片路径
-            join_button_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "img", "test", "course_starts", "join.PNG")
-            if not os.path.exists(join_button_path):
-                self.log_message("错误", "未找到join按钮图片")
-                return False
+                if now.second == 0:
+                    self.ui.post("today_courses", self.load_today_courses)
+            except Exception as e:
+                print(f"时间更新出错: {e}")
+                self.log_message("错误", f"时间更新出错: {e}")
             
-            # 在屏幕上查找join按钮
-            match_result = self.match_image(join_button_path)
-            if match_result:
-                center_x, center_y, match_score = match_result
-                # 执行点击操作
-                return self.perform_mouse_click(center_x, center_y, "点击join按钮进入答题")
-            else:
-                self.log_message("错误", "未在屏幕上找到join按钮")
-                return False
-        except Exception as e:
-            self.log_message("错误", f"进入答题行为出错: {e}")
-            return False
+            # 等待到下一秒整点，避免累计漂移跳过整分钟
+            await asyncio.sleep(1.0 - time.time() % 1.0)
     
-    def answer_poll_behavior(self):
-        """答题行为"""
-        try:
-            # 检查是否需要限制重复点击（5秒间隔）
-            current_time = time.time()
-            if current_time - self.last_answer_click_time < 5:
-                self.log_message("判断", f"答题点击间隔不足5秒（当前间隔: {current_time - self.last_answer_click_time:.2f}秒），跳过点击")
-                return False
-            
-            self.update_behavior_status("课程进行中", "答题行为")
-            
-            # 检查当前界面是否为Poll Starts
-            current_interface = self.image_detector.current_interface if self.image_detector else "未检测"
-            self.log_message("判断", f"当前界面: {current_interface}")
-            
-            if current_interface != "poll_starts":
-                self.log_message("判断", "当前不是投票开始界面，不执行答题行为")
-                return False
-            
-            # 获取A选项图片路径
-            a_option_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "img", "click", "a.PNG")
-            if not os.path.exists(a_option_path):
-                self.log_message("错误", "未找到A选项图片")
-                return False
-            
-            # 在屏幕上查找A选项
-            match_result = self.match_image(a_option_path)
-            if match_result:
-                center_x, center_y, match_score = match_result
-                # 执行点击操作
-                success = self.perform_mouse_click(center_x, center_y, "点击A选项答题")
-                if success:
-                    # 更新最后点击时间
-                    self.last_answer_click_time = current_time
-                return success
-            else:
-                self.log_message("错误", "未在屏幕上找到A选项")
-                return False
-        except Exception as e:
-            self.log_message("错误", f"答题行为出错: {e}")
-            return False
+    def show_behavior_status(self, main_behavior, sub_behavior):
+        """显示监控引擎的行为状态（引擎的状态变化回调，可能在任意线程调用）"""
+        self.ui.post("main_behavior", self.main_behavior_var.set, f"当前时间分类: {main_behavior}")
+        self.ui.post("sub_behavior", self.sub_behavior_var.set, f"当前小行为: {sub_behavior}")
     
-    def exit_session_behavior(self):
-        """退出行为"""
+    def bind_space_key(self):
+        """通过Tk窗口绑定Space键停止鼠标控制（keyboard库不可用时的回退，需在主线程中调用）"""
         try:
-            # 检查当前界面是否为Leave Session
-            current_interface = self.image_detector.current_interface if self.image_detector else "未检测"
-            self.log_message("判断", f"当前界面: {current_interface}")
-            
-            if current_interface != "leave_session":
-                self.log_message("判断", "当前不是离开会话界面，不执行退出行为")
-                return False
-            
-            # 获取leave按钮图片路径
-            leave_button_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "img", "click", "leave.PNG")
-            if not os.path.exists(leave_button_path):
-                self.log_message("错误", "未找到leave按钮图片")
-                return False
-            
-            # 在屏幕上查找leave按钮
-            match_result = self.match_image(leave_button_path)
-            if match_result:
-                center_x, center_y, match_score = match_result
-                # 执行点击操作
-                return self.perform_mouse_click(center_x, center_y, "点击leave按钮退出会话")
-            else:
-                self.log_message("错误", "未在屏幕上找到leave按钮")
-                return False
-        except Exception as e:
-            self.log_message("错误", f"退出行为出错: {e}")
-            return False
-    
-    def return_behavior(self):
-        """返回行为"""
-        try:
-            # 检查点击间隔（5秒）
-            current_time = time.time()
-            if current_time - self.last_return_click_time < 5:
-                self.log_message("判断", f"返回点击间隔不足5秒（当前间隔: {current_time - self.last_return_click_time:.2f}秒），跳过点击")
-                return False
-            
-            # 检查当前界面是否需要返回
-            current_interface = self.image_detector.current_interface if self.image_detector else "未检测"
-            self.log_message("判断", f"当前界面: {current_interface}")
-            
-            if current_interface == "course_menu":
-                self.log_message("判断", "当前已在课程菜单界面，无需返回")
-                return False
-            
-            # 获取return按钮图片路径
-            return_button_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "img", "click", "return.PNG")
-            if not os.path.exists(return_button_path):
-                self.log_message("错误", "未找到return按钮图片")
-                return False
-            
-            # 在屏幕上查找所有匹配的return按钮
-            matches = self.find_all_matches(return_button_path)
-            if matches:
-                # 选择最左侧的匹配
-                leftmost_match = min(matches, key=lambda x: x[0])
-                center_x, center_y, match_score = leftmost_match
-                # 执行点击操作
-                success = self.perform_mouse_click(center_x, center_y, "点击最左侧的return按钮返回")
-                if success:
-                    # 更新最后点击时间
-                    self.last_return_click_time = current_time
-                return success
-            else:
-                self.log_message("错误", "未在屏幕上找到return按钮")
-                return False
-        except Exception as e:
-            self.log_message("错误", f"返回行为出错: {e}")
-            return False
-    
-    def send_answer_behavior(self):
-        """发送答案行为"""
-        try:
-            # 检查当前界面是否为send_answer
-            current_interface = self.image_detector.current_interface if self.image_detector else "未检测"
-            self.log_message("判断", f"当前界面: {current_interface}")
-            
-            if current_interface != "send_answer":
-                self.log_message("判断", "当前不是发送答案界面，不执行发送答案行为")
-                return False
-            
-            # 获取sendanswer按钮图片路径
-            send_answer_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "img", "test", "send_answer", "sendanswer.PNG")
-            if not os.path.exists(send_answer_path):
-                self.log_message("错误", "未找到sendanswer按钮图片")
-                return False
-            
-            # 在屏幕上查找sendanswer按钮
-            match_result = self.match_image(send_answer_path)
-            if match_result:
-                center_x, center_y, match_score = match_result
-                # 执行点击操作
-                return self.perform_mouse_click(center_x, center_y, "点击sendanswer按钮发送答案")
-            else:
-                self.log_message("错误", "未在屏幕上找到sendanswer按钮")
-                return False
-        except Exception as e:
-            self.log_message("错误", f"发送答案行为出错: {e}")
-            return False
-    
-    def mouse_control_logic(self):
-        """鼠标控制主逻辑"""
-        try:
-            self.log_message("重要", "鼠标控制功能启动")
-            self.log_message("调试", "鼠标控制主逻辑线程已启动")
-            
-            # 启动屏幕检测
-            if self.image_detector and not self.image_detector.is_detecting:
-                self.log_message("调试", "检测到屏幕检测未启动，准备启动")
-                self.image_detector.toggle_detection()
-                self.log_message("操作", "启动屏幕检测")
-                self.log_message("调试", "屏幕检测启动完成")
-            
-            # 设置键盘中断
-            self.log_message("调试", "准备设置键盘中断")
-            try:
-                keyboard.on_press_key('space', lambda _: self.stop_mouse_control())
-                self.log_message("调试", "键盘中断设置完成（keyboard库）")
-            except Exception as e:
-                self.log_message("错误", f"设置键盘中断失败，回退到Tk绑定: {e}")
-                try:
-                    self.root.unbind('<space>')
-                except Exception:
-                    pass
-                self.root.bind('<space>', lambda event: self.stop_mouse_control())
-                self.log_message("操作", "已通过Tk窗口绑定Space键以停止鼠标控制")
-            
-            while self.mouse_control_running:
-                try:
-                    self.log_message("调试", "进入鼠标控制主循环")
-                    # 获取当前时间分类
-                    self.log_message("调试", "准备获取当前时间分类")
-                    time_category, time_info = self.get_current_course_status()
-                    self.log_message("调试", f"当前时间分类: {time_category}, 详细信息: {time_info}")
-                    
-                    if time_category == "上课时间":
-                        self.log_message("调试", "当前处于上课时间")
-                        # 上课时间行为
-                        current_course = time_info
-                        
-                        # 检查当前界面，执行相应的小行为
-                        current_interface = self.image_detector.current_interface if self.image_detector else "未检测"
-                        self.log_message("调试", f"当前界面: {current_interface}")
-                        
-                        if current_interface == "course_menu":
-                            # 当检测到Course Menu界面时，点击当前正在进行的课程图标（课程开始前行为）
-                            self.log_message("判断", f"当前界面为Course Menu，且当前有课程进行中: {current_course['course_name']}")
-                            self.update_behavior_status("上课时间", "课程开始前行为")
-                            
-                            # 获取当前课程图标路径
-                            self.log_message("调试", f"准备获取当前课程图标: {current_course['course_name']}")
-                            course_icon_path = self.manager.get_course_icon_path(current_course["course_name"])
-                            if not course_icon_path:
-                                self.log_message("错误", f"未找到当前课程图标: {current_course['course_name']}")
-                            else:
-                                self.log_message("调试", f"当前课程图标路径: {course_icon_path}")
-                                # 在屏幕上查找课程图标
-                                match_result = self.match_image(course_icon_path)
-                                if match_result:
-                                    center_x, center_y, match_score = match_result
-                                    self.log_message("调试", f"找到课程图标，位置: ({center_x}, {center_y})，匹配度: {match_score}")
-                                    # 执行点击操作
-                                    self.perform_mouse_click(center_x, center_y, f"点击{current_course['course_name']}课程图标")
-                                else:
-                                    self.log_message("错误", f"未在屏幕上找到{current_course['course_name']}课程图标")
-                        elif current_interface == "course_starts":
-                            # 进入答题行为
-                            self.update_behavior_status("上课时间", "进入答题行为")
-                            self.log_message("调试", "准备执行进入答题行为")
-                            self.enter_poll_behavior()
-                            self.log_message("调试", "进入答题行为执行完成")
-                        elif current_interface == "poll_starts":
-                            # 答题行为
-                            self.update_behavior_status("上课时间", "答题行为")
-                            self.log_message("调试", "准备执行答题行为")
-                            self.answer_poll_behavior()
-                            self.log_message("调试", "答题行为执行完成")
-                        elif current_interface == "send_answer":
-                            # 发送答案行为
-                            self.update_behavior_status("上课时间", "发送答案行为")
-                            self.log_message("调试", "准备执行发送答案行为")
-                            self.send_answer_behavior()
-                            self.log_message("调试", "发送答案行为执行完成")
-                        else:
-                            # 当前没有可执行的小行为
-                            self.log_message("调试", f"未检测到特定界面: {current_interface}，更新为等待中")
-                            self.update_behavior_status("上课时间", "等待中")
-                    
-                    elif time_category == "课间时间":
-                        self.log_message("调试", "当前处于课间时间")
-                        # 课间时间行为
-                        last_course, next_course = time_info if isinstance(time_info, tuple) else (None, None)
-                        self.log_message("调试", f"上一节课: {last_course}, 下一节课: {next_course}")
-                        
-                        # 检查当前界面，执行退出或返回行为
-                        current_interface = self.image_detector.current_interface if self.image_detector else "未检测"
-                        self.log_message("调试", f"当前界面: {current_interface}")
-                        
-                        if current_interface == "course_menu":
-                            # 当前已在课程菜单界面，无需操作
-                            self.log_message("调试", "当前已在course_menu界面，更新为等待中")
-                            self.update_behavior_status("课间时间", "等待中")
-                        else:
-                            # 首先检查是否有退出行为（优先级更高）
-                            if current_interface == "leave_session":
-                                # 退出行为
-                                self.log_message("调试", "检测到leave_session界面，准备执行退出行为")
-                                self.update_behavior_status("课间时间", "退出行为")
-                                self.exit_session_behavior()
-                                self.log_message("调试", "退出行为执行完成")
-                            else:
-                                # 检查是否存在返回按钮，只要存在就执行返回行为
-                                return_button_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "img", "click", "return.PNG")
-                                if os.path.exists(return_button_path):
-                                    # 在屏幕上查找所有匹配的return按钮
-                                    matches = self.find_all_matches(return_button_path)
-                                    if matches:
-                                        self.log_message("调试", f"检测到返回按钮，准备执行返回行为")
-                                        self.update_behavior_status("课间时间", "返回行为")
-                                        self.return_behavior()
-                                        self.log_message("调试", "返回行为执行完成")
-                                    else:
-                                        self.log_message("调试", "未检测到返回按钮，更新为等待中")
-                                        self.update_behavior_status("课间时间", "等待中")
-                                else:
-                                    self.log_message("错误", "未找到return按钮图片")
-                                    self.update_behavior_status("课间时间", "等待中")
-                    
-                    else:
-                        # 未知状态，等待中
-                        self.log_message("调试", f"当前时间分类未知: {time_category}，更新为等待中")
-                        self.update_behavior_status("未知", "等待中")
-                    
-                    # 控制循环频率
-                    self.log_message("调试", "准备进入休眠状态")
-                    time.sleep(0.5)
-                    self.log_message("调试", "休眠结束，继续下一次循环")
-                    
-                except Exception as e:
-                    self.log_message("错误", f"鼠标控制逻辑循环出错: {e}")
-                    import traceback
-                    self.log_message("错误", f"错误堆栈: {traceback.format_exc()}")
-                    time.sleep(1)
-                    self.log_message("调试", "错误处理完成，继续下一次循环")
-        except Exception as e:
-            self.log_message("错误", f"鼠标控制主逻辑出错: {e}")
-            import traceback
-            self.log_message("错误", f"错误堆栈: {traceback.format_exc()}")
-        finally:
-            # 移除键盘监听
-            self.log_message("调试", "准备移除键盘监听")
-            try:
-                keyboard.unhook_all()
-            except Exception as e:
-                self.log_message("错误", f"移除键盘监听失败: {e}")
-            self.log_message("调试", "键盘监听移除完成")
-            self.log_message("重要", "鼠标控制功能停止")
+            self.root.unbind('<space>')
+        except Exception:
+            pass
+        self.root.bind('<space>', lambda event: self.stop_mouse_control())
     
     # 不再需要程序控制功能，因为按钮已被删除
     
@@ -957,26 +382,28 @@ class IntegratedFloatingPanel:
             
             # 更新界面状态
             self.log_message("调试", "准备更新界面状态")
-            self.mouse_control_running = True
             self.start_mouse_button.config(state=tk.DISABLED)
             self.stop_mouse_button.config(state=tk.NORMAL)
             self.mouse_status_var.set("鼠标控制已启动")
             self.mouse_status_label.config(fg="#2ecc71")
             self.log_message("调试", "界面状态更新完成")
             
-            # 重置行为状态显示
-            self.log_message("调试", "准备重置行为状态显示")
-            self.update_behavior_status("准备中", "初始化")
-            self.log_message("调试", "行为状态显示重置完成")
-            
-            # 启动鼠标控制线程
-            self.log_message("调试", "准备启动鼠标控制线程")
-            self.mouse_control_thread = threading.Thread(target=self.mouse_control_logic)
-            self.mouse_control_thread.daemon = True
-            self.mouse_control_thread.start()
-            self.log_message("调试", "鼠标控制线程已启动")
+            # 设置键盘中断
+            self.log_message("调试", "准备设置键盘中断")
+            try:
+                keyboard.on_press_key('space', lambda _: self.stop_mouse_control())
+                self.log_message("调试", "键盘中断设置完成（keyboard库）")
+            except Exception as e:
+                self.log_message("错误", f"设置键盘中断失败，回退到Tk绑定: {e}")
+                self.bind_space_key()
+                self.log_message("操作", "已通过Tk窗口绑定Space键以停止鼠标控制")
             
-            self.log_message("重要", "鼠标控制功能启动")
+            # 由监控引擎在事件循环中启动鼠标控制协程
+            self.log_message("调试", "准备启动鼠标控制协程")
+            if not self.engine.start_control():
+                self.stop_mouse_control()
+                return
+            self.log_message("调试", "鼠标控制协程已启动")
         except Exception as e:
             self.log_message("错误", f"启动鼠标控制功能出错: {e}")
             import traceback
@@ -986,25 +413,17 @@ class IntegratedFloatingPanel:
     def stop_mouse_control(self):
         """停止鼠标控制功能"""
         try:
-            # 停止鼠标控制线程
-            self.mouse_control_running = False
-            
-            if self.mouse_control_thread:
-                self.mouse_control_thread.join(timeout=2.0)
+            # 取消鼠标控制协程（正在等待的界面切换事件会立即结束）
+            self.engine.stop_control()
             
             # 移除键盘监听
             keyboard.unhook_all()
             
-            # 更新界面状态
-            self.start_mouse_button.config(state=tk.NORMAL)
-            self.stop_mouse_button.config(state=tk.DISABLED)
-            self.mouse_status_var.set("鼠标控制已停止")
-            self.mouse_status_label.config(fg="#e74c3c")
-            
-            # 重置行为状态显示
-            self.update_behavior_status("未启动", "等待中")
-            
-            self.log_message("重要", "鼠标控制功能停止")
+            # 更新界面状态（可能由keyboard库的监听线程调用，交给主线程执行）
+            self.ui.post("start_mouse_button", self.start_mouse_button.config, {"state": tk.NORMAL})
+            self.ui.post("stop_mouse_button", self.stop_mouse_button.config, {"state": tk.DISABLED})
+            self.ui.post("mouse_status", self.mouse_status_var.set, "鼠标控制已停止")
+            self.ui.post("mouse_status_color", self.mouse_status_label.config, {"fg": "#e74c3c"})
         except Exception as e:
             self.log_message("错误", f"停止鼠标控制功能出错: {e}")
     
@@ -1045,7 +464,10 @@ class IntegratedFloatingPanel:
             
             # 停止鼠标控制
             self.log_message("调试", "准备停止鼠标控制")
-            self.mouse_control_running = False
+            if self.engine:
+                self.engine.control_running = False
+            if self.image_detector:
+                self.image_detector.interface_events.wake()
             
             # 移除键盘监听
             self.log_message("调试", "准备移除键盘监听")
@@ -1068,14 +490,11 @@ class IntegratedFloatingPanel:
                     import traceback
                     self.log_message("错误", f"错误堆栈: {traceback.format_exc()}")
             
-            # 确保所有线程都已停止
-            self.log_message("调试", "准备确保所有线程都已停止")
-            self.time_update_thread = None
-            self.detection_thread = None
-            if self.mouse_control_thread:
-                self.log_message("调试", "等待鼠标控制线程结束")
-                self.mouse_control_thread.join(timeout=1.0)
-                self.log_message("调试", "鼠标控制线程结束")
+            # 取消事件循环中的所有协程并停止事件循环
+            self.log_message("调试", "准备停止事件循环")
+            self.monitor_loop.stop(timeout=1.0)
+            self.ui.stop()
+            self.log_message("调试", "事件循环已停止")
             
             self.log_message("重要", "程序退出")
             
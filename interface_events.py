@@ -0,0 +1,109 @@
+import threading
+import time
+from collections import namedtuple
+
+from monitor_loop import AsyncWaiters
+
+# 界面切换事件：事件序号、新界面、原界面、触发帧序号、时间戳、新界面各模板的匹配结果{模板名称: TemplateMatch}
+InterfaceEvent = namedtuple(
+    "InterfaceEvent", ["event_id", "interface", "previous", "frame_id", "timestamp", "matches"])
+
+
+class TemplateMatch(namedtuple(
+        "TemplateMatch", ["name", "left", "top", "width", "height", "score", "frame_id", "timestamp"])):
+    """一次成功的模板匹配：模板名称、左上角坐标、尺寸、匹配分数、所在帧序号和确认时间"""
+    __slots__ = ()
+
+    @property
+    def center(self):
+        """匹配区域的中心点坐标"""
+        return self.left + self.width // 2, self.top + self.height // 2
+
+
+class InterfaceEventChannel:
+    """界面切换事件通道
+
+    检测协程在识别结果变化时发布事件，控制逻辑等待序号更大的事件（线程中使用wait_for_event()，
+    协程中使用wait_for_event_async()），界面变化后一帧之内即可被唤醒，没有变化时不消耗CPU。
+    """
+
+    def __init__(self, history_size=32):
+        """
+        Args:
+            history_size: 保留的最近事件数量
+        """
+        self.history_size = history_size
+        self._condition = threading.Condition()
+        self._events = []
+        self._next_event_id = 1
+        self._wake_count = 0
+        self._async_waiters = AsyncWaiters()
+
+    def publish(self, interface, previous, frame_id=None, matches=None):
+        """发布一次界面切换事件并唤醒所有等待者，返回发布的InterfaceEvent"""
+        with self._condition:
+            event = InterfaceEvent(self._next_event_id, interface, previous, frame_id,
+                                   time.time(), matches or {})
+            self._next_event_id += 1
+            self._events.append(event)
+            if len(self._events) > self.history_size:
+                del self._events[0]
+            self._condition.notify_all()
+        self._async_waiters.notify_all()
+        return event
+
+    def latest(self):
+        """获取最近一次事件，尚无事件时返回None"""
+        with self._condition:
+            return self._events[-1] if self._events else None
+
+    def events_since(self, after_event_id):
+        """获取序号大于after_event_id的所有已保留事件"""
+        with self._condition:
+            return [event for event in self._events if event.event_id > after_event_id]
+
+    def wake(self):
+        """唤醒所有等待者（例如停止控制线程时），等待方将返回None"""
+        with self._condition:
+            self._wake_count += 1
+            self._condition.notify_all()
+        self._async_waiters.notify_all()
+
+    def wait_for_event(self, after_event_id=0, timeout=None):
+        """等待一个序号大于after_event_id的事件
+
+        Args:
+            after_event_id: 已处理过的最后事件序号
+            timeout: 最长等待时间（秒），None表示一直等待
+
+        Returns:
+            InterfaceEvent: 最新的事件；超时或被wake()唤醒时返回None
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        with self._condition:
+            wake_count = self._wake_count
+            while True:
+                if self._events and self._events[-1].event_id > after_event_id:
+                    return self._events[-1]
+                if self._wake_count != wake_count:
+                    return None
+                if deadline is None:
+                    self._condition.wait()
+                else:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        return None
+                    self._condition.wait(remaining)
+
+    async def wait_for_event_async(self, after_event_id=0, timeout=None):
+        """协程版本的wait_for_event()，等待期间不占用线程，可被取消"""
+        with self._condition:
+            wake_count = self._wake_count
+
+        def check():
+            with self._condition:
+                if self._events and self._events[-1].event_id > after_event_id:
+                    return True, self._events[-1]
+                return self._wake_count != wake_count, None
+
+        return await self._async_waiters.wait_for(check, timeout)
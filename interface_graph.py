@@ -0,0 +1,41 @@
+# iClicker界面之间的切换关系：{界面名称: 之后可能出现的界面（按可能性排序）}
+# 课程菜单 → 课程未开始/课程已开始 → 等待答题 → 答题 → 发送答案/已作答 → 退出会话 → 课程菜单
+# 老师可能在答题界面直接结束会话，因此发送答案/已作答之后也可能直接出现退出会话
+# course_starts与course_not_started、send_answer与poll_answered可能同时出现并有优先级，互相列为后继以保证一起检查
+INTERFACE_TRANSITIONS = {
+    "course_menu": ("course_not_started", "course_starts"),
+    "course_not_started": ("course_starts", "course_menu"),
+    "course_starts": ("wait_polls1", "poll_starts", "course_not_started"),
+    "wait_polls1": ("poll_starts", "leave_session"),
+    "poll_starts": ("send_answer", "poll_answered", "wait_polls1"),
+    "send_answer": ("poll_answered", "poll_starts", "wait_polls1", "leave_session"),
+    "poll_answered": ("send_answer", "wait_polls1", "poll_starts", "leave_session"),
+    "leave_session": ("course_menu", "wait_polls1"),
+}
+
+
+class InterfaceGraph:
+    """界面切换图
+
+    检测器处于某个界面时，下一帧只需要检查该界面本身和它的后继界面；
+    不在图中的界面（例如"未检测"）没有后继信息，需要检查全部界面。
+    """
+
+    def __init__(self, transitions=None):
+        """
+        Args:
+            transitions: {界面名称: [后继界面, ...]}，None时使用INTERFACE_TRANSITIONS
+        """
+        transitions = INTERFACE_TRANSITIONS if transitions is None else transitions
+        self.transitions = {name: tuple(successors) for name, successors in transitions.items()}
+
+    def successors(self, interface_name):
+        """指定界面之后可能出现的界面，不在图中时返回None"""
+        return self.transitions.get(interface_name)
+
+    def likely_interfaces(self, interface_name):
+        """处于指定界面时下一帧要检查的界面（当前界面在前，其后按可能性排序），不在图中时返回None"""
+        successors = self.successors(interface_name)
+        if successors is None:
+            return None
+        return (interface_name,) + tuple(name for name in successors if name != interface_name)
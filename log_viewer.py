@@ -0,0 +1,630 @@
+import argparse
+import datetime
+import glob
+import mmap
+import os
+import sys
+import time
+from collections import namedtuple
+
+import numpy as np
+import tkinter as tk
+from tkinter import ttk, messagebox, filedialog
+
+from log_writer import CATEGORY_LEVELS, LOG_DIR
+
+# 一条日志：时间（"YYYY-MM-DD HH:MM:SS"）、类别标签、内容（含续行）、所在文件、文件内偏移
+LogEntry = namedtuple("LogEntry", ["timestamp", "tag", "content", "path", "offset"])
+
+# 日志行格式：[YYYY-MM-DD HH:MM:SS] [标签] 内容；这些位置上必须是固定的分隔字符
+_LINE_PATTERN = {0: b"[", 5: b"-", 8: b"-", 11: b" ", 14: b":", 17: b":", 20: b"]", 21: b" ", 22: b"["}
+# 时间字段各数字在行内的位置及其在 YYYYMMDDhhmmss 整数中的权重
+_DIGIT_WEIGHTS = [(1, 10 ** 13), (2, 10 ** 12), (3, 10 ** 11), (4, 10 ** 10), (6, 10 ** 9), (7, 10 ** 8),
+                  (9, 10 ** 7), (10, 10 ** 6), (12, 10 ** 5), (13, 10 ** 4), (15, 10 ** 3), (16, 10 ** 2),
+                  (18, 10), (19, 1)]
+_TAG_START = 23  # 标签在行内的起始位置
+_TAG_WINDOW = 24  # 标签（含右括号）最多占用的字节数
+
+
+def to_stamp(value, upper=False):
+    """把datetime或"YYYY-MM-DD[ HH:MM[:SS]]"字符串转换为YYYYMMDDhhmmss形式的整数
+
+    Args:
+        value: datetime或时间字符串，None时返回None
+        upper: 作为结束时间（含）解析：字符串省略的部分补到该精度的末尾，
+            例如"2026-01-05"为当天23:59:59，"2026-01-05 09:30"为09:30:59
+    """
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.strip()
+        # 格式及其精度的末尾相对于解析结果的偏移
+        for fmt, span in (("%Y-%m-%d %H:%M:%S", datetime.timedelta(0)),
+                          ("%Y-%m-%d %H:%M", datetime.timedelta(seconds=59)),
+                          ("%Y-%m-%d", datetime.timedelta(hours=23, minutes=59, seconds=59))):
+            try:
+                value = datetime.datetime.strptime(value, fmt)
+                break
+            except ValueError:
+                continue
+        else:
+            raise ValueError(f"无法识别的时间: {value}")
+        if upper:
+            value += span
+    return int(value.strftime("%Y%m%d%H%M%S"))
+
+
+def format_stamp(stamp):
+    """把YYYYMMDDhhmmss整数格式化为"YYYY-MM-DD HH:MM:SS" """
+    text = f"{int(stamp):014d}"
+    return f"{text[0:4]}-{text[4:6]}-{text[6:8]} {text[8:10]}:{text[10:12]}:{text[12:14]}"
+
+
+class LogFileIndex:
+    """单个日志文件的索引
+
+    索引只记录每条日志的起始偏移、时间（YYYYMMDDhhmmss整数）和标签编号，
+    日志正文按需从内存映射的文件中读取。没有时间戳的行（例如错误堆栈）归入上一条日志。
+    索引保存为旁路文件（<索引目录>/<日志文件名>.npz），文件追加内容后只扫描新增的部分。
+    """
+
+    def __init__(self, path, index_dir):
+        """
+        Args:
+            path: 日志文件路径
+            index_dir: 旁路索引文件所在文件夹
+        """
+        self.path = path
+        self.index_path = os.path.join(index_dir, os.path.basename(path) + ".npz")
+        self.offsets = np.zeros(0, dtype=np.int64)
+        self.stamps = np.zeros(0, dtype=np.int64)
+        self.tags = np.zeros(0, dtype=np.uint16)
+        self.tag_names = []
+        self.indexed_size = 0  # 已索引的字节数（总是以完整的一行结束）
+        self.head = b""  # 文件开头的字节，用于发现文件被替换
+        self.sorted = True  # 时间是否单调不减（可以二分查找）
+        self._unsaved = 0  # 上次保存后新增的条数
+        self._loaded = False
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def _load(self):
+        """读取旁路索引文件"""
+        self._loaded = True
+        try:
+            if not os.path.exists(self.index_path):
+                return
+            with np.load(self.index_path, allow_pickle=False) as data:
+                self.offsets = data["offsets"]
+                self.stamps = data["stamps"]
+                self.tags = data["tags"]
+                self.tag_names = [str(name) for name in data["tag_names"]]
+                self.indexed_size = int(data["indexed_size"])
+                self.head = data["head"].tobytes()
+            self.sorted = bool(len(self.stamps) < 2 or np.all(np.diff(self.stamps) >= 0))
+        except Exception as e:
+            print(f"读取日志索引出错，将重新建立: {e}")
+            self._reset()
+
+    def _reset(self):
+        """清空索引"""
+        self.offsets = np.zeros(0, dtype=np.int64)
+        self.stamps = np.zeros(0, dtype=np.int64)
+        self.tags = np.zeros(0, dtype=np.uint16)
+        self.tag_names = []
+        self.indexed_size = 0
+        self.head = b""
+        self.sorted = True
+
+    def save(self):
+        """把索引写入旁路文件（没有新内容时不写）"""
+        if not self._unsaved:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+            temp_path = self.index_path + ".tmp.npz"
+            np.savez(temp_path, offsets=self.offsets, stamps=self.stamps, tags=self.tags,
+                     tag_names=np.array(self.tag_names, dtype=str), indexed_size=self.indexed_size,
+                     head=np.frombuffer(self.head, dtype=np.uint8))
+            os.replace(temp_path, self.index_path)
+            self._unsaved = 0
+        except Exception as e:
+            print(f"保存日志索引出错: {e}")
+
+    def refresh(self):
+        """增量更新索引，返回新增的条数"""
+        if not self._loaded:
+            self._load()
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            self._reset()
+            return 0
+        if size == 0:
+            return 0
+        with open(self.path, "rb") as f:
+            head = f.read(64)
+            # 文件变小或开头变化说明被替换或截断，重新建立索引
+            if size < self.indexed_size or head[:len(self.head)] != self.head:
+                self._reset()
+            self.head = head
+            if size == self.indexed_size:
+                return 0
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                added = self._scan(mm, self.indexed_size, size)
+        self._unsaved += added
+        return added
+
+    def _scan(self, mm, begin, end):
+        """扫描[begin, end)范围内的完整行，追加日志起始位置、时间和标签"""
+        buf = np.frombuffer(mm, dtype=np.uint8, count=end - begin, offset=begin)
+        try:
+            newlines = np.flatnonzero(buf == 10)
+            if len(newlines) == 0:
+                return 0
+            starts = np.concatenate(([0], newlines[:-1] + 1))
+            lengths = newlines - starts
+            starts = starts[lengths > _TAG_START]
+            # 只保留符合"[日期 时间] ["格式的行
+            for position, char in _LINE_PATTERN.items():
+                starts = starts[buf[starts + position] == char[0]]
+            stamps = np.zeros(len(starts), dtype=np.int64)
+            for position, weight in _DIGIT_WEIGHTS:
+                stamps += (buf[starts + position].astype(np.int64) - 48) * weight
+
+            # 标签：从行内第23个字节到第一个"]"，一次性取出固定宽度的窗口后按行去重
+            window = starts[:, None] + (_TAG_START + np.arange(_TAG_WINDOW))
+            window = buf[np.minimum(window, len(buf) - 1)]
+            is_close = window == ord("]")
+            has_close = is_close.any(axis=1)
+            close_at = np.where(has_close, is_close.argmax(axis=1), 0)
+            window[np.arange(_TAG_WINDOW)[None, :] >= close_at[:, None]] = 0
+            keys = np.ascontiguousarray(window).view(f"V{_TAG_WINDOW}").ravel()
+            unique_keys, inverse = np.unique(keys, return_inverse=True)
+            codes = np.zeros(len(unique_keys), dtype=np.uint16)
+            for i, key in enumerate(unique_keys):
+                name = key.tobytes().rstrip(b"\0").decode("utf-8", errors="replace")
+                if name not in self.tag_names:
+                    self.tag_names.append(name)
+                codes[i] = self.tag_names.index(name)
+            tags = codes[inverse.ravel()]
+
+            offsets = starts.astype(np.int64) + begin
+            if len(self.stamps) and len(stamps):
+                self.sorted = self.sorted and bool(stamps[0] >= self.stamps[-1])
+            if len(stamps) > 1:
+                self.sorted = self.sorted and bool(np.all(np.diff(stamps) >= 0))
+            self.offsets = np.concatenate((self.offsets, offsets))
+            self.stamps = np.concatenate((self.stamps, stamps))
+            self.tags = np.concatenate((self.tags, tags))
+            self.indexed_size = begin + int(newlines[-1]) + 1
+            return len(offsets)
+        finally:
+            # 释放对内存映射的引用，否则无法关闭mmap
+            del buf
+
+    def select(self, start=None, end=None, tags=None):
+        """按时间范围和标签筛选，返回符合条件的日志序号数组"""
+        lo, hi = 0, len(self.stamps)
+        mask = None
+        if self.sorted:
+            if start is not None:
+                lo = int(np.searchsorted(self.stamps, start, side="left"))
+            if end is not None:
+                hi = int(np.searchsorted(self.stamps, end, side="right"))
+        else:
+            mask = np.ones(len(self.stamps), dtype=bool)
+            if start is not None:
+                mask &= self.stamps >= start
+            if end is not None:
+                mask &= self.stamps <= end
+        indices = np.arange(lo, max(lo, hi)) if mask is None else np.flatnonzero(mask)
+        if tags is not None:
+            codes = [self.tag_names.index(tag) for tag in tags if tag in self.tag_names]
+            indices = indices[np.isin(self.tags[indices], codes)]
+        return indices
+
+    def entry_end(self, index):
+        """第index条日志的结束偏移"""
+        return int(self.offsets[index + 1]) if index + 1 < len(self.offsets) else self.indexed_size
+
+    def filter_text(self, mm, indices, text):
+        """只保留正文包含text的日志：在映射的文件中查找关键字，再按偏移归入对应的日志"""
+        if len(indices) == 0:
+            return indices
+        needle = text.encode("utf-8")
+        begin = int(self.offsets[indices[0]])
+        end = self.entry_end(int(indices[-1]))
+        hits = []
+        position = mm.find(needle, begin, end)
+        while position != -1:
+            entry = int(np.searchsorted(self.offsets, position, side="right")) - 1
+            hits.append(entry)
+            # 同一条日志只需命中一次，从下一条日志开始继续查找
+            next_begin = self.entry_end(entry)
+            position = mm.find(needle, next_begin, end) if next_begin < end else -1
+        return indices[np.isin(indices, hits)]
+
+    def read_entries(self, mm, indices):
+        """读取指定序号的日志正文"""
+        entries = []
+        for index in indices:
+            index = int(index)
+            offset = int(self.offsets[index])
+            raw = mm[offset:self.entry_end(index)].decode("utf-8", errors="replace").rstrip("\r\n")
+            tag = self.tag_names[int(self.tags[index])]
+            # 去掉"[时间] [标签] "前缀
+            content = raw[_TAG_START + len(tag) + 2:]
+            entries.append(LogEntry(format_stamp(self.stamps[index]), tag, content, self.path, offset))
+        return entries
+
+
+class LogIndex:
+    """logs文件夹中所有按天日志文件的索引
+
+    每个文件一个LogFileIndex；按时间查询时先根据文件名中的日期跳过范围外的文件，
+    文件内部用二分查找定位时间范围，标签用数组筛选，关键字在内存映射上直接查找，
+    只有最终返回的日志才会被解码，因此查询几个月的日志也不需要逐行扫描。
+    """
+
+    def __init__(self, log_dir=LOG_DIR, prefix="mouse_control_log_", index_dir=None, save_threshold=5000):
+        """
+        Args:
+            log_dir: 日志文件夹
+            prefix: 日志文件名前缀，文件名为 <前缀><YYYY-MM-DD>.log
+            index_dir: 旁路索引文件夹，默认 <日志文件夹>/.index
+            save_threshold: 新增多少条后自动保存旁路索引（正在写入的文件）
+        """
+        self.log_dir = log_dir
+        self.prefix = prefix
+        self.index_dir = index_dir or os.path.join(log_dir, ".index")
+        self.save_threshold = save_threshold
+        self.files = {}  # 文件路径 -> LogFileIndex
+
+    def _file_date(self, path):
+        """从文件名中取出日期整数 YYYYMMDD，无法识别时返回None"""
+        name = os.path.basename(path)[len(self.prefix):-len(".log")]
+        try:
+            return int(name.replace("-", ""))
+        except ValueError:
+            return None
+
+    def refresh(self):
+        """发现新文件并增量更新所有文件的索引，返回新增的条数"""
+        added = 0
+        paths = sorted(glob.glob(os.path.join(self.log_dir, f"{self.prefix}*.log")))
+        for path in paths:
+            file_index = self.files.get(path)
+            if file_index is None:
+                file_index = self.files[path] = LogFileIndex(path, self.index_dir)
+            count = file_index.refresh()
+            added += count
+            # 已结束的日期文件立即保存；正在写入的文件累计到一定条数再保存
+            if file_index._unsaved and (path != paths[-1] or file_index._unsaved >= self.save_threshold):
+                file_index.save()
+        for path in list(self.files):
+            if path not in paths:
+                del self.files[path]
+        return added
+
+    def save(self):
+        """保存所有文件的旁路索引"""
+        for file_index in self.files.values():
+            file_index.save()
+
+    def tag_names(self):
+        """所有出现过的标签"""
+        names = []
+        for file_index in self.files.values():
+            for name in file_index.tag_names:
+                if name not in names:
+                    names.append(name)
+        return names
+
+    def __len__(self):
+        return sum(len(file_index) for file_index in self.files.values())
+
+    def _candidate_files(self, start, end):
+        """按文件名中的日期跳过时间范围以外的文件"""
+        for path in sorted(self.files):
+            date = self._file_date(path)
+            if date is not None:
+                if start is not None and date < start // 10 ** 6:
+                    continue
+                if end is not None and date > end // 10 ** 6:
+                    continue
+            yield self.files[path]
+
+    def query(self, start=None, end=None, tags=None, text=None, limit=None, last=False):
+        """查询日志
+
+        Args:
+            start: 开始时间（datetime、"YYYY-MM-DD HH:MM[:SS]"字符串），None表示不限
+            end: 结束时间（含，字符串省略的时分秒补到该精度的末尾），None表示不限
+            tags: 标签列表，例如["操作", "错误"]，None表示全部
+            text: 正文包含的关键字，None表示不限
+            limit: 最多返回的条数，None表示不限
+            last: limit生效时返回最后的limit条（默认返回最早的）
+
+        Returns:
+            list: 按时间顺序排列的LogEntry
+        """
+        start, end = to_stamp(start), to_stamp(end, upper=True)
+        files = list(self._candidate_files(start, end))
+        if last:
+            files.reverse()
+        results = []
+        for file_index in files:
+            indices = file_index.select(start, end, tags)
+            if len(indices) == 0:
+                continue
+            with open(file_index.path, "rb") as f:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    if text:
+                        indices = file_index.filter_text(mm, indices, text)
+                    if limit is not None:
+                        remaining = limit - len(results)
+                        indices = indices[-remaining:] if last else indices[:remaining]
+                    entries = file_index.read_entries(mm, indices)
+            results = entries + results if last else results + entries
+            if limit is not None and len(results) >= limit:
+                break
+        return results
+
+    def tail(self, count=50, **filters):
+        """最后count条符合条件的日志"""
+        return self.query(limit=count, last=True, **filters)
+
+    def follow(self, interval=1.0, **filters):
+        """持续输出新写入的日志（生成器），每隔interval秒检查一次文件"""
+        self.refresh()
+        seen = {path: len(file_index) for path, file_index in self.files.items()}
+        while True:
+            time.sleep(interval)
+            if not self.refresh():
+                continue
+            for path, file_index in sorted(self.files.items()):
+                known = seen.get(path, 0)
+                if len(file_index) > known:
+                    entries = self._read_new(file_index, known, filters)
+                    seen[path] = len(file_index)
+                    for entry in entries:
+                        yield entry
+
+    def _read_new(self, file_index, known, filters):
+        """读取文件中第known条之后符合条件的日志"""
+        indices = file_index.select(None, None, filters.get("tags"))
+        indices = indices[indices >= known]
+        start, end = to_stamp(filters.get("start")), to_stamp(filters.get("end"), upper=True)
+        if start is not None:
+            indices = indices[file_index.stamps[indices] >= start]
+        if end is not None:
+            indices = indices[file_index.stamps[indices] <= end]
+        if len(indices) == 0:
+            return []
+        with open(file_index.path, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if filters.get("text"):
+                    indices = file_index.filter_text(mm, indices, filters["text"])
+                return file_index.read_entries(mm, indices)
+
+    def export(self, output_path, **filters):
+        """把查询结果按原始格式导出到文件，返回导出的条数"""
+        entries = self.query(**filters)
+        with open(output_path, "w", encoding="utf-8") as f:
+            for entry in entries:
+                f.write(format_entry(entry) + "\n")
+        return len(entries)
+
+
+def format_entry(entry):
+    """把LogEntry格式化为与日志文件相同的文本"""
+    return f"[{entry.timestamp}] [{entry.tag}] {entry.content}"
+
+
+class LogViewerFrame(tk.Frame):
+    """日志查看界面：按时间范围、类别和关键字查询，支持实时跟踪和导出"""
+
+    def __init__(self, parent, log_index=None, max_lines=2000, follow_interval=1000):
+        """
+        Args:
+            parent: 父容器
+            log_index: LogIndex实例，None时为默认日志文件夹创建
+            max_lines: 文本框中最多显示的日志条数
+            follow_interval: 实时跟踪时检查新日志的间隔（毫秒）
+        """
+        super().__init__(parent)
+        self.log_index = log_index or LogIndex()
+        self.max_lines = max_lines
+        self.follow_interval = follow_interval
+        self._seen = {}  # 文件路径 -> 已显示到的日志条数（实时跟踪用）
+        self._follow_job = None
+        self.create_widgets()
+        self.run_query()
+
+    def create_widgets(self):
+        """创建界面组件"""
+        filter_frame = ttk.Frame(self)
+        filter_frame.pack(fill=tk.X, padx=5, pady=5)
+
+        ttk.Label(filter_frame, text="开始时间:").grid(row=0, column=0, sticky=tk.W)
+        self.start_var = tk.StringVar()
+        ttk.Entry(filter_frame, textvariable=self.start_var, width=20).grid(row=0, column=1, padx=5)
+        ttk.Label(filter_frame, text="结束时间:").grid(row=0, column=2, sticky=tk.W)
+        self.end_var = tk.StringVar()
+        ttk.Entry(filter_frame, textvariable=self.end_var, width=20).grid(row=0, column=3, padx=5)
+        ttk.Label(filter_frame, text="关键字:").grid(row=0, column=4, sticky=tk.W)
+        self.text_var = tk.StringVar()
+        text_entry = ttk.Entry(filter_frame, textvariable=self.text_var, width=20)
+        text_entry.grid(row=0, column=5, padx=5)
+        text_entry.bind("<Return>", lambda event: self.run_query())
+
+        tag_frame = ttk.Frame(filter_frame)
+        tag_frame.grid(row=1, column=0, columnspan=6, sticky=tk.W, pady=5)
+        self.tag_vars = {}
+        for tag in CATEGORY_LEVELS:
+            var = tk.BooleanVar(value=True)
+            ttk.Checkbutton(tag_frame, text=tag, variable=var).pack(side=tk.LEFT, padx=3)
+            self.tag_vars[tag] = var
+
+        button_frame = ttk.Frame(filter_frame)
+        button_frame.grid(row=0, column=6, rowspan=2, padx=5)
+        ttk.Button(button_frame, text="查询", command=self.run_query).pack(fill=tk.X)
+        ttk.Button(button_frame, text="导出", command=self.export_results).pack(fill=tk.X, pady=2)
+        self.follow_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(button_frame, text="实时跟踪", variable=self.follow_var,
+                        command=self.toggle_follow).pack(fill=tk.X)
+
+        text_frame = ttk.Frame(self)
+        text_frame.pack(fill=tk.BOTH, expand=True, padx=5)
+        scrollbar = ttk.Scrollbar(text_frame)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.text = tk.Text(text_frame, wrap=tk.NONE, yscrollcommand=scrollbar.set, font=("Consolas", 9))
+        self.text.pack(fill=tk.BOTH, expand=True)
+        scrollbar.config(command=self.text.yview)
+        self.text.tag_configure("错误", foreground="red")
+        self.text.tag_configure("重要", foreground="blue")
+        self.text.tag_configure("操作", foreground="dark green")
+
+        self.status_var = tk.StringVar()
+        ttk.Label(self, textvariable=self.status_var).pack(fill=tk.X, padx=5, pady=2)
+
+    def current_filters(self):
+        """从界面读取查询条件"""
+        tags = [tag for tag, var in self.tag_vars.items() if var.get()]
+        if len(tags) == len(self.tag_vars):
+            tags = None  # 全选时不按标签筛选（也包含未列出的类别）
+        return {
+            "start": self.start_var.get().strip() or None,
+            "end": self.end_var.get().strip() or None,
+            "tags": tags,
+            "text": self.text_var.get().strip() or None,
+        }
+
+    def run_query(self):
+        """按当前条件查询并显示最后max_lines条"""
+        try:
+            started = time.perf_counter()
+            self.log_index.refresh()
+            entries = self.log_index.tail(self.max_lines, **self.current_filters())
+            self.text.delete("1.0", tk.END)
+            self._append_entries(entries)
+            self._seen = {path: len(file_index) for path, file_index in self.log_index.files.items()}
+            self.status_var.set(f"共索引 {len(self.log_index)} 条日志，显示 {len(entries)} 条，"
+                                f"用时 {(time.perf_counter() - started) * 1000:.0f} 毫秒")
+        except ValueError as e:
+            messagebox.showerror("查询条件错误", str(e))
+        except Exception as e:
+            self.status_var.set(f"查询日志出错: {e}")
+
+    def _append_entries(self, entries):
+        """在文本框末尾追加日志，超过max_lines时删除最早的行"""
+        for entry in entries:
+            self.text.insert(tk.END, format_entry(entry) + "\n", entry.tag)
+        line_count = int(self.text.index("end-1c").split(".")[0]) - 1
+        if line_count > self.max_lines:
+            self.text.delete("1.0", f"{line_count - self.max_lines + 1}.0")
+        self.text.see(tk.END)
+
+    def export_results(self):
+        """把当前条件下的全部查询结果导出到文件"""
+        path = filedialog.asksaveasfilename(defaultextension=".log", filetypes=[("日志文件", "*.log")])
+        if not path:
+            return
+        try:
+            count = self.log_index.export(path, **self.current_filters())
+            messagebox.showinfo("导出成功", f"已导出 {count} 条日志到: {path}")
+        except Exception as e:
+            messagebox.showerror("导出失败", f"导出日志时出错: {e}")
+
+    def toggle_follow(self):
+        """开启或关闭实时跟踪"""
+        if self.follow_var.get():
+            self._follow()
+        elif self._follow_job is not None:
+            self.after_cancel(self._follow_job)
+            self._follow_job = None
+
+    def _follow(self):
+        """定时检查新写入的日志并追加显示"""
+        try:
+            if self.log_index.refresh():
+                filters = self.current_filters()
+                entries = []
+                for path, file_index in sorted(self.log_index.files.items()):
+                    known = self._seen.get(path, 0)
+                    if len(file_index) > known:
+                        entries.extend(self.log_index._read_new(file_index, known, filters))
+                        self._seen[path] = len(file_index)
+                self._append_entries(entries)
+        except Exception as e:
+            self.status_var.set(f"读取新日志出错: {e}")
+        self._follow_job = self.after(self.follow_interval, self._follow)
+
+    def destroy(self):
+        """关闭前保存旁路索引"""
+        if self._follow_job is not None:
+            self.after_cancel(self._follow_job)
+            self._follow_job = None
+        self.log_index.save()
+        super().destroy()
+
+
+def main():
+    """日志查询命令行"""
+    parser = argparse.ArgumentParser(description="查询logs文件夹中的鼠标控制日志")
+    parser.add_argument("--log-dir", default=LOG_DIR, help="日志文件夹")
+    parser.add_argument("--since", help="开始时间，例如 \"2026-01-05 09:30\"")
+    parser.add_argument("--until", help="结束时间（含），只给日期时包括当天全部日志，只给到分钟时包括该分钟")
+    parser.add_argument("--tag", action="append", help="只显示指定类别，可重复，例如 --tag 操作 --tag 错误")
+    parser.add_argument("--grep", help="正文包含的关键字")
+    parser.add_argument("--tail", type=int, default=None, help="只显示最后N条")
+    parser.add_argument("--follow", "-f", action="store_true", help="持续输出新写入的日志")
+    parser.add_argument("--export", metavar="PATH", help="把查询结果导出到文件")
+    parser.add_argument("--reindex", action="store_true", help="删除旁路索引后重新建立")
+    parser.add_argument("--gui", action="store_true", help="打开日志查看窗口")
+    args = parser.parse_args()
+
+    log_index = LogIndex(args.log_dir)
+    if args.reindex:
+        for path in glob.glob(os.path.join(log_index.index_dir, "*.npz")):
+            os.remove(path)
+    if args.gui:
+        root = tk.Tk()
+        root.title("日志查看")
+        root.geometry("1000x650")
+        LogViewerFrame(root, log_index).pack(fill=tk.BOTH, expand=True)
+        root.mainloop()
+        return 0
+
+    started = time.perf_counter()
+    log_index.refresh()
+    log_index.save()
+    indexed_ms = (time.perf_counter() - started) * 1000
+    filters = {"start": args.since, "end": args.until, "tags": args.tag, "text": args.grep}
+    try:
+        if args.export:
+            count = log_index.export(args.export, **filters)
+            print(f"已导出 {count} 条日志到: {args.export}")
+        else:
+            entries = log_index.tail(args.tail, **filters) if args.tail else log_index.query(**filters)
+            for entry in entries:
+                print(format_entry(entry))
+            print(f"（共索引 {len(log_index)} 条日志，更新索引用时 {indexed_ms:.0f} 毫秒，匹配 {len(entries)} 条）",
+                  file=sys.stderr)
+        if args.follow:
+            for entry in log_index.follow(**filters):
+                print(format_entry(entry), flush=True)
+    except ValueError as e:
+        print(f"查询条件错误: {e}")
+        return 1
+    except KeyboardInterrupt:
+        pass
+    finally:
+        log_index.save()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,336 @@
+import atexit
+import datetime
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+# 日志文件夹
+LOG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs")
+
+# 日志配置文件（级别、按类别开关、重复消息合并间隔）
+LOG_CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "log_config.json")
+
+# 日志类别对应的级别，数值越大越重要；未列出的类别按30处理
+CATEGORY_LEVELS = {
+    "调试": 10,
+    "判断": 20,
+    "状态": 30,
+    "操作": 30,
+    "日志": 30,
+    "重要": 40,
+    "错误": 40,
+}
+
+# 不合并重复的类别：状态切换、重要事件和鼠标操作每条都写出
+DEDUP_EXEMPT_CATEGORIES = ("状态", "重要", "操作")
+
+
+def parse_level(level):
+    """把级别数值或类别名称（如"判断"）转换为级别数值"""
+    if isinstance(level, str):
+        if level not in CATEGORY_LEVELS:
+            raise ValueError(f"未知的日志级别: {level}")
+        return CATEGORY_LEVELS[level]
+    return int(level)
+
+
+def load_log_config(config_file=LOG_CONFIG_FILE):
+    """读取日志配置，文件不存在或出错时返回空配置
+
+    配置格式：{"min_level": "判断", "categories": {"调试": false}, "dedup_interval": 60}
+    """
+    try:
+        if os.path.exists(config_file):
+            with open(config_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+    except Exception as e:
+        print(f"加载日志配置时出错: {e}")
+    return {}
+
+
+class BatchedLogWriter:
+    """后台批量日志写入器
+
+    调用方的write()只把(时间戳, 类型, 内容)放入有界队列，格式化、打印和写文件都在后台线程中完成。
+    日志文件保持打开，按条数（batch_size）或时间（flush_interval）批量写入并刷新；
+    每条日志按自身的时间戳写入对应日期的文件，跨过午夜时自动切换到新文件。
+    队列满时按drop_policy丢弃日志（"oldest"丢弃最早的，"newest"丢弃新写入的），
+    并在日志中记录丢弃的条数。
+
+    级别过滤在write()中完成，被过滤的日志只有一次字典查询的开销；带参数的日志（"当前界面: %s"）
+    在写入线程中才格式化。同一模板、同一参数的日志在dedup_interval秒内只写一次，
+    参数变化（状态切换）时立即写出，并补写一条"重复 N 次"的汇总；不再出现的消息超过dedup_interval秒后
+    在下一批写出时补写汇总。汇总以写出时的时间为时间戳，日志文件始终按时间排列。
+    DEDUP_EXEMPT_CATEGORIES中的类别不合并。
+    """
+
+    def __init__(self, log_dir=LOG_DIR, prefix="mouse_control_log_", max_queue=10000,
+                 batch_size=200, flush_interval=1.0, drop_policy="oldest", echo=True,
+                 min_level=20, categories=None, dedup_interval=60.0):
+        """
+        Args:
+            log_dir: 日志文件夹
+            prefix: 日志文件名前缀，文件名为 <前缀><YYYY-MM-DD>.log
+            max_queue: 队列中最多缓存的日志条数
+            batch_size: 队列中累计到该条数时立即写入
+            flush_interval: 两次写入之间的最长间隔（秒）
+            drop_policy: 队列满时的丢弃策略，"oldest"或"newest"
+            echo: 是否同时打印到控制台
+            min_level: 最低记录级别（数值或类别名称），低于该级别的类别不记录
+            categories: 按类别单独开关，{类别: 是否记录}，优先于min_level
+            dedup_interval: 相同日志的最短重复间隔（秒），0表示不合并
+        """
+        if drop_policy not in ("oldest", "newest"):
+            raise ValueError(f"未知的丢弃策略: {drop_policy}")
+        self.log_dir = log_dir
+        self.prefix = prefix
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.drop_policy = drop_policy
+        self.echo = echo
+        self.dedup_interval = dedup_interval
+        self._enabled = {}  # 类别 -> 是否记录（缓存）
+        self.set_levels(min_level, categories)
+        self._dedup = {}  # (类别, 模板) -> [参数, 上次写出时间, 被合并的条数, 最后一次被合并的时间]
+        self.dropped = 0  # 累计丢弃的日志条数
+        # deque在append时自动丢弃最早的元素，append/popleft是线程安全的原子操作
+        self._queue = deque(maxlen=max_queue)
+        self._reported_dropped = 0
+        self._wakeup = threading.Event()
+        self._flushed = threading.Condition()
+        self._written = 0  # 已写出的日志条数（含丢弃提示）
+        self._file = None
+        self._file_date = None
+        self._thread = None
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def start(self):
+        """启动后台写入线程（重复调用无副作用）"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._closed = False
+            self._thread = threading.Thread(target=self._run, name="log-writer")
+            self._thread.daemon = True
+            self._thread.start()
+
+    def set_levels(self, min_level=20, categories=None):
+        """设置最低记录级别和按类别的开关"""
+        self.min_level = parse_level(min_level)
+        self.categories = dict(categories or {})
+        self._enabled = {}
+
+    def is_enabled(self, message_type):
+        """指定类别的日志是否会被记录"""
+        enabled = self._enabled.get(message_type)
+        if enabled is None:
+            if message_type in self.categories:
+                enabled = bool(self.categories[message_type])
+            else:
+                enabled = CATEGORY_LEVELS.get(message_type, 30) >= self.min_level
+            self._enabled[message_type] = enabled
+        return enabled
+
+    def write(self, message_type, content, *args):
+        """记录一条日志（热路径：只做一次级别判断和入队）
+
+        Args:
+            message_type: 日志类别，例如"调试"、"判断"、"操作"、"错误"
+            content: 日志内容；带args时为%格式的模板，在写入线程中格式化
+            *args: 模板参数
+        """
+        enabled = self._enabled.get(message_type)
+        if enabled is None:
+            enabled = self.is_enabled(message_type)
+        if not enabled:
+            return
+        queue = self._queue
+        if len(queue) >= self.max_queue:
+            self.dropped += 1
+            if self.drop_policy == "newest":
+                return
+        queue.append((time.time(), message_type, content, args))
+        if len(queue) >= self.batch_size:
+            self._wakeup.set()
+
+    def flush(self, timeout=2.0):
+        """等待当前已入队的日志全部写出"""
+        with self._flushed:
+            target = self._written + len(self._queue)
+            self._wakeup.set()
+            self._flushed.wait_for(lambda: self._written >= target or self._thread is None, timeout)
+
+    def close(self, timeout=2.0):
+        """写出剩余日志并关闭文件"""
+        with self._lock:
+            thread = self._thread
+            self._closed = True
+        self._wakeup.set()
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+        with self._lock:
+            self._thread = None
+        # 唤醒仍在等待flush()的调用方
+        with self._flushed:
+            self._flushed.notify_all()
+
+    def _run(self):
+        """后台写入线程主循环"""
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self._write_batch()
+            if self._closed:
+                self._write_batch()
+                self._close_file()
+                return
+
+    def _write_batch(self):
+        """取出队列中的所有日志并写入文件"""
+        # 在取出队列之前记下时间：本批日志的时间戳都不晚于它，过期重复汇总以它为时间写在本批之后
+        now = time.time()
+        records = []
+        queue = self._queue
+        try:
+            while True:
+                records.append(queue.popleft())
+        except IndexError:
+            pass
+        count = len(records)
+        dropped = self.dropped - self._reported_dropped
+        if dropped > 0:
+            self._reported_dropped += dropped
+            records.append((now, "日志", f"日志队列已满，丢弃了 {dropped} 条日志", ()))
+        records = self._deduplicate(records, now)
+        if not records:
+            with self._flushed:
+                self._written += count
+                self._flushed.notify_all()
+            return
+
+        # 按日期分组写入，跨过午夜时切换文件
+        lines = []
+        current_date = None
+        for timestamp, message_type, content in records:
+            moment = datetime.datetime.fromtimestamp(timestamp)
+            date = moment.strftime("%Y-%m-%d")
+            if date != current_date and lines:
+                self._write_lines(current_date, lines)
+                lines = []
+            current_date = date
+            lines.append(f"[{moment.strftime('%Y-%m-%d %H:%M:%S')}] [{message_type}] {content}")
+        self._write_lines(current_date, lines)
+
+        with self._flushed:
+            self._written += count
+            self._flushed.notify_all()
+
+    def _deduplicate(self, records, now):
+        """格式化日志并合并重复消息，返回按时间排列的[(时间戳, 类别, 文本), ...]
+
+        重复汇总以写出时的时间为时间戳，保证日志文件按时间排列。
+
+        Args:
+            records: 队列中取出的[(时间戳, 类别, 内容, 参数), ...]
+            now: 本批写出的时间，不早于records中的任何时间戳
+        """
+        output = []
+        dedup = self._dedup
+        interval = self.dedup_interval
+        for timestamp, message_type, content, args in records:
+            text = self._format(content, args)
+            if interval <= 0 or message_type in DEDUP_EXEMPT_CATEGORIES:
+                output.append((timestamp, message_type, text))
+                continue
+            key = (message_type, content if args else text)
+            state = dedup.get(key)
+            if state is not None and state[0] == args and timestamp - state[1] < interval:
+                # 与上次写出的内容相同，只计数
+                state[2] += 1
+                state[3] = timestamp
+                continue
+            if state is not None and state[2] > 0:
+                if state[0] == args:
+                    text = f"{text}（过去{timestamp - state[1]:.0f}秒内重复 {state[2]} 次）"
+                else:
+                    # 参数变化：先补写旧消息的重复汇总（时间记为新消息的时间），再写新消息
+                    output.append((timestamp, message_type,
+                                   f"{self._format(content, state[0])}（重复 {state[2]} 次）"))
+            dedup[key] = [args, timestamp, 0, timestamp]
+            output.append((timestamp, message_type, text))
+
+        # 每批都清理超过合并间隔未再出现的消息，及时补写其尚未输出的重复汇总（写在本批之后）
+        for key, state in list(dedup.items()):
+            if self._closed or now - state[3] >= interval:
+                if state[2] > 0:
+                    output.append((now, key[0], f"{self._format(key[1], state[0])}（重复 {state[2]} 次）"))
+                del dedup[key]
+        return output
+
+    @staticmethod
+    def _format(content, args):
+        """格式化带参数的日志内容"""
+        if not args:
+            return str(content)
+        try:
+            return content % args
+        except Exception:
+            return f"{content} {args}"
+
+    def _write_lines(self, date, lines):
+        """把同一天的日志写入对应的文件，并按需打印到控制台"""
+        text = "\n".join(lines) + "\n"
+        if self.echo:
+            try:
+                sys.stdout.write(text)
+                sys.stdout.flush()
+            except Exception:
+                pass
+        try:
+            if date != self._file_date:
+                self._close_file()
+                os.makedirs(self.log_dir, exist_ok=True)
+                path = os.path.join(self.log_dir, f"{self.prefix}{date}.log")
+                self._file = open(path, "a", encoding="utf-8")
+                self._file_date = date
+            self._file.write(text)
+            self._file.flush()
+        except Exception as e:
+            print(f"日志记录失败: {e}")
+            self._close_file()
+
+    def _close_file(self):
+        """关闭当前日志文件"""
+        if self._file is not None:
+            try:
+                self._file.close()
+            except Exception:
+                pass
+        self._file = None
+        self._file_date = None
+
+
+_default_writer = None
+_default_writer_lock = threading.Lock()
+
+
+def get_log_writer():
+    """获取程序共用的日志写入器（首次调用时启动，退出时自动写出剩余日志）"""
+    global _default_writer
+    if _default_writer is None:
+        with _default_writer_lock:
+            if _default_writer is None:
+                config = load_log_config()
+                writer = BatchedLogWriter(
+                    min_level=config.get("min_level", 20),
+                    categories=config.get("categories"),
+                    dedup_interval=config.get("dedup_interval", 60.0))
+                writer.start()
+                atexit.register(writer.close)
+                _default_writer = writer
+    return _default_writer
@@ -0,0 +1,866 @@
+import asyncio
+import os
+import sys
+import time
+
+from course_manager import CourseManager
+from floating_image_detector import FloatingImageDetector
+from input_backends import DryRunInput, PyAutoGuiInput
+from log_writer import get_log_writer
+from monitor_loop import MonitorLoop
+from power_manager import PowerManager
+from schedule_clock import ScheduleClock, parse_moment
+from screen_capture import create_capture_backend
+from telemetry import TelemetryRecorder, ms_since
+from template_matching import PyramidMatcher
+from template_registry import TemplateRegistry
+
+# 点击行为使用的模板图片（逻辑名称 -> 图片路径）
+IMG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "img")
+CLICK_TEMPLATES = {
+    "join": os.path.join(IMG_DIR, "test", "course_starts", "join.PNG"),
+    "a": os.path.join(IMG_DIR, "click", "a.PNG"),
+    "leave": os.path.join(IMG_DIR, "click", "leave.PNG"),
+    "return": os.path.join(IMG_DIR, "click", "return.PNG"),
+    "sendanswer": os.path.join(IMG_DIR, "test", "send_answer", "sendanswer.PNG"),
+}
+
+# 与检测器参考图像相同的点击模板：{逻辑名称: (界面名称, 参考图像文件名)}
+# 检测器在判断界面时已经得到这些按钮的位置，点击时直接复用，无需再次匹配
+DETECTED_CLICK_TARGETS = {
+    "join": ("course_starts", "join.PNG"),
+    "a": ("poll_starts", "a.PNG"),
+    "leave": ("leave_session", "leave.PNG"),
+    "sendanswer": ("send_answer", "sendanswer.PNG"),
+}
+
+
+def write_log(message_type, content, *args):
+    """记录日志信息（放入后台日志写入器的队列，由写入线程打印并追加到当天的日志文件）
+
+    Args:
+        message_type: 日志类别，未启用的类别直接丢弃
+        content: 日志内容，带args时为%格式的模板（例如"当前界面: %s"），只在写出时格式化
+        *args: 模板参数
+    """
+    get_log_writer().write(message_type, content, *args)
+
+
+class MonitorEngine:
+    """无界面的监控引擎：屏幕采集 → 界面分类 → 课程时间判断 → 鼠标操作
+    
+    不依赖Tkinter，可以作为后台服务运行（例如在虚拟帧缓冲下）、用于基准测试，或嵌入到其他程序中。
+    屏幕采集和鼠标输入都是可替换的后端：采集后端提供grab_gray()/close()（以及可选的monitor屏幕区域属性），
+    输入后端提供position()/click(x, y)。Tk面板只是订阅状态变化并调用start_control()/stop_control()的客户端。
+    """
+    
+    def __init__(self, detector=None, manager=None, monitor_loop=None, capture_backend=None, input_backend=None,
+                 clock=None):
+        """初始化监控引擎
+        
+        Args:
+            detector: 界面检测器，None时创建无界面的FloatingImageDetector
+            manager: 课程管理器，None时创建新的CourseManager
+            monitor_loop: 共享的MonitorLoop事件循环，None时自行创建
+            capture_backend: 屏幕采集后端，仅在自行创建检测器时使用，None表示ScreenCapture
+            input_backend: 鼠标输入后端，None表示PyAutoGuiInput
+            clock: 课程表判断使用的时钟（返回datetime的可调用对象），None时使用课程管理器的时钟；
+                回放或模拟某个时刻时传入ScheduleClock，课程管理器的查询也改用这个时钟
+        """
+        self.manager = manager or CourseManager()  # 课程管理器实例
+        self.clock = clock or self.manager.clock
+        self.manager.clock = self.clock
+        self.monitor_loop = monitor_loop or MonitorLoop()
+        self.input_backend = input_backend or PyAutoGuiInput()
+        if detector is None:
+            detector = FloatingImageDetector(headless=True, monitor_loop=self.monitor_loop,
+                                             capture_backend=capture_backend)
+        self.detector = detector  # 屏幕检测器实例
+        self.matcher = PyramidMatcher()  # 点击定位使用的金字塔模板匹配引擎
+        self.control_running = False  # 鼠标控制功能状态
+        
+        # 状态变化回调，参数为(时间分类, 小行为)，供界面等客户端订阅
+        self.on_status_change = None
+        
+        # 模板注册表：启动时一次性加载点击模板，之后按文件修改时间失效
+        self.template_registry = TemplateRegistry()
+        for template_name, template_path in CLICK_TEMPLATES.items():
+            self.template_registry.register(template_name, template_path)
+        self.template_registry.preload()
+        self.preload_course_templates()
+        
+        # 鼠标控制状态变量
+        self.current_main_behavior = "未启动"  # 当前大型行为状态
+        self.current_sub_behavior = "等待中"  # 当前小行为状态
+        
+        # 界面切换事件：控制循环等待检测器发布的事件，而不是固定休眠轮询
+        self.last_interface_event_id = 0  # 已处理的最后一个界面切换事件序号
+        self.action_retry_interval = 0.5  # 当前界面需要执行操作时，两次尝试之间的最长等待（秒）
+        self.idle_wait_timeout = 5.0  # 处于等待状态时，没有界面切换事件的最长等待（秒）
+        self.action_timeout = 10.0  # 单次控制操作（匹配+点击）的最长等待（秒）
+        self.detection_match_max_age = 1.0  # 复用检测器匹配坐标时允许的最长时间（秒），超过则重新匹配
+        
+        # 按课程表调整采集频率：远离上课时间时低频采集或暂停，上课前几分钟恢复高速
+        self.power_saving = True
+        self.power_manager = PowerManager(self)
+        
+        # 结构化遥测（TelemetryRecorder），设置后每次控制循环写一条记录
+        self.telemetry = None
+        self._step_actions = []  # 本次控制循环执行的点击，供遥测记录使用
+        
+        # 答题点击间隔控制
+        self.last_answer_click_time = 0  # 上一次答题点击的时间戳（用于限制重复点击）
+        # 返回点击间隔控制
+        self.last_return_click_time = 0  # 上一次返回点击的时间戳（用于限制重复点击）
+    
+    def log_message(self, message_type, content, *args):
+        """记录日志信息（content带args时延迟格式化，见write_log）"""
+        write_log(message_type, content, *args)
+    
+    def start_control(self):
+        """启动鼠标控制（屏幕检测未启动时一并启动），没有参考图像时返回False"""
+        if not self.detector.is_detecting and not self.detector.start_detection():
+            self.log_message("错误", "未找到参考图像，无法启动屏幕检测")
+            return False
+        self.control_running = True
+        self.update_behavior_status("准备中", "初始化")
+        self.monitor_loop.spawn("mouse_control", self.control_loop)
+        if self.power_saving:
+            self.monitor_loop.spawn("power", self.power_manager.run)
+        return True
+    
+    def stop_control(self, timeout=2.0):
+        """停止鼠标控制协程（正在等待的界面切换事件会立即结束）"""
+        self.control_running = False
+        # 先取消功耗管理（恢复高速采集设置），再唤醒控制循环；两者同时发生时取消可能被等待的完成结果吞掉
+        self.monitor_loop.cancel("power", timeout=timeout)
+        self.detector.interface_events.wake()
+        self.monitor_loop.cancel("mouse_control", timeout=timeout)
+        self.update_behavior_status("未启动", "等待中")
+    
+    def shutdown(self):
+        """停止鼠标控制和屏幕检测，并关闭事件循环"""
+        self.stop_control(timeout=1.0)
+        self.detector.stop_detection()
+        self.monitor_loop.stop(timeout=1.0)
+    
+    def update_behavior_status(self, main_behavior, sub_behavior=None):
+        """更新行为状态，状态变化时通知on_status_change"""
+        changed = False
+        # 更新时间分类（上课时间/课间时间）
+        if main_behavior != self.current_main_behavior:
+            self.current_main_behavior = main_behavior
+            self.log_message("状态", "时间分类更新为: %s", main_behavior)
+            changed = True
+        
+        # 更新小行为状态
+        if sub_behavior is not None and sub_behavior != self.current_sub_behavior:
+            self.current_sub_behavior = sub_behavior
+            self.log_message("状态", "小行为状态更新为: %s", sub_behavior)
+            changed = True
+        elif sub_behavior is None and self.current_sub_behavior != "等待中":
+            self.current_sub_behavior = "等待中"
+            self.log_message("状态", "小行为状态更新为: %s", "等待中")
+            changed = True
+        
+        if changed and self.on_status_change is not None:
+            self.on_status_change(self.current_main_behavior, self.current_sub_behavior)
+    
+    def get_screen_frame(self):
+        """获取供点击逻辑使用的屏幕帧，返回的帧由调用方持有，用完后调用release_screen_frame()
+        
+        优先使用检测器最近一次完成分类的帧，使点击匹配的画面与界面判断一致；
+        检测器尚未产生分类结果时，读取帧总线上的最新帧。
+        """
+        if not self.detector:
+            return None
+        return self.detector.acquire_frame()
+    
+    def release_screen_frame(self, frame):
+        """释放get_screen_frame()取得的帧（None时忽略）"""
+        if frame is not None and self.detector:
+            self.detector.release_frame(frame)
+    
+    def preload_course_templates(self):
+        """预加载所有课程图标到模板注册表（以图标路径为名称）"""
+        for course in self.manager.get_all_courses():
+            icon_path = self.manager.get_course_icon_path(course["course_name"])
+            if icon_path:
+                self.template_registry.get(icon_path)
+    
+    def load_template(self, image_path):
+        """获取模板灰度图（来自模板注册表），并按检测器校准的显示缩放比例调整尺寸
+        
+        Args:
+            image_path: 模板逻辑名称（见CLICK_TEMPLATES）或图片路径
+        """
+        scale = self.detector.template_scale if self.detector else 1.0
+        return self.template_registry.get(image_path, scale)
+    
+    def match_image(self, image_path, threshold=0.85, frame=None):
+        """在屏幕上查找指定图片的位置
+        
+        Args:
+            image_path: 目标图片的逻辑名称（见CLICK_TEMPLATES）或路径
+            threshold: 匹配阈值
+            frame: 要匹配的屏幕帧（Frame，由调用方持有），为None时使用get_screen_frame()并在匹配后释放
+        """
+        owned_frame = None
+        try:
+            # 加载目标图片（按当前显示缩放比例调整）
+            target_image = self.load_template(image_path)
+            if target_image is None:
+                self.log_message("错误", f"无法加载图片: {self.template_registry.get_path(image_path)}")
+                return None
+            
+            # 使用共享帧总线上的画面，不再单独截屏
+            if frame is None:
+                frame = owned_frame = self.get_screen_frame()
+            if frame is None:
+                self.log_message("错误", "无法获取屏幕画面")
+                return None
+            screen_gray = frame.gray
+            
+            # 使用金字塔模板匹配（分数与全分辨率TM_CCOEFF_NORMED一致）
+            max_val, max_loc = self.matcher.locate(screen_gray, target_image, threshold)
+            
+            if max_loc is not None and max_val >= threshold:
+                # 获取图片中心点
+                h, w = target_image.shape
+                center_x = max_loc[0] + w // 2
+                center_y = max_loc[1] + h // 2
+                self.log_message("操作", f"在屏幕上找到图片: {os.path.basename(self.template_registry.get_path(image_path))}，匹配度: {max_val:.2f}，位置: ({center_x}, {center_y})")
+                return (center_x, center_y, max_val)
+            else:
+                self.log_message("判断", "未找到匹配的图片: %s，最高匹配度: %.2f", os.path.basename(self.template_registry.get_path(image_path)), max_val)
+                return None
+        except Exception as e:
+            self.log_message("错误", f"图片匹配出错: {e}")
+            return None
+        finally:
+            self.release_screen_frame(owned_frame)
+    
+    def find_detected_match(self, template_name):
+        """获取检测器在判断当前界面时得到的按钮位置
+        
+        Args:
+            template_name: 点击模板的逻辑名称（见DETECTED_CLICK_TARGETS）
+        
+        Returns:
+            tuple: (中心x, 中心y, 匹配度)；模板不在当前界面、匹配不存在或已过期时返回None
+        """
+        target = DETECTED_CLICK_TARGETS.get(template_name)
+        if target is None or not self.detector:
+            return None
+        interface_name, filename = target
+        if self.detector.current_interface != interface_name:
+            return None
+        match = self.detector.get_template_match(interface_name, filename, self.detection_match_max_age)
+        if match is None:
+            return None
+        center_x, center_y = match.center
+        self.log_message("操作", f"复用检测结果: {filename}，匹配度: {match.score:.2f}，位置: ({center_x}, {center_y})，帧序号: {match.frame_id}")
+        return (center_x, center_y, match.score)
+    
+    def locate_click_target(self, template_name):
+        """定位要点击的按钮：优先复用检测器的匹配坐标，没有可用结果时重新匹配屏幕"""
+        match_result = self.find_detected_match(template_name)
+        if match_result is None:
+            match_result = self.match_image(template_name)
+        return match_result
+    
+    def find_all_matches(self, image_path, threshold=0.85, frame=None):
+        """在屏幕上查找所有匹配的图片位置
+        
+        Args:
+            image_path: 目标图片的逻辑名称（见CLICK_TEMPLATES）或路径
+            threshold: 匹配阈值
+            frame: 要匹配的屏幕帧（Frame，由调用方持有），为None时使用get_screen_frame()并在匹配后释放
+        """
+        owned_frame = None
+        try:
+            # 加载目标图片（按当前显示缩放比例调整）
+            target_image = self.load_template(image_path)
+            if target_image is None:
+                self.log_message("错误", f"无法加载图片: {self.template_registry.get_path(image_path)}")
+                return []
+            
+            # 使用共享帧总线上的画面，不再单独截屏
+            if frame is None:
+                frame = owned_frame = self.get_screen_frame()
+            if frame is None:
+                self.log_message("错误", "无法获取屏幕画面")
+                return []
+            screen_gray = frame.gray
+            
+            # 使用金字塔模板匹配查找所有匹配度大于阈值的位置
+            h, w = target_image.shape
+            matches = []
+            for max_val, max_loc in self.matcher.find_all(screen_gray, target_image, threshold):
+                # 计算中心点
+                center_x = max_loc[0] + w // 2
+                center_y = max_loc[1] + h // 2
+                matches.append((center_x, center_y, max_val))
+            
+            if matches:
+                self.log_message("操作", f"在屏幕上找到 {len(matches)} 个匹配的图片: {os.path.basename(self.template_registry.get_path(image_path))}")
+            else:
+                self.log_message("判断", "未找到匹配的图片: %s", os.path.basename(self.template_registry.get_path(image_path)))
+            
+            return matches
+        except Exception as e:
+            self.log_message("错误", f"查找所有匹配图片出错: {e}")
+            return []
+        finally:
+            self.release_screen_frame(owned_frame)
+    
+    def perform_mouse_click(self, x, y, description="点击操作"):
+        """执行鼠标点击操作"""
+        try:
+            # 获取当前鼠标位置
+            current_x, current_y = self.input_backend.position()
+            self.log_message("操作", f"移动鼠标: 从({current_x}, {current_y})到({x}, {y})")
+            
+            # 移动鼠标到目标位置并点击（由输入后端执行）
+            started = time.perf_counter()
+            self.input_backend.click(x, y)
+            if self.telemetry is not None:
+                self._step_actions.append({"action": description, "x": x, "y": y, "click_ms": ms_since(started),
+                                           "done_ts": time.time()})
+            self.log_message("操作", f"执行{description}，位置: ({x}, {y})")
+            return True
+        except Exception as e:
+            self.log_message("错误", f"鼠标点击操作出错: {e}")
+            return False
+    
+    def get_next_course(self):
+        """获取今天的下一节课的信息"""
+        try:
+            course = self.manager.get_timetable().next_course(self.clock())
+            if course is not None:
+                self.log_message("判断", "找到下一节课: %s，开始时间: %s", course['course_name'], course['start_time'])
+                return course
+            
+            self.log_message("判断", "今日没有更多课程")
+            return None
+        except Exception as e:
+            self.log_message("错误", f"获取下一节课信息出错: {e}")
+            return None
+    
+    def get_current_course_status(self):
+        """获取当前时间分类（上课时间或课间时间）
+        
+        Returns:
+            tuple: ("上课时间", 当前课程) 或 ("课间时间", (当天上一节课, 当天下一节课))
+        """
+        try:
+            # 周课表索引只在课程变化时重建，每次查询都是二分查找
+            time_category, time_info = self.manager.get_timetable().status(self.clock())
+            if time_category == "上课时间":
+                self.log_message("判断", "当前处于上课时间: %s", time_info['course_name'])
+            else:
+                self.log_message("判断", "当前处于课间时间")
+            return time_category, time_info
+        except Exception as e:
+            self.log_message("错误", f"获取当前时间分类出错: {e}")
+            return "课间时间", None
+    
+    async def wait_for_interface_change(self, timeout):
+        """等待检测器发布新的界面切换事件（等待期间不占用线程，停止时可被取消）
+        
+        Args:
+            timeout: 最长等待时间（秒）
+        
+        Returns:
+            InterfaceEvent: 新的界面切换事件；超时或被唤醒时返回None
+        """
+        if not self.detector:
+            await asyncio.sleep(timeout)
+            return None
+        event = await self.detector.interface_events.wait_for_event_async(self.last_interface_event_id, timeout)
+        if event is not None:
+            self.last_interface_event_id = event.event_id
+            self.log_message("判断", "界面切换: %s -> %s（帧 %s）", event.previous, event.interface, event.frame_id)
+        return event
+    
+    def course_before_behavior(self, course):
+        """课程开始前行为"""
+        try:
+            self.update_behavior_status("课程开始前", "进入课程界面")
+            
+            # 检查当前界面是否为Course Menu
+            current_interface = self.detector.current_interface if self.detector else "未检测"
+            self.log_message("判断", "当前界面: %s", current_interface)
+            
+            if current_interface != "course_menu":
+                self.log_message("判断", "当前不是课程菜单界面，等待中...")
+                self.update_behavior_status("课程开始前", "等待中")
+                return False
+            
+            # 获取课程图标路径
+            course_icon_path = self.manager.get_course_icon_path(course["course_name"])
+            if not course_icon_path:
+                self.log_message("错误", f"未找到课程图标: {course['course_name']}")
+                return False
+            
+            # 在屏幕上查找课程图标
+            match_result = self.match_image(course_icon_path)
+            if match_result:
+                center_x, center_y, match_score = match_result
+                # 执行点击操作
+                return self.perform_mouse_click(center_x, center_y, f"点击{course['course_name']}课程图标")
+            else:
+                self.log_message("错误", f"未在屏幕上找到{course['course_name']}课程图标")
+                return False
+        except Exception as e:
+            self.log_message("错误", f"课程开始前行为出错: {e}")
+            return False
+    
+    def enter_poll_behavior(self):
+        """进入答题行为"""
+        try:
+            self.update_behavior_status("课程进行中", "进入答题行为")
+            
+            # 检查当前界面是否为Course Starts
+            current_interface = self.detector.current_interface if self.detector else "未检测"
+            self.log_message("判断", "当前界面: %s", current_interface)
+            
+            if current_interface != "course_starts":
+                self.log_message("判断", "当前不是课程开始界面，不执行进入答题行为")
+                return False
+            
+            # 检查join按钮图片
+            if not self.template_registry.exists("join"):
+                self.log_message("错误", "未找到join按钮图片")
+                return False
+            
+            # 在屏幕上查找join按钮
+            match_result = self.locate_click_target("join")
+            if match_result:
+                center_x, center_y, match_score = match_result
+                # 执行点击操作
+                return self.perform_mouse_click(center_x, center_y, "点击join按钮进入答题")
+            else:
+                self.log_message("错误", "未在屏幕上找到join按钮")
+                return False
+        except Exception as e:
+            self.log_message("错误", f"进入答题行为出错: {e}")
+            return False
+    
+    def answer_poll_behavior(self):
+        """答题行为"""
+        try:
+            # 检查是否需要限制重复点击（5秒间隔）
+            current_time = time.time()
+            if current_time - self.last_answer_click_time < 5:
+                self.log_message("判断", "答题点击间隔不足5秒（当前间隔: %.2f秒），跳过点击", current_time - self.last_answer_click_time)
+                return False
+            
+            self.update_behavior_status("课程进行中", "答题行为")
+            
+            # 检查当前界面是否为Poll Starts
+            current_interface = self.detector.current_interface if self.detector else "未检测"
+            self.log_message("判断", "当前界面: %s", current_interface)
+            
+            if current_interface != "poll_starts":
+                self.log_message("判断", "当前不是投票开始界面，不执行答题行为")
+                return False
+            
+            # 检查A选项图片
+            if not self.template_registry.exists("a"):
+                self.log_message("错误", "未找到A选项图片")
+                return False
+            
+            # 在屏幕上查找A选项
+            match_result = self.locate_click_target("a")
+            if match_result:
+                center_x, center_y, match_score = match_result
+                # 执行点击操作
+                success = self.perform_mouse_click(center_x, center_y, "点击A选项答题")
+                if success:
+                    # 更新最后点击时间
+                    self.last_answer_click_time = current_time
+                return success
+            else:
+                self.log_message("错误", "未在屏幕上找到A选项")
+                return False
+        except Exception as e:
+            self.log_message("错误", f"答题行为出错: {e}")
+            return False
+    
+    def exit_session_behavior(self):
+        """退出行为"""
+        try:
+            # 检查当前界面是否为Leave Session
+            current_interface = self.detector.current_interface if self.detector else "未检测"
+            self.log_message("判断", "当前界面: %s", current_interface)
+            
+            if current_interface != "leave_session":
+                self.log_message("判断", "当前不是离开会话界面，不执行退出行为")
+                return False
+            
+            # 检查leave按钮图片
+            if not self.template_registry.exists("leave"):
+                self.log_message("错误", "未找到leave按钮图片")
+                return False
+            
+            # 在屏幕上查找leave按钮
+            match_result = self.locate_click_target("leave")
+            if match_result:
+                center_x, center_y, match_score = match_result
+                # 执行点击操作
+                return self.perform_mouse_click(center_x, center_y, "点击leave按钮退出会话")
+            else:
+                self.log_message("错误", "未在屏幕上找到leave按钮")
+                return False
+        except Exception as e:
+            self.log_message("错误", f"退出行为出错: {e}")
+            return False
+    
+    def return_behavior(self, frame=None):
+        """返回行为
+        
+        Args:
+            frame: 调用方已匹配过的屏幕帧（Frame，由调用方持有），传入时复用同一帧而不再重新获取
+        """
+        try:
+            # 检查点击间隔（5秒）
+            current_time = time.time()
+            if current_time - self.last_return_click_time < 5:
+                self.log_message("判断", "返回点击间隔不足5秒（当前间隔: %.2f秒），跳过点击", current_time - self.last_return_click_time)
+                return False
+            
+            # 检查当前界面是否需要返回
+            current_interface = self.detector.current_interface if self.detector else "未检测"
+            self.log_message("判断", "当前界面: %s", current_interface)
+            
+            if current_interface == "course_menu":
+                self.log_message("判断", "当前已在课程菜单界面，无需返回")
+                return False
+            
+            # 检查return按钮图片
+            if not self.template_registry.exists("return"):
+                self.log_message("错误", "未找到return按钮图片")
+                return False
+            
+            # 在屏幕上查找所有匹配的return按钮
+            matches = self.find_all_matches("return", frame=frame)
+            if matches:
+                # 选择最左侧的匹配
+                leftmost_match = min(matches, key=lambda x: x[0])
+                center_x, center_y, match_score = leftmost_match
+                # 执行点击操作
+                success = self.perform_mouse_click(center_x, center_y, "点击最左侧的return按钮返回")
+                if success:
+                    # 更新最后点击时间
+                    self.last_return_click_time = current_time
+                return success
+            else:
+                self.log_message("错误", "未在屏幕上找到return按钮")
+                return False
+        except Exception as e:
+            self.log_message("错误", f"返回行为出错: {e}")
+            return False
+    
+    def send_answer_behavior(self):
+        """发送答案行为"""
+        try:
+            # 检查当前界面是否为send_answer
+            current_interface = self.detector.current_interface if self.detector else "未检测"
+            self.log_message("判断", "当前界面: %s", current_interface)
+            
+            if current_interface != "send_answer":
+                self.log_message("判断", "当前不是发送答案界面，不执行发送答案行为")
+                return False
+            
+            # 检查sendanswer按钮图片
+            if not self.template_registry.exists("sendanswer"):
+                self.log_message("错误", "未找到sendanswer按钮图片")
+                return False
+            
+            # 在屏幕上查找sendanswer按钮
+            match_result = self.locate_click_target("sendanswer")
+            if match_result:
+                center_x, center_y, match_score = match_result
+                # 执行点击操作
+                return self.perform_mouse_click(center_x, center_y, "点击sendanswer按钮发送答案")
+            else:
+                self.log_message("错误", "未在屏幕上找到sendanswer按钮")
+                return False
+        except Exception as e:
+            self.log_message("错误", f"发送答案行为出错: {e}")
+            return False
+    
+    def set_telemetry(self, telemetry):
+        """为检测器和控制循环设置遥测记录器（None表示关闭）"""
+        self.telemetry = telemetry
+        self.detector.telemetry = telemetry
+    
+    def run_control_step(self):
+        """执行一次control_step()，启用遥测时记录本次循环使用的帧、界面、执行的点击和各段延迟"""
+        if self.telemetry is None:
+            self.control_step()
+            return
+        frame = self.detector.last_frame
+        self._step_actions = []
+        started = time.perf_counter()
+        started_ts = time.time()
+        try:
+            self.control_step()
+        finally:
+            actions = self._step_actions
+            self._step_actions = []
+            for action in actions:
+                # 从截屏到点击完成的端到端延迟
+                done_ts = action.pop("done_ts")
+                if frame is not None:
+                    action["latency_ms"] = round((done_ts - frame.timestamp) * 1000, 3)
+            self.telemetry.record(
+                "control",
+                frame_id=frame.frame_id if frame is not None else None,
+                # 从截屏到本次控制循环开始处理的延迟
+                frame_age_ms=round((started_ts - frame.timestamp) * 1000, 3) if frame is not None else None,
+                interface=self.detector.current_interface,
+                main=self.current_main_behavior,
+                sub=self.current_sub_behavior,
+                actions=actions,
+                step_ms=ms_since(started))
+    
+    def control_step(self):
+        """根据当前时间分类和检测到的界面执行一次控制操作（在线程池中执行）"""
+        # 休眠模式下采集已暂停，最后一帧已过期，不能据此点击
+        if self.power_saving and self.power_manager.suspended:
+            self.update_behavior_status("课间时间", "休眠中")
+            return
+        
+        # 获取当前时间分类
+        self.log_message("调试", "准备获取当前时间分类")
+        time_category, time_info = self.get_current_course_status()
+        self.log_message("调试", "当前时间分类: %s, 详细信息: %s", time_category, time_info)
+        
+        if time_category == "上课时间":
+            self.log_message("调试", "当前处于上课时间")
+            # 上课时间行为
+            current_course = time_info
+            
+            # 检查当前界面，执行相应的小行为
+            current_interface = self.detector.current_interface if self.detector else "未检测"
+            self.log_message("调试", "当前界面: %s", current_interface)
+            
+            if current_interface == "course_menu":
+                # 当检测到Course Menu界面时，点击当前正在进行的课程图标（课程开始前行为）
+                self.log_message("判断", "当前界面为Course Menu，且当前有课程进行中: %s", current_course['course_name'])
+                self.update_behavior_status("上课时间", "课程开始前行为")
+                
+                # 获取当前课程图标路径
+                self.log_message("调试", "准备获取当前课程图标: %s", current_course['course_name'])
+                course_icon_path = self.manager.get_course_icon_path(current_course["course_name"])
+                if not course_icon_path:
+                    self.log_message("错误", f"未找到当前课程图标: {current_course['course_name']}")
+                else:
+                    self.log_message("调试", "当前课程图标路径: %s", course_icon_path)
+                    # 在屏幕上查找课程图标
+                    match_result = self.match_image(course_icon_path)
+                    if match_result:
+                        center_x, center_y, match_score = match_result
+                        self.log_message("调试", "找到课程图标，位置: (%s, %s)，匹配度: %s", center_x, center_y, match_score)
+                        # 执行点击操作
+                        self.perform_mouse_click(center_x, center_y, f"点击{current_course['course_name']}课程图标")
+                    else:
+                        self.log_message("错误", f"未在屏幕上找到{current_course['course_name']}课程图标")
+            elif current_interface == "course_starts":
+                # 进入答题行为
+                self.update_behavior_status("上课时间", "进入答题行为")
+                self.log_message("调试", "准备执行进入答题行为")
+                self.enter_poll_behavior()
+                self.log_message("调试", "进入答题行为执行完成")
+            elif current_interface == "poll_starts":
+                # 答题行为
+                self.update_behavior_status("上课时间", "答题行为")
+                self.log_message("调试", "准备执行答题行为")
+                self.answer_poll_behavior()
+                self.log_message("调试", "答题行为执行完成")
+            elif current_interface == "send_answer":
+                # 发送答案行为
+                self.update_behavior_status("上课时间", "发送答案行为")
+                self.log_message("调试", "准备执行发送答案行为")
+                self.send_answer_behavior()
+                self.log_message("调试", "发送答案行为执行完成")
+            else:
+                # 当前没有可执行的小行为
+                self.log_message("调试", "未检测到特定界面: %s，更新为等待中", current_interface)
+                self.update_behavior_status("上课时间", "等待中")
+        
+        elif time_category == "课间时间":
+            self.log_message("调试", "当前处于课间时间")
+            # 课间时间行为
+            last_course, next_course = time_info if isinstance(time_info, tuple) else (None, None)
+            self.log_message("调试", "上一节课: %s, 下一节课: %s", last_course, next_course)
+            
+            # 检查当前界面，执行退出或返回行为
+            current_interface = self.detector.current_interface if self.detector else "未检测"
+            self.log_message("调试", "当前界面: %s", current_interface)
+            
+            if current_interface == "course_menu":
+                # 当前已在课程菜单界面，无需操作
+                self.log_message("调试", "当前已在course_menu界面，更新为等待中")
+                self.update_behavior_status("课间时间", "等待中")
+            else:
+                # 首先检查是否有退出行为（优先级更高）
+                if current_interface == "leave_session":
+                    # 退出行为
+                    self.log_message("调试", "检测到leave_session界面，准备执行退出行为")
+                    self.update_behavior_status("课间时间", "退出行为")
+                    self.exit_session_behavior()
+                    self.log_message("调试", "退出行为执行完成")
+                else:
+                    # 检查是否存在返回按钮，只要存在就执行返回行为
+                    if self.template_registry.exists("return"):
+                        # 在屏幕上查找所有匹配的return按钮（返回行为复用同一帧）
+                        frame = self.get_screen_frame()
+                        try:
+                            matches = self.find_all_matches("return", frame=frame)
+                            if matches:
+                                self.log_message("调试", "检测到返回按钮，准备执行返回行为")
+                                self.update_behavior_status("课间时间", "返回行为")
+                                self.return_behavior(frame=frame)
+                                self.log_message("调试", "返回行为执行完成")
+                            else:
+                                self.log_message("调试", "未检测到返回按钮，更新为等待中")
+                                self.update_behavior_status("课间时间", "等待中")
+                        finally:
+                            self.release_screen_frame(frame)
+                    else:
+                        self.log_message("错误", "未找到return按钮图片")
+                        self.update_behavior_status("课间时间", "等待中")
+        
+        else:
+            # 未知状态，等待中
+            self.log_message("调试", "当前时间分类未知: %s，更新为等待中", time_category)
+            self.update_behavior_status("未知", "等待中")
+    
+    async def control_loop(self):
+        """鼠标控制主逻辑（事件循环中的协程）"""
+        try:
+            self.log_message("重要", "鼠标控制功能启动")
+            self.log_message("调试", "鼠标控制主逻辑协程已启动")
+            
+            while self.control_running:
+                try:
+                    self.log_message("调试", "进入鼠标控制主循环")
+                    # 根据时间分类和当前界面执行一次控制操作（阻塞操作在线程池中执行）
+                    await self.monitor_loop.run_blocking(self.run_control_step, timeout=self.action_timeout)
+                    
+                    # 等待界面切换事件：有待执行的操作时按重试间隔唤醒，空闲时只在界面变化或超时后唤醒
+                    if self.current_sub_behavior == "等待中":
+                        wait_timeout = self.idle_wait_timeout
+                    else:
+                        wait_timeout = self.action_retry_interval
+                    self.log_message("调试", "准备进入休眠状态")
+                    await self.wait_for_interface_change(wait_timeout)
+                    self.log_message("调试", "休眠结束，继续下一次循环")
+                    
+                except asyncio.TimeoutError:
+                    self.log_message("错误", f"控制操作超过{self.action_timeout}秒未完成，继续下一次循环")
+                except Exception as e:
+                    self.log_message("错误", f"鼠标控制逻辑循环出错: {e}")
+                    import traceback
+                    self.log_message("错误", f"错误堆栈: {traceback.format_exc()}")
+                    await asyncio.sleep(1)
+                    self.log_message("调试", "错误处理完成，继续下一次循环")
+        except Exception as e:
+            self.log_message("错误", f"鼠标控制主逻辑出错: {e}")
+            import traceback
+            self.log_message("错误", f"错误堆栈: {traceback.format_exc()}")
+        finally:
+            self.log_message("重要", "鼠标控制功能停止")
+
+
+def main():
+    """以无界面模式运行监控引擎，按Ctrl+C停止"""
+    import argparse
+    parser = argparse.ArgumentParser(description="iClicker自动答题监控引擎（无界面模式）")
+    parser.add_argument("--dry-run", action="store_true", help="只记录点击位置，不移动真实鼠标")
+    parser.add_argument("--capture", default="auto", choices=["auto", "mss", "pyautogui"],
+                        help="屏幕采集后端（默认mss，不可用时回退到pyautogui）")
+    parser.add_argument("--allocation-free", action="store_true",
+                        help="截屏复用缓冲池中的灰度缓冲区，稳态下不再每帧分配新数组（回放时无效）")
+    parser.add_argument("--replay", metavar="PATH",
+                        help="回放截图目录或视频文件代替实时截屏（隐含--dry-run），播放完毕后退出")
+    parser.add_argument("--interval", type=float, default=None,
+                        help="固定的采集间隔（秒），默认按polling_config.json随界面调整、回放0（尽快回放）")
+    parser.add_argument("--downsample", type=int, default=1, metavar="N",
+                        help="检测时把屏幕和模板按N倍区域平均降采样后匹配（默认1，原分辨率），"
+                             "可先用 benchmark_detector.py --downsample 1,2,3 比较准确率和耗时")
+    parser.add_argument("--no-power-saving", action="store_true",
+                        help="全天保持高速采集（默认远离上课时间时降低采集频率或暂停采集）")
+    parser.add_argument("--at", type=parse_moment, metavar="TIME",
+                        help="按指定时间（YYYY-MM-DD HH:MM[:SS]或今天的HH:MM）判断上课/课间和功耗模式，之后按实际经过的时间推进；"
+                             "回放截图的文件名带有录制时间（如20261019_100500.png）时以文件名为准")
+    parser.add_argument("--telemetry", metavar="PATH", nargs="?", const="",
+                        help="把每帧检测和每次控制循环的结构化耗时记录写入JSONL文件（默认logs/telemetry.jsonl），"
+                             "用 python telemetry.py 统计分位数")
+    args = parser.parse_args()
+    
+    # 参考图像路径相对于程序目录
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    if args.replay:
+        capture = create_capture_backend("replay", source=args.replay)
+    else:
+        capture = create_capture_backend(args.capture, allocation_free=args.allocation_free)
+    dry_run = args.dry_run or args.replay is not None
+    input_backend = DryRunInput() if dry_run else None
+    
+    # 回放或指定--at时，课程表判断使用录制画面的时间或指定的时间，而不是运行时的当前时间
+    clock = ScheduleClock(args.at, capture if args.replay else None) if args.replay or args.at else None
+    
+    engine = MonitorEngine(capture_backend=capture, input_backend=input_backend, clock=clock)
+    engine.detector.set_downsample(args.downsample)
+    # 回放需要逐帧处理录制的画面，不按课程表降低采集频率
+    engine.power_saving = not (args.no_power_saving or args.replay)
+    telemetry = None
+    if args.telemetry is not None:
+        telemetry = TelemetryRecorder(args.telemetry) if args.telemetry else TelemetryRecorder()
+        telemetry.start()
+        engine.set_telemetry(telemetry)
+    interval = args.interval if args.interval is not None else (0.0 if args.replay else None)
+    if interval is not None:
+        # 手动指定间隔或回放时使用固定的采集间隔
+        engine.detector.frame_bus.interval = interval
+        engine.detector.polling.adjust_interval = False
+    # 回放时每一帧都要经过检测，检测完成后才读取下一帧
+    engine.detector.frame_bus.lockstep = args.replay is not None
+    
+    started = time.time()
+    if not engine.start_control():
+        return 1
+    try:
+        while engine.control_running:
+            if getattr(capture, "exhausted", False):
+                # 等待检测协程处理完最后一帧
+                latest = engine.detector.frame_bus.get_latest()
+                deadline = time.time() + 2.0
+                while latest is not None and time.time() < deadline:
+                    last_frame = engine.detector.last_frame
+                    if last_frame is not None and last_frame.frame_id >= latest.frame_id:
+                        break
+                    time.sleep(0.01)
+                break
+            time.sleep(0.05 if args.replay else 1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        engine.shutdown()
+        if telemetry is not None:
+            telemetry.close()
+    
+    if args.replay:
+        elapsed = time.time() - started
+        latest_event = engine.detector.interface_events.latest()
+        print(f"回放结束: {capture.frames_read} 帧，用时 {elapsed:.2f} 秒（{capture.frames_read / max(elapsed, 1e-6):.1f} 帧/秒），"
+              f"界面切换 {latest_event.event_id if latest_event else 0} 次，点击 {len(input_backend.clicks)} 次")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
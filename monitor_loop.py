@@ -0,0 +1,329 @@
+import asyncio
+import functools
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class AsyncWaiters:
+    """让asyncio协程等待由其他线程发出的通知
+
+    通知方（例如帧总线、界面切换事件通道）在状态变化时调用notify_all()，
+    等待方用wait_for()挂起协程直到条件满足、超时或被取消，不占用线程。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._waiters = set()
+
+    def notify_all(self):
+        """唤醒所有正在等待的协程（可在任意线程调用）"""
+        with self._lock:
+            waiters = list(self._waiters)
+        for loop, waiter in waiters:
+            try:
+                loop.call_soon_threadsafe(waiter.set)
+            except RuntimeError:
+                # 事件循环已关闭
+                pass
+
+    async def wait_for(self, check, timeout=None):
+        """等待条件满足
+
+        Args:
+            check: 检查函数，返回(是否结束等待, 返回值)
+            timeout: 最长等待时间（秒），None表示一直等待
+
+        Returns:
+            check()给出的返回值；超时时返回None
+        """
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        while True:
+            # 先登记再检查条件，避免检查之后、等待之前的通知丢失
+            waiter = asyncio.Event()
+            entry = (loop, waiter)
+            with self._lock:
+                self._waiters.add(entry)
+            try:
+                done, value = check()
+                if done:
+                    return value
+                remaining = None if deadline is None else deadline - loop.time()
+                if remaining is not None and remaining <= 0:
+                    return None
+                try:
+                    await asyncio.wait_for(waiter.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+            finally:
+                with self._lock:
+                    self._waiters.discard(entry)
+
+
+class MonitorLoop:
+    """监控流水线的单一asyncio事件循环
+
+    屏幕采集、界面分类、时间刷新和鼠标控制都作为命名协程运行在同一个后台线程的事件循环中，
+    等待均带有明确的超时，停止时通过取消任务立即退出，而不是等待各线程的休眠结束。
+    截屏、模板匹配和鼠标操作等阻塞或CPU密集的工作通过run_blocking()交给线程池执行。
+    """
+
+    def __init__(self, executor_workers=4):
+        """初始化事件循环（调用start()后才开始运行）
+
+        Args:
+            executor_workers: 执行阻塞操作的线程池大小
+        """
+        self.executor_workers = executor_workers
+        self._loop = None
+        self._thread = None
+        self._executor = None
+        self._tasks = {}  # 任务名称 -> asyncio.Task
+        self._lock = threading.Lock()
+
+    @property
+    def is_running(self):
+        """事件循环是否正在运行"""
+        return self._loop is not None and self._loop.is_running()
+
+    @property
+    def loop(self):
+        """底层的asyncio事件循环，未启动时为None"""
+        return self._loop
+
+    @property
+    def executor(self):
+        """执行阻塞操作的线程池"""
+        return self._executor
+
+    def start(self):
+        """在后台线程中启动事件循环（重复调用无副作用）"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.executor_workers, thread_name_prefix="monitor")
+            self._loop = asyncio.new_event_loop()
+            self._loop.set_default_executor(self._executor)
+            ready = threading.Event()
+            self._thread = threading.Thread(target=self._run_loop, args=(ready,), name="monitor-loop")
+            self._thread.daemon = True
+            self._thread.start()
+        ready.wait()
+
+    def _run_loop(self, ready):
+        """事件循环线程主函数"""
+        asyncio.set_event_loop(self._loop)
+        self._loop.call_soon(ready.set)
+        try:
+            self._loop.run_forever()
+        finally:
+            self._loop.close()
+
+    def in_loop_thread(self):
+        """当前是否在事件循环线程中"""
+        return self._thread is not None and threading.current_thread() is self._thread
+
+    def spawn(self, name, coro_func, *args):
+        """以指定名称启动一个协程任务（可在任意线程调用）
+
+        Args:
+            name: 任务名称，同名任务仍在运行时不会重复启动
+            coro_func: 协程函数
+            *args: 传给协程函数的参数
+
+        Returns:
+            bool: 是否启动了新任务
+        """
+        self.start()
+        with self._lock:
+            task = self._tasks.get(name)
+            if task is not None and not task.done():
+                return False
+            # 先占位，避免并发调用重复启动
+            self._tasks[name] = None
+
+        def create():
+            task = self._loop.create_task(coro_func(*args), name=name)
+            task.add_done_callback(functools.partial(self._task_done, name))
+            with self._lock:
+                self._tasks[name] = task
+
+        if self.in_loop_thread():
+            create()
+        else:
+            self._loop.call_soon_threadsafe(create)
+        return True
+
+    def _task_done(self, name, task):
+        """任务结束时清理登记并输出异常"""
+        with self._lock:
+            if self._tasks.get(name) is task:
+                del self._tasks[name]
+        if not task.cancelled() and task.exception() is not None:
+            print(f"任务 {name} 异常退出: {task.exception()}")
+
+    def is_task_running(self, name):
+        """指定名称的任务是否正在运行（或即将启动）"""
+        with self._lock:
+            if name not in self._tasks:
+                return False
+            task = self._tasks[name]
+        return task is None or not task.done()
+
+    def cancel(self, name, timeout=2.0):
+        """取消指定名称的任务并等待其结束
+
+        Args:
+            name: 任务名称
+            timeout: 等待任务结束的最长时间（秒）；在事件循环线程中调用时不等待
+
+        Returns:
+            bool: 任务是否已结束（或本来就不存在）
+        """
+        if self._loop is None or not self._loop.is_running():
+            return True
+
+        async def cancel_task():
+            task = self._tasks.get(name)
+            if task is None or task.done():
+                return True
+            task.cancel()
+            done, _ = await asyncio.wait({task}, timeout=timeout)
+            return bool(done)
+
+        if self.in_loop_thread():
+            task = self._tasks.get(name)
+            if task is not None:
+                task.cancel()
+            return task is None or task.done()
+        try:
+            future = asyncio.run_coroutine_threadsafe(cancel_task(), self._loop)
+            return future.result(timeout + 1.0)
+        except Exception as e:
+            print(f"取消任务 {name} 时出错: {e}")
+            return False
+
+    def call(self, coro, timeout=None):
+        """在事件循环中执行协程并等待结果（供事件循环线程以外的代码调用）"""
+        self.start()
+        future = asyncio.run_coroutine_threadsafe(coro, self._loop)
+        return future.result(timeout)
+
+    async def run_blocking(self, func, *args, timeout=None):
+        """在线程池中执行阻塞函数并等待结果
+
+        Args:
+            func: 阻塞函数
+            *args: 函数参数
+            timeout: 最长等待时间（秒），超时抛出asyncio.TimeoutError；
+                     已开始执行的函数不会被中断，只是不再等待其结果
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._executor, functools.partial(func, *args))
+        if timeout is None:
+            return await future
+        return await asyncio.wait_for(future, timeout)
+
+    def stop(self, timeout=2.0):
+        """取消所有任务、停止事件循环并关闭线程池"""
+        with self._lock:
+            thread = self._thread
+        if thread is None:
+            return
+
+        async def shutdown():
+            tasks = [task for task in self._tasks.values() if task is not None and not task.done()]
+            for task in tasks:
+                task.cancel()
+            if tasks:
+                await asyncio.wait(tasks, timeout=timeout)
+
+        if self.in_loop_thread():
+            for task in list(self._tasks.values()):
+                if task is not None:
+                    task.cancel()
+            self._loop.call_soon(self._loop.stop)
+        else:
+            try:
+                asyncio.run_coroutine_threadsafe(shutdown(), self._loop).result(timeout + 1.0)
+            except Exception as e:
+                print(f"停止事件循环任务时出错: {e}")
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            thread.join(timeout=timeout)
+        self._executor.shutdown(wait=False)
+        with self._lock:
+            self._thread = None
+            self._tasks = {}
+
+
+class TkBridge:
+    """把后台协程和线程的界面更新批量交给Tk主线程执行
+
+    Tk组件只能在主线程中操作。后台代码通过post()登记更新，同一key的多次更新只保留最后一次，
+    主线程每隔flush_interval毫秒统一执行一批，避免为每次更新都调用root.after(0, ...)。
+    """
+
+    def __init__(self, root, flush_interval=50):
+        """
+        Args:
+            root: Tk根窗口
+            flush_interval: 批量执行界面更新的间隔（毫秒）
+        """
+        self.root = root
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._pending = {}  # key -> (函数, 参数)，按登记顺序执行
+        self._counter = itertools.count()
+        self._running = False
+
+    def post(self, key, func, *args):
+        """登记一次界面更新（可在任意线程调用）
+
+        Args:
+            key: 更新的标识，同一key只执行最后一次登记的更新；None表示每次都执行
+            func: 在主线程中执行的函数
+            *args: 函数参数
+        """
+        if key is None:
+            key = ("_once", next(self._counter))
+        with self._lock:
+            # 重新插入使执行顺序与最后一次登记的顺序一致
+            self._pending.pop(key, None)
+            self._pending[key] = (func, args)
+
+    def start(self):
+        """开始定时批量执行（需在Tk主线程中调用）"""
+        if self._running:
+            return
+        self._running = True
+        self.root.after(self.flush_interval, self._flush_loop)
+
+    def stop(self):
+        """停止定时执行，尚未执行的更新被丢弃"""
+        self._running = False
+        with self._lock:
+            self._pending.clear()
+
+    def flush(self):
+        """立即执行所有已登记的更新（需在Tk主线程中调用）"""
+        with self._lock:
+            pending = self._pending
+            self._pending = {}
+        for func, args in pending.values():
+            try:
+                func(*args)
+            except Exception as e:
+                print(f"界面更新出错: {e}")
+
+    def _flush_loop(self):
+        """主线程定时回调"""
+        if not self._running:
+            return
+        self.flush()
+        try:
+            self.root.after(self.flush_interval, self._flush_loop)
+        except Exception:
+            # 窗口已销毁
+            self._running = False
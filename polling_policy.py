@@ -0,0 +1,123 @@
+import json
+import os
+from collections import namedtuple
+
+from interface_graph import InterfaceGraph
+
+# 轮询策略配置文件（各界面的采集间隔、要检查的界面类型和搜索区域、界面切换图，以及连续未检测时的退避）
+POLLING_CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "polling_config.json")
+
+# 轮询策略：采集间隔（秒）、当前处于该界面时要检查的界面类型（None表示按界面切换图选择）、
+# 各界面类型模板的全屏搜索区域{界面名称: (x0, y0, x1, y1)}，坐标为相对屏幕宽高的比例（0~1）
+PollingPolicy = namedtuple("PollingPolicy", ["interval", "interfaces", "regions"])
+
+DEFAULT_POLICY = PollingPolicy(0.3, None, {})
+
+
+def load_polling_config(config_file=POLLING_CONFIG_FILE):
+    """读取轮询策略配置，文件不存在或出错时返回空配置
+
+    配置格式：
+    {
+        "default": {"interval": 0.3},
+        "interfaces": {"wait_polls1": {"interval": 0.15, "interfaces": ["wait_polls1", "poll_starts"],
+                                       "regions": {"poll_starts": [0.5, 0, 1, 1]}}},
+        "transitions": {"course_menu": ["course_not_started", "course_starts"]},
+        "miss_backoff": {"after": 3, "factor": 2.0, "max_interval": 2.0}
+    }
+    transitions省略时使用interface_graph.INTERFACE_TRANSITIONS。
+    """
+    try:
+        if os.path.exists(config_file):
+            with open(config_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+    except Exception as e:
+        print(f"加载轮询策略配置时出错: {e}")
+    return {}
+
+
+class AdaptivePolling:
+    """按当前界面调整检测频率和范围的轮询策略
+
+    每个界面可以单独配置采集间隔、下一帧要检查的界面类型（只匹配这些文件夹的模板）和模板的搜索区域；
+    未配置的字段沿用default。没有配置要检查的界面类型时按界面切换图检查当前界面及其后继界面，
+    不在图中的界面（"未检测"）检查全部界面。连续backoff_after帧"未检测"后，采集间隔按backoff_factor指数增长，
+    最长max_interval秒，检测到任何界面后立即恢复。
+    检测器在定期全屏搜索的帧和子集中没有任何界面匹配时仍会检查全部界面，因此子集只影响速度，不会漏检。
+    """
+
+    def __init__(self, config=None, backoff_after=3, backoff_factor=2.0, max_interval=2.0):
+        """
+        Args:
+            config: load_polling_config()返回的配置字典，None或空字典时所有界面使用默认策略
+            backoff_after: 连续多少帧未检测后开始退避
+            backoff_factor: 每多一帧未检测，采集间隔乘以的倍数
+            max_interval: 退避后的最长采集间隔（秒）
+        """
+        config = config or {}
+        self.graph = InterfaceGraph(config.get("transitions"))
+        self.default = self._parse_policy(config.get("default"), DEFAULT_POLICY)
+        self.policies = {}
+        for interface_name, entry in (config.get("interfaces") or {}).items():
+            self.policies[interface_name] = self._parse_policy(entry, self.default)
+        backoff = config.get("miss_backoff") or {}
+        self.backoff_after = int(backoff.get("after", backoff_after))
+        self.backoff_factor = float(backoff.get("factor", backoff_factor))
+        self.max_interval = float(backoff.get("max_interval", max_interval))
+        self.adjust_interval = True  # 是否由策略调整帧总线的采集间隔（回放或手动指定间隔时关闭）
+        self.misses = 0  # 连续未检测的帧数
+
+    @staticmethod
+    def _parse_policy(entry, base):
+        """解析一条策略配置，未给出的字段沿用base"""
+        entry = entry or {}
+        interfaces = entry.get("interfaces", base.interfaces)
+        regions = dict(base.regions)
+        for interface_name, region in (entry.get("regions") or {}).items():
+            regions[interface_name] = tuple(float(value) for value in region)
+        return PollingPolicy(
+            float(entry.get("interval", base.interval)),
+            tuple(interfaces) if interfaces is not None else None,
+            regions)
+
+    def policy_for(self, interface_name):
+        """当前处于指定界面时使用的策略"""
+        return self.policies.get(interface_name, self.default)
+
+    def select(self, interface_name, reference_images):
+        """选出当前处于指定界面时本帧要检查的参考图像
+
+        Args:
+            interface_name: 当前界面名称
+            reference_images: {界面名称: [模板, ...]}
+
+        Returns:
+            dict: 参考图像字典的子集，当前界面在前，其余按可能性排序；当前界面本身总会被检查
+        """
+        interfaces = self.policy_for(interface_name).interfaces
+        if interfaces is None:
+            interfaces = self.graph.likely_interfaces(interface_name)
+            if interfaces is None:
+                return reference_images
+        selected = {}
+        for name in (interface_name,) + tuple(interfaces):
+            if name in reference_images and name not in selected:
+                selected[name] = reference_images[name]
+        return selected
+
+    def next_interval(self, interface_name):
+        """记录一帧的分类结果，返回到下一次采集的间隔（秒）"""
+        interval = self.policy_for(interface_name).interval
+        if interface_name != "未检测":
+            self.misses = 0
+            return interval
+        self.misses += 1
+        # 指数限制在32次以内，避免长时间未检测时数值溢出
+        extra = min(self.misses - self.backoff_after, 32)
+        if extra <= 0:
+            return interval
+        return max(interval, min(self.max_interval, interval * self.backoff_factor ** extra))
+
+    def reset(self):
+        """清除连续未检测的计数"""
+        self.misses = 0
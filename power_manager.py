@@ -0,0 +1,114 @@
+from collections import namedtuple
+
+from timetable import parse_hhmm
+
+# 功耗模式：名称、采集间隔下限（秒）、控制循环空闲时的最长等待（秒）、是否暂停采集
+# 间隔下限为None时不限制（由帧总线和检测器的轮询策略决定），等待为None时使用启动功耗管理时引擎原有的设置
+PowerMode = namedtuple("PowerMode", ["name", "capture_interval", "idle_wait", "paused"])
+
+ACTIVE_MODE = PowerMode("高速", None, None, False)  # 上课、即将上课或课堂会话未结束
+WATCH_MODE = PowerMode("监视", 5.0, 30.0, False)  # 离课程较近，低频采集以便发现手动打开的会话
+SUSPEND_MODE = PowerMode("休眠", None, 60.0, True)  # 离课程很远，完全停止采集和匹配
+
+# 属于课堂会话的界面：下课后只要仍处于这些界面就保持高速模式，直到会话结束
+SESSION_INTERFACES = ("course_starts", "poll_starts", "poll_answered", "send_answer", "wait_polls1", "leave_session")
+
+
+class PowerManager:
+    """按课程表调整采集频率的功耗管理器
+
+    - 上课期间、上课前ramp_up_minutes分钟内、刚下课linger_minutes分钟内，以及课堂会话界面仍在屏幕上时：高速模式
+    - 距下一节课超过suspend_after_minutes分钟（或本周没有课程）：休眠模式，暂停采集，控制循环不再操作
+    - 其余时间：监视模式，低频采集
+    作为命名协程"power"与控制循环一起运行，界面切换时立即重新判断，否则每check_interval秒判断一次。
+    """
+
+    def __init__(self, engine, ramp_up_minutes=5, linger_minutes=5, suspend_after_minutes=120, check_interval=30.0):
+        """
+        Args:
+            engine: MonitorEngine实例
+            ramp_up_minutes: 上课前提前多少分钟切换到高速模式
+            linger_minutes: 下课后保持高速模式的分钟数
+            suspend_after_minutes: 距下一节课超过多少分钟时进入休眠模式，None表示从不休眠
+            check_interval: 没有界面切换时重新判断模式的间隔（秒）
+        """
+        self.engine = engine
+        self.ramp_up_minutes = ramp_up_minutes
+        self.linger_minutes = linger_minutes
+        self.suspend_after_minutes = suspend_after_minutes
+        self.check_interval = check_interval
+        self.mode = ACTIVE_MODE
+        self.reason = ""
+        self._active_idle_wait = None  # 高速模式的空闲等待（启动时引擎的设置），None表示尚未应用任何模式
+
+    @property
+    def suspended(self):
+        """当前是否处于休眠模式"""
+        return self.mode.paused
+
+    def choose_mode(self, moment=None):
+        """根据课程表和当前界面选择功耗模式
+
+        Returns:
+            tuple: (PowerMode, 原因)
+        """
+        moment = moment or self.engine.clock()
+        timetable = self.engine.manager.get_timetable()
+        if timetable.current_course(moment) is not None:
+            return ACTIVE_MODE, "上课中"
+        minutes_until = timetable.minutes_until_next(moment)
+        if minutes_until is not None and minutes_until <= self.ramp_up_minutes:
+            return ACTIVE_MODE, f"{minutes_until}分钟后上课"
+        if self.engine.detector.current_interface in SESSION_INTERFACES:
+            return ACTIVE_MODE, "课堂会话未结束"
+        previous = timetable.previous_course(moment)
+        if previous is not None:
+            minutes_since = moment.hour * 60 + moment.minute - parse_hhmm(previous["end_time"])
+            if minutes_since <= self.linger_minutes:
+                return ACTIVE_MODE, "刚下课"
+        if self.suspend_after_minutes is not None and (
+                minutes_until is None or minutes_until > self.suspend_after_minutes):
+            return SUSPEND_MODE, "距下一节课较远" if minutes_until is not None else "没有课程"
+        return WATCH_MODE, f"{minutes_until}分钟后上课"
+
+    def apply(self, mode, reason=""):
+        """切换到指定的功耗模式"""
+        detector = self.engine.detector
+        if self._active_idle_wait is None:
+            self._active_idle_wait = self.engine.idle_wait_timeout
+        previous = self.mode
+        self.mode = mode
+        self.reason = reason
+
+        detector.frame_bus.set_min_interval(mode.capture_interval)
+        if mode.paused:
+            detector.frame_bus.pause()
+        else:
+            detector.frame_bus.resume()
+        self.engine.idle_wait_timeout = mode.idle_wait if mode.idle_wait is not None else self._active_idle_wait
+        if mode is not previous:
+            self.engine.log_message("状态", "功耗模式切换为: %s（%s）", mode.name, reason)
+            # 唤醒正在等待界面切换的控制循环，立即按新模式执行
+            detector.interface_events.wake()
+
+    def restore(self):
+        """恢复高速模式的采集设置（停止功耗管理时调用）"""
+        if self._active_idle_wait is not None:
+            self.apply(ACTIVE_MODE, "功耗管理已停止")
+            self._active_idle_wait = None
+
+    async def run(self):
+        """功耗管理协程：按课程表和界面切换事件调整模式，任务被取消时恢复高速模式"""
+        latest = self.engine.detector.interface_events.latest()
+        last_event_id = latest.event_id if latest is not None else 0
+        try:
+            while True:
+                mode, reason = self.choose_mode()
+                if mode is not self.mode or self._active_idle_wait is None:
+                    self.apply(mode, reason)
+                event = await self.engine.detector.interface_events.wait_for_event_async(
+                    last_event_id, self.check_interval)
+                if event is not None:
+                    last_event_id = event.event_id
+        finally:
+            self.restore()
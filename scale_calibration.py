@@ -0,0 +1,129 @@
+import json
+import os
+import threading
+from collections import namedtuple
+
+import cv2
+
+from template_matching import PyramidMatcher
+
+# 常见的 Windows 显示缩放比例（相对于参考图像截图时的 100% 缩放）
+CANDIDATE_SCALES = (1.0, 1.25, 1.5, 1.75, 2.0, 0.8)
+
+SCALE_CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scale_cache.json")
+
+# 一次多尺度搜索的结果：最佳缩放比例、该比例下匹配的模板数、该比例的最高分领先其他比例最高分的差距
+Calibration = namedtuple("Calibration", ["scale", "matched", "margin"])
+
+
+def scale_template(template, scale):
+    """按缩放比例调整模板尺寸，比例为1时原样返回"""
+    if abs(scale - 1.0) < 1e-6:
+        return template
+    h, w = template.shape[:2]
+    size = (max(1, int(round(w * scale))), max(1, int(round(h * scale))))
+    # 缩小使用区域插值避免摩尔纹，放大使用双三次插值保持边缘清晰
+    interpolation = cv2.INTER_AREA if scale < 1.0 else cv2.INTER_CUBIC
+    return cv2.resize(template, size, interpolation=interpolation)
+
+
+def geometry_key(monitor):
+    """根据显示器区域生成缓存键，例如 "3840x2160+0+0" """
+    if not monitor:
+        return None
+    return f"{monitor['width']}x{monitor['height']}+{monitor['left']}+{monitor['top']}"
+
+
+class ScaleCalibrator:
+    """DPI 感知的模板缩放比例校准器
+
+    对每种显示器几何只做一次多尺度搜索：在候选缩放比例下匹配一组参考图像，
+    选出匹配数量最多（其次总分最高）的比例，并按显示器几何持久化到 JSON 文件。
+    之后只需将所有模板预先缩放一次，稳态下每个模板仍只匹配一次。
+    只有一个模板勉强匹配的结果可能是误判，is_reliable()为真时才应持久化。
+    """
+
+    def __init__(self, cache_file=SCALE_CACHE_FILE, candidate_scales=CANDIDATE_SCALES, matcher=None,
+                 min_matches=2, min_margin=0.05):
+        """初始化校准器
+
+        Args:
+            cache_file: 缩放比例缓存文件路径
+            candidate_scales: 候选缩放比例
+            matcher: 模板匹配引擎，默认使用PyramidMatcher
+            min_matches: 可靠的校准结果至少需要匹配的模板数
+            min_margin: 匹配模板数不足时，最佳比例的最高分至少要领先其他比例多少才算可靠
+        """
+        self.cache_file = cache_file
+        self.candidate_scales = tuple(candidate_scales)
+        self.matcher = matcher or PyramidMatcher()
+        self.min_matches = min_matches
+        self.min_margin = min_margin
+        self._lock = threading.Lock()
+        self._cache = self._load_cache()
+
+    def _load_cache(self):
+        """从文件加载已校准的缩放比例"""
+        try:
+            if os.path.exists(self.cache_file):
+                with open(self.cache_file, "r", encoding="utf-8") as f:
+                    return {key: float(value) for key, value in json.load(f).items()}
+        except Exception as e:
+            print(f"加载缩放比例缓存时出错: {e}")
+        return {}
+
+    def _save_cache(self):
+        """保存缩放比例缓存到文件"""
+        try:
+            with open(self.cache_file, "w", encoding="utf-8") as f:
+                json.dump(self._cache, f, ensure_ascii=False, indent=2)
+        except Exception as e:
+            print(f"保存缩放比例缓存时出错: {e}")
+
+    def get_cached_scale(self, key):
+        """获取指定显示器几何的已缓存缩放比例，未校准时返回None"""
+        with self._lock:
+            return self._cache.get(key)
+
+    def set_scale(self, key, scale):
+        """记录并持久化指定显示器几何的缩放比例"""
+        with self._lock:
+            self._cache[key] = scale
+            self._save_cache()
+
+    def is_reliable(self, calibration):
+        """校准结果是否可靠：多个模板在同一比例下匹配，或最佳比例的最高分明显领先其他比例"""
+        return calibration is not None and (
+            calibration.matched >= self.min_matches or calibration.margin >= self.min_margin)
+
+    def calibrate(self, screen_gray, templates, threshold=0.85):
+        """在当前屏幕上搜索最佳缩放比例
+
+        Args:
+            screen_gray: 预处理后的屏幕灰度图
+            templates: 参与校准的原始（未缩放）模板列表
+            threshold: 匹配阈值
+
+        Returns:
+            Calibration: 最佳缩放比例及其可靠程度；任何比例下都没有模板匹配时返回None（屏幕上暂无可识别界面）
+        """
+        prepared = self.matcher.prepare(screen_gray)
+        best_scale, best_key = None, (0, 0.0)
+        top_scores = {}  # 各比例下所有模板的最高分（包括未达到阈值的）
+        for scale in self.candidate_scales:
+            matched, total_score, top_score = 0, 0.0, -1.0
+            for template in templates:
+                max_val, max_loc = self.matcher.locate(prepared, scale_template(template, scale), threshold)
+                if max_loc is None:
+                    continue
+                top_score = max(top_score, max_val)
+                if max_val >= threshold:
+                    matched += 1
+                    total_score += max_val
+            top_scores[scale] = top_score
+            if matched and (matched, total_score) > best_key:
+                best_scale, best_key = scale, (matched, total_score)
+        if best_scale is None:
+            return None
+        runner_up = max((score for scale, score in top_scores.items() if scale != best_scale), default=-1.0)
+        return Calibration(best_scale, best_key[0], top_scores[best_scale] - runner_up)
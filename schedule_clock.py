@@ -0,0 +1,68 @@
+import datetime
+import os
+import re
+import time
+
+# 回放截图文件名中的时间，例如 20261019_100500.png、2026-10-19 10-05-00.png、2026-10-19T10:05:00.png
+FILENAME_MOMENT = re.compile(r"(\d{4})-?(\d{2})-?(\d{2})[ _T-]?(\d{2})[-_:.]?(\d{2})(?:[-_:.]?(\d{2}))?")
+
+
+def parse_moment(text):
+    """解析--at指定的时间："YYYY-MM-DD HH:MM[:SS]"，或只给"HH:MM[:SS]"表示今天的该时刻
+
+    Raises:
+        ValueError: 格式错误
+    """
+    text = text.strip()
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%dT%H:%M"):
+        try:
+            return datetime.datetime.strptime(text, fmt)
+        except ValueError:
+            pass
+    for fmt in ("%H:%M:%S", "%H:%M"):
+        try:
+            moment = datetime.datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+        return datetime.datetime.combine(datetime.date.today(), moment.time())
+    raise ValueError(f"无法识别的时间: {text}（应为 YYYY-MM-DD HH:MM[:SS] 或 HH:MM[:SS]）")
+
+
+def moment_from_filename(path):
+    """从回放截图的文件名中读取录制时间，文件名不含时间时返回None"""
+    match = FILENAME_MOMENT.search(os.path.basename(path))
+    if match is None:
+        return None
+    try:
+        return datetime.datetime(*(int(value or 0) for value in match.groups()))
+    except ValueError:
+        return None
+
+
+class ScheduleClock:
+    """课程表判断使用的时钟，调用时返回当前的datetime
+
+    回放录制画面或用--at模拟某个时刻时，上课/课间、功耗模式等判断不应使用运行时的真实时间：
+    - 回放截图的文件名中带有时间时，使用最近一帧截图的录制时间
+    - 否则以start为起点，按实际经过的时间推进（start为None时与datetime.datetime.now()相同）
+    """
+
+    def __init__(self, start=None, capture=None):
+        """
+        Args:
+            start: 起始时间（datetime），None表示当前时间
+            capture: 回放采集后端（ReplayCapture），提供current_source
+        """
+        self.start = start
+        self.capture = capture
+        self._started = time.time()
+
+    def __call__(self):
+        source = getattr(self.capture, "current_source", None)
+        if isinstance(source, str):
+            moment = moment_from_filename(source)
+            if moment is not None:
+                return moment
+        if self.start is None:
+            return datetime.datetime.now()
+        return self.start + datetime.timedelta(seconds=time.time() - self._started)
@@ -0,0 +1,436 @@
+import os
+import threading
+import cv2
+import numpy as np
+
+# 回放目录中可识别的图片扩展名
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp")
+
+
+class CaptureBackend:
+    """屏幕采集后端的公共接口
+
+    每个后端提供：
+    - grab_gray(): 返回一帧灰度图（numpy数组），失败或没有更多画面时返回None
+    - close(): 释放采集资源
+    - monitor: 最近一次采集的屏幕区域 {"left", "top", "width", "height"}，用于显示缩放校准
+    - live: 是否为实时屏幕；回放和合成画面为False，其缩放校准结果不会写入缓存
+
+    allocation_free 模式下，输出灰度图来自预分配的缓冲池（buffer_count 块），每块记录持有数：
+    grab_gray() 返回的缓冲区已为调用方持有一次，其他使用者用 retain() 增加持有、用完后 release()，
+    持有数归零的缓冲区才会被下一帧覆盖；所有缓冲区都被持有时本帧另行分配（不进入缓冲池）。
+    需要在 release() 之后继续使用画面的调用方必须自行 copy()。非缓冲池的数组调用 retain()/release() 没有效果。
+    """
+
+    live = True
+
+    def __init__(self, allocation_free=False, buffer_count=6):
+        """
+        Args:
+            allocation_free: 是否启用无分配稳态模式（复用缓冲池）
+            buffer_count: 缓冲池大小，仅在 allocation_free 模式下使用
+        """
+        self.allocation_free = allocation_free
+        self.buffer_count = max(2, buffer_count)
+        self.monitor = None
+        self._pool_lock = threading.Lock()  # 采集线程取缓冲区，检测和点击线程释放缓冲区
+        self._buffers = []  # [[缓冲区, 持有数], ...]
+
+    def _get_output_buffer(self, height, width):
+        """获取本帧的灰度输出缓冲区（缓冲池中的缓冲区已为调用方持有一次）"""
+        if not self.allocation_free:
+            return np.empty((height, width), dtype=np.uint8)
+        with self._pool_lock:
+            # 分辨率变化时丢弃旧缓冲池（仍被持有的旧缓冲区不会再被复用）
+            if self._buffers and self._buffers[0][0].shape != (height, width):
+                self._buffers = []
+            for slot in self._buffers:
+                if slot[1] == 0:
+                    slot[1] = 1
+                    return slot[0]
+            buffer = np.empty((height, width), dtype=np.uint8)
+            if len(self._buffers) < self.buffer_count:
+                self._buffers.append([buffer, 1])
+            return buffer
+
+    def _find_slot(self, gray):
+        """查找灰度图所在的缓冲池位置，不属于缓冲池时返回None（调用方需持有_pool_lock）"""
+        for slot in self._buffers:
+            if slot[0] is gray:
+                return slot
+        return None
+
+    def retain(self, gray):
+        """增加一次对缓冲区的持有，持有期间不会被新的帧覆盖"""
+        with self._pool_lock:
+            slot = self._find_slot(gray)
+            if slot is not None:
+                slot[1] += 1
+
+    def release(self, gray):
+        """释放一次对缓冲区的持有，持有数归零后可用于后续的帧"""
+        with self._pool_lock:
+            slot = self._find_slot(gray)
+            if slot is not None and slot[1] > 0:
+                slot[1] -= 1
+
+    def grab_gray(self):
+        """采集一帧灰度图"""
+        raise NotImplementedError
+
+    def close(self):
+        """释放采集资源"""
+        pass
+
+
+class MssCapture(CaptureBackend):
+    """持久化的 mss 采集会话
+
+    在整个会话期间保持 mss 显示句柄打开（每个采集线程一个），
+    并将 BGRA 截图直接转换为灰度图写入输出缓冲区，避免每帧重复创建中间数组。
+    """
+
+    def __init__(self, allocation_free=False, buffer_count=6):
+        super().__init__(allocation_free, buffer_count)
+        self._local = threading.local()  # mss 句柄只能在创建它的线程中使用
+        self._sessions = []
+        self._sessions_lock = threading.Lock()
+
+    def _get_session(self):
+        """获取当前线程的 mss 会话，首次调用时创建"""
+        sct = getattr(self._local, "sct", None)
+        if sct is None:
+            import mss
+            sct = mss.mss()
+            self._local.sct = sct
+            with self._sessions_lock:
+                self._sessions.append(sct)
+        return sct
+
+    def grab(self):
+        """截取整个虚拟屏幕并返回灰度图，出错时抛出异常（未安装 mss 时抛出ImportError）"""
+        try:
+            sct = self._get_session()
+            # sct.monitors[0] 是整个虚拟屏幕（多显示器合并区域）
+            monitor = sct.monitors[0]
+            shot = sct.grab(monitor)
+        except ImportError:
+            raise
+        except Exception:
+            # mss 偶发失败（如显示器热插拔）时丢弃当前线程的句柄，下次重新创建
+            self._discard_session()
+            raise
+        # 直接以 BGRA 原始缓冲区构造视图，不产生额外拷贝
+        bgra = np.frombuffer(shot.raw, dtype=np.uint8).reshape(shot.height, shot.width, 4)
+        gray = self._get_output_buffer(shot.height, shot.width)
+        cv2.cvtColor(bgra, cv2.COLOR_BGRA2GRAY, dst=gray)
+        self.monitor = dict(monitor)
+        return gray
+
+    def grab_gray(self):
+        """截取整个虚拟屏幕并返回灰度图，失败时返回None"""
+        try:
+            return self.grab()
+        except Exception as e:
+            print(f"mss 截图出错: {e}")
+            return None
+
+    def _discard_session(self):
+        """关闭并丢弃当前线程的 mss 会话"""
+        sct = getattr(self._local, "sct", None)
+        if sct is None:
+            return
+        self._local.sct = None
+        with self._sessions_lock:
+            if sct in self._sessions:
+                self._sessions.remove(sct)
+        try:
+            sct.close()
+        except Exception:
+            pass
+
+    def close(self):
+        """关闭所有线程创建的 mss 会话"""
+        with self._sessions_lock:
+            sessions = self._sessions
+            self._sessions = []
+        for sct in sessions:
+            try:
+                sct.close()
+            except Exception:
+                pass
+        self._local = threading.local()
+
+
+class PyAutoGuiCapture(CaptureBackend):
+    """使用 pyautogui 截取主显示器"""
+
+    def grab_gray(self):
+        """截取屏幕并返回灰度图，失败时返回None"""
+        try:
+            import pyautogui
+            screenshot = np.asarray(pyautogui.screenshot())  # RGB
+            height, width = screenshot.shape[:2]
+            gray = self._get_output_buffer(height, width)
+            cv2.cvtColor(screenshot, cv2.COLOR_RGB2GRAY, dst=gray)
+            self.monitor = {"left": 0, "top": 0, "width": width, "height": height}
+            return gray
+        except Exception as e:
+            print(f"屏幕捕获出错: {e}")
+            return None
+
+
+class ScreenCapture(CaptureBackend):
+    """默认的屏幕采集后端：优先使用持久化的 mss 会话，mss 不可用时回退到 pyautogui"""
+
+    def __init__(self, allocation_free=False, buffer_count=6):
+        """初始化采集会话
+
+        Args:
+            allocation_free: 是否启用无分配稳态模式（复用缓冲池）
+            buffer_count: 缓冲池大小，仅在 allocation_free 模式下使用
+        """
+        super().__init__(allocation_free, buffer_count)
+        self._mss = MssCapture(allocation_free, buffer_count)
+        self._pyautogui = PyAutoGuiCapture(allocation_free, buffer_count)
+        self._mss_available = True
+
+    def grab_gray(self):
+        """截取整个虚拟屏幕并返回灰度图，失败时返回None"""
+        if self._mss_available:
+            try:
+                gray = self._mss.grab()
+                self.monitor = self._mss.monitor
+                return gray
+            except ImportError:
+                print("未安装 mss，回退到 pyautogui 截图")
+                self._mss_available = False
+            except Exception as e:
+                print(f"mss 截图出错，回退到 pyautogui: {e}")
+        gray = self._pyautogui.grab_gray()
+        self.monitor = self._pyautogui.monitor
+        return gray
+
+    def retain(self, gray):
+        """增加一次对缓冲区的持有（缓冲区属于实际截图的 mss 或 pyautogui 后端）"""
+        self._mss.retain(gray)
+        self._pyautogui.retain(gray)
+
+    def release(self, gray):
+        """释放一次对缓冲区的持有"""
+        self._mss.release(gray)
+        self._pyautogui.release(gray)
+
+    def close(self):
+        """关闭所有线程创建的 mss 会话"""
+        self._mss.close()
+
+
+class ReplayCapture(CaptureBackend):
+    """回放录制的画面：目录中的截图（按文件路径排序，包含子目录）或视频文件
+
+    用于没有显示器的机器上离线运行检测和控制逻辑，配合帧总线间隔为0可以快于实时回放。
+    画面播放完毕后grab_gray()返回None，并将exhausted置为True（loop=True时从头循环）。
+    """
+
+    live = False
+
+    def __init__(self, source, loop=False):
+        """
+        Args:
+            source: 截图目录或视频文件路径
+            loop: 播放完毕后是否从头循环
+        """
+        super().__init__()
+        self.source = source
+        self.loop = loop
+        self.exhausted = False
+        self.frames_read = 0
+        self._lock = threading.Lock()
+        self._video = None
+        self._files = None
+        self._index = 0
+        if os.path.isdir(source):
+            self._files = []
+            for root, dirs, files in os.walk(source):
+                dirs.sort()
+                for filename in sorted(files):
+                    if filename.lower().endswith(IMAGE_EXTENSIONS):
+                        self._files.append(os.path.join(root, filename))
+        elif not os.path.isfile(source):
+            raise FileNotFoundError(f"回放源不存在: {source}")
+
+    @property
+    def current_source(self):
+        """最近一帧对应的文件（视频回放时为帧序号）"""
+        if self._files is not None:
+            return self._files[self._index - 1] if self._index > 0 else None
+        return self.frames_read
+
+    def grab_gray(self):
+        """读取下一帧灰度图，播放完毕时返回None"""
+        with self._lock:
+            if self.exhausted:
+                return None
+            gray = self._read_image() if self._files is not None else self._read_video()
+            if gray is None:
+                self.exhausted = True
+                return None
+            self.frames_read += 1
+            height, width = gray.shape[:2]
+            self.monitor = {"left": 0, "top": 0, "width": width, "height": height}
+            return gray
+
+    def _read_image(self):
+        """从截图目录读取下一张图片，跳过无法解码的文件"""
+        while self._files:
+            if self._index >= len(self._files):
+                if not self.loop:
+                    return None
+                self._index = 0
+            path = self._files[self._index]
+            self._index += 1
+            gray = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+            if gray is not None:
+                return gray
+            print(f"无法读取回放截图: {path}")
+        return None
+
+    def _read_video(self):
+        """从视频文件读取下一帧"""
+        if self._video is None:
+            self._video = cv2.VideoCapture(self.source)
+        ok, frame = self._video.read()
+        if not ok and self.loop and self.frames_read > 0:
+            self._video.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ok, frame = self._video.read()
+        if not ok:
+            return None
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+    def close(self):
+        """释放视频文件句柄"""
+        with self._lock:
+            if self._video is not None:
+                self._video.release()
+                self._video = None
+
+
+class SyntheticCapture(CaptureBackend):
+    """合成画面生成器：把模板图片贴到背景的指定位置
+
+    用于在没有真实界面的情况下构造检测场景：set_scene()设置当前画面，
+    queue_scenes()可以预先排好一串画面，每次grab_gray()依次取出一个（排空后保持最后一个画面）。
+    """
+
+    live = False
+
+    def __init__(self, size=(1080, 1920), seed=0):
+        """
+        Args:
+            size: 画面尺寸（高, 宽）
+            seed: 随机背景和随机布局的种子
+        """
+        super().__init__()
+        self.size = size
+        self.rng = np.random.default_rng(seed)
+        self.monitor = {"left": 0, "top": 0, "width": size[1], "height": size[0]}
+        self._lock = threading.Lock()
+        self._scene = None
+        self._queue = []
+
+    def random_background(self):
+        """生成一张平滑的随机噪声背景"""
+        height, width = self.size
+        noise = (self.rng.random((height // 8, width // 8)) * 80 + 90).astype(np.uint8)
+        return cv2.resize(noise, (width, height), interpolation=cv2.INTER_CUBIC)
+
+    def compose(self, placements, background=None):
+        """合成一帧画面
+
+        Args:
+            placements: [(模板灰度图或图片路径, (x, y)), ...]，(x, y)为左上角坐标
+            background: 背景灰度图，None时生成随机背景
+
+        Returns:
+            numpy.ndarray: 合成的灰度图
+        """
+        screen = self.random_background() if background is None else background.copy()
+        for template, (x, y) in placements:
+            if isinstance(template, str):
+                template = cv2.imread(template, cv2.IMREAD_GRAYSCALE)
+                if template is None:
+                    continue
+            h, w = template.shape[:2]
+            h = min(h, screen.shape[0] - y)
+            w = min(w, screen.shape[1] - x)
+            if h > 0 and w > 0:
+                screen[y:y + h, x:x + w] = template[:h, :w]
+        return screen
+
+    def random_scene(self, templates):
+        """生成一帧随机背景的画面，模板按实际宽度从左到右随机放置、互不重叠
+
+        Raises:
+            ValueError: 模板宽度之和超过画面宽度，或有模板比画面高
+        """
+        height, width = self.size
+        free = width - sum(template.shape[1] for template in templates)
+        if free < 0 or any(template.shape[0] > height for template in templates):
+            raise ValueError(f"{len(templates)} 个模板无法不重叠地放入 {width}x{height} 的画面")
+        background = self.random_background()
+        # 把剩余宽度随机分成len(templates)+1段间隔，依次插在模板之间和两侧
+        cuts = np.sort(self.rng.integers(0, free + 1, size=len(templates)))
+        gaps = np.diff(np.concatenate(([0], cuts)))
+        placements = []
+        x = 0
+        for template, gap in zip(templates, gaps):
+            h, w = template.shape[:2]
+            x += int(gap)
+            y = int(self.rng.integers(0, height - h + 1))
+            placements.append((template, (x, y)))
+            x += w
+        return self.compose(placements, background)
+
+    def set_scene(self, placements, background=None):
+        """设置当前画面（清空已排队的画面）"""
+        scene = self.compose(placements, background)
+        with self._lock:
+            self._scene = scene
+            self._queue = []
+
+    def queue_scenes(self, scenes):
+        """排队一串合成好的画面，每次采集取出一个"""
+        with self._lock:
+            self._queue.extend(scenes)
+
+    def grab_gray(self):
+        """返回当前画面的副本，尚未设置画面时返回随机背景"""
+        with self._lock:
+            if self._queue:
+                self._scene = self._queue.pop(0)
+            if self._scene is None:
+                self._scene = self.random_background()
+            return self._scene.copy()
+
+
+def create_capture_backend(kind="auto", **kwargs):
+    """按名称创建屏幕采集后端
+
+    Args:
+        kind: "auto"（mss，不可用时回退到pyautogui）、"mss"、"pyautogui"、"replay"、"synthetic"
+        **kwargs: 传给对应后端构造函数的参数（replay需要source）
+
+    Returns:
+        CaptureBackend: 采集后端
+    """
+    backends = {
+        "auto": ScreenCapture,
+        "mss": MssCapture,
+        "pyautogui": PyAutoGuiCapture,
+        "replay": ReplayCapture,
+        "synthetic": SyntheticCapture,
+    }
+    if kind not in backends:
+        raise ValueError(f"未知的采集后端: {kind}，可选: {', '.join(backends)}")
+    return backends[kind](**kwargs)
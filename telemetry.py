@@ -0,0 +1,201 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+# 默认的遥测文件
+TELEMETRY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs", "telemetry.jsonl")
+
+
+class TelemetryRecorder:
+    """结构化遥测记录器
+
+    检测协程每处理一帧、控制循环每执行一次都调用record()写一条记录，
+    后台线程把记录序列化为一行JSON追加到文件（JSONL），调用方只做一次入队。
+    记录的公共字段为 stage（"detect"或"control"）和 ts（记录时间戳），其余字段由调用方给出，
+    耗时统一以毫秒为单位、字段名以 _ms 结尾，便于query按阶段统计分位数。
+    """
+
+    def __init__(self, path=TELEMETRY_FILE, max_queue=10000, flush_interval=1.0):
+        """
+        Args:
+            path: 遥测文件路径（追加写入）
+            max_queue: 队列中最多缓存的记录数，写入跟不上时丢弃最早的记录
+            flush_interval: 两次写入之间的最长间隔（秒）
+        """
+        self.path = path
+        self.max_queue = max_queue
+        self.flush_interval = flush_interval
+        self._queue = deque(maxlen=max_queue)
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._closed = False
+        self._lock = threading.Lock()
+        self.records_written = 0
+
+    def start(self):
+        """启动后台写入线程（重复调用无副作用）"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._closed = False
+            self._thread = threading.Thread(target=self._run, name="telemetry-writer")
+            self._thread.daemon = True
+            self._thread.start()
+
+    def record(self, stage, **fields):
+        """记录一条遥测数据（热路径：只做一次入队）"""
+        fields["stage"] = stage
+        fields["ts"] = round(time.time(), 3)
+        self._queue.append(fields)
+
+    def close(self, timeout=2.0):
+        """写出剩余记录并停止后台线程"""
+        with self._lock:
+            thread = self._thread
+            self._closed = True
+        self._wakeup.set()
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+        with self._lock:
+            self._thread = None
+
+    def _run(self):
+        """后台写入线程主循环"""
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self._write_batch()
+            if self._closed:
+                self._write_batch()
+                return
+
+    def _write_batch(self):
+        """取出队列中的所有记录并追加到文件"""
+        lines = []
+        queue = self._queue
+        try:
+            while True:
+                lines.append(json.dumps(queue.popleft(), ensure_ascii=False, separators=(",", ":")))
+        except IndexError:
+            pass
+        if not lines:
+            return
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+            self.records_written += len(lines)
+        except Exception as e:
+            print(f"写入遥测数据失败: {e}")
+
+
+def ms_since(started):
+    """从time.perf_counter()的起点到现在经过的毫秒数（保留3位小数）"""
+    return round((time.perf_counter() - started) * 1000, 3)
+
+
+def load_records(path, stage=None):
+    """读取遥测文件中的记录
+
+    Args:
+        path: 遥测文件路径
+        stage: 只返回指定阶段的记录，None表示全部
+
+    Returns:
+        list: 记录字典列表（跳过无法解析的行）
+    """
+    records = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if stage is None or record.get("stage") == stage:
+                records.append(record)
+    return records
+
+
+def collect_metrics(records):
+    """按"阶段.字段"汇总所有耗时字段（*_ms），返回{指标名称: [数值, ...]}
+
+    detect记录的templates字段（{模板名称: [耗时毫秒, 分数]}）汇总为"detect.template.<模板名称>"，
+    control记录的actions字段中每次点击的耗时和延迟汇总为"control.action.<字段>"。
+    """
+    metrics = {}
+    for record in records:
+        stage = record.get("stage", "?")
+        for field, value in record.items():
+            if field.endswith("_ms") and isinstance(value, (int, float)):
+                metrics.setdefault(f"{stage}.{field}", []).append(value)
+        for name, (elapsed_ms, _score) in (record.get("templates") or {}).items():
+            metrics.setdefault(f"{stage}.template.{name}", []).append(elapsed_ms)
+        for action in record.get("actions") or []:
+            for field, value in action.items():
+                if field.endswith("_ms") and isinstance(value, (int, float)):
+                    metrics.setdefault(f"{stage}.action.{field}", []).append(value)
+    return metrics
+
+
+def summarize(records, quantiles=(50, 90, 99), include_templates=False):
+    """计算各阶段耗时的分位数
+
+    Returns:
+        list: [(指标名称, 样本数, [各分位数], 最大值), ...]，按指标名称排序
+    """
+    rows = []
+    for name, values in sorted(collect_metrics(records).items()):
+        if ".template." in name and not include_templates:
+            continue
+        data = np.asarray(values, dtype=np.float64)
+        rows.append((name, len(data), list(np.percentile(data, quantiles)), float(data.max())))
+    return rows
+
+
+def main():
+    """遥测查询命令行：输出各阶段耗时的分位数"""
+    parser = argparse.ArgumentParser(description="统计遥测文件中各阶段耗时的分位数")
+    parser.add_argument("path", nargs="?", default=TELEMETRY_FILE, help="遥测文件（JSONL）")
+    parser.add_argument("--stage", choices=["detect", "control"], help="只统计指定阶段")
+    parser.add_argument("--templates", action="store_true", help="同时列出每个模板的匹配耗时")
+    parser.add_argument("--percentiles", default="50,90,99", help="要计算的分位数，逗号分隔")
+    parser.add_argument("--since", type=float, default=None, help="只统计最近多少秒内的记录")
+    args = parser.parse_args()
+
+    quantiles = [float(q) for q in args.percentiles.split(",") if q.strip()]
+    try:
+        records = load_records(args.path, args.stage)
+    except OSError as e:
+        print(f"无法读取遥测文件: {e}")
+        return 1
+    if args.since is not None:
+        cutoff = time.time() - args.since
+        records = [record for record in records if record.get("ts", 0) >= cutoff]
+    if not records:
+        print("没有符合条件的遥测记录")
+        return 1
+
+    counts = {}
+    for record in records:
+        counts[record.get("stage", "?")] = counts.get(record.get("stage", "?"), 0) + 1
+    print("记录数: " + ", ".join(f"{stage} {count}" for stage, count in sorted(counts.items())))
+
+    rows = summarize(records, quantiles, include_templates=args.templates)
+    width = max([len("指标")] + [len(row[0]) for row in rows])
+    header = "".join(f"{'p' + format(q, 'g'):>10}" for q in quantiles)
+    # 中文表头在终端中占两倍宽度
+    print(f"{'指标':<{width - 2}}{'样本':>6}{header}{'max':>10}")
+    for name, count, values, maximum in rows:
+        cells = "".join(f"{value:>10.2f}" for value in values)
+        print(f"{name:<{width}}{count:>8}{cells}{maximum:>10.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
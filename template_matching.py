@@ -0,0 +1,493 @@
+import threading
+import weakref
+import cv2
+import numpy as np
+
+
+def match_template_brute(image, template):
+    """全分辨率 TM_CCOEFF_NORMED 模板匹配（基准实现）
+
+    Returns:
+        tuple: (最大匹配值, 最佳匹配左上角坐标)；图像比模板小时返回(-1.0, None)
+    """
+    h, w = template.shape
+    if image.shape[0] < h or image.shape[1] < w:
+        return -1.0, None
+    result = cv2.matchTemplate(image, template, cv2.TM_CCOEFF_NORMED)
+    _, max_val, _, max_loc = cv2.minMaxLoc(result)
+    return max_val, max_loc
+
+
+def find_all_brute(image, template, threshold=0.85):
+    """全分辨率查找所有匹配度不低于阈值的位置（基准实现）
+
+    Returns:
+        list: [(匹配值, 左上角坐标), ...]，匹配值从高到低排列，互不重叠
+    """
+    h, w = template.shape
+    if image.shape[0] < h or image.shape[1] < w:
+        return []
+    result = cv2.matchTemplate(image, template, cv2.TM_CCOEFF_NORMED)
+    return collect_peaks(result, template.shape, threshold)
+
+
+def collect_peaks(result, template_shape, threshold, limit=None):
+    """在匹配结果中依次取不低于阈值的峰值，与已找到位置重叠的位置不再参与（会修改result）
+
+    Returns:
+        list: [(匹配值, 左上角坐标), ...]，匹配值从高到低，互不重叠
+    """
+    h, w = template_shape
+    matches = []
+    while limit is None or len(matches) < limit:
+        _, max_val, _, max_loc = cv2.minMaxLoc(result)
+        if max_val < threshold:
+            break
+        matches.append((max_val, max_loc))
+        # 在结果中标记与已找到位置重叠的所有位置（左上方向也包括），避免重复匹配
+        cv2.rectangle(result, (max_loc[0] - w + 1, max_loc[1] - h + 1),
+                      (max_loc[0] + w - 1, max_loc[1] + h - 1), (-1), -1)
+    return matches
+
+
+class PyramidImage:
+    """一帧图像及其降采样金字塔，同一帧匹配多个模板时只需构建一次"""
+
+    def __init__(self, image, levels):
+        self.image = image
+        self.levels = [image]
+        for _ in range(levels):
+            previous = self.levels[-1]
+            if min(previous.shape) < 2:
+                break
+            self.levels.append(cv2.resize(
+                previous, (previous.shape[1] // 2, previous.shape[0] // 2),
+                interpolation=cv2.INTER_AREA))
+
+    def level(self, index):
+        """获取第index层（0为原图），层数不足时返回None"""
+        if index < len(self.levels):
+            return self.levels[index]
+        return None
+
+
+class PyramidMatcher:
+    """由粗到细的金字塔模板匹配引擎
+
+    先在降采样后的屏幕与模板上找到候选峰值，再只在原分辨率下对候选位置附近的小窗口
+    做精确的 TM_CCOEFF_NORMED 匹配。返回的匹配值始终是原分辨率下的精确分数，
+    因此 0.85 等阈值的语义与全分辨率匹配保持一致。模板过小或搜索区域本身很小时
+    自动退回全分辨率匹配。
+    """
+
+    def __init__(self, max_levels=2, min_template_size=12, candidate_count=3,
+                 coarse_margin=0.2, min_search_ratio=16):
+        """初始化金字塔匹配引擎
+
+        Args:
+            max_levels: 最大降采样层数（每层缩小2倍）
+            min_template_size: 粗匹配层模板的最小边长（像素），决定实际可用层数
+            candidate_count: 粗匹配阶段保留的候选峰值数量
+            coarse_margin: 粗匹配候选阈值相对最终阈值的放宽量
+            min_search_ratio: 搜索区域面积小于模板面积的该倍数时直接全分辨率匹配
+        """
+        self.max_levels = max_levels
+        self.min_template_size = min_template_size
+        self.candidate_count = candidate_count
+        self.coarse_margin = coarse_margin
+        self.min_search_ratio = min_search_ratio
+        self._template_pyramids = {}  # key为id(template)，value为(模板弱引用, 各层模板列表)
+
+    def prepare(self, image):
+        """为一帧图像构建金字塔，供多次locate/find_all复用"""
+        if isinstance(image, PyramidImage):
+            return image
+        return PyramidImage(image, self.max_levels)
+
+    def _template_levels(self, template):
+        """获取模板的各层降采样结果（按模板对象缓存）"""
+        key = id(template)
+        cached = self._template_pyramids.get(key)
+        if cached is not None and cached[0]() is template:
+            return cached[1]
+        levels = [template]
+        while len(levels) <= self.max_levels:
+            previous = levels[-1]
+            if min(previous.shape) // 2 < self.min_template_size:
+                break
+            levels.append(cv2.resize(
+                previous, (previous.shape[1] // 2, previous.shape[0] // 2),
+                interpolation=cv2.INTER_AREA))
+        try:
+            ref = weakref.ref(template, lambda _, key=key: self._template_pyramids.pop(key, None))
+        except TypeError:
+            return levels
+        self._template_pyramids[key] = (ref, levels)
+        return levels
+
+    def _select_level(self, pyramid, template):
+        """选择可用的最粗层，返回(层序号, 该层屏幕, 该层模板)；不适合金字塔时返回None"""
+        image = pyramid.image
+        h, w = template.shape
+        if image.shape[0] * image.shape[1] < h * w * self.min_search_ratio:
+            return None
+        template_levels = self._template_levels(template)
+        for index in range(len(template_levels) - 1, 0, -1):
+            image_level = pyramid.level(index)
+            template_level = template_levels[index]
+            if image_level is None:
+                continue
+            if (image_level.shape[0] >= template_level.shape[0]
+                    and image_level.shape[1] >= template_level.shape[1]):
+                return index, image_level, template_level
+        return None
+
+    def _coarse_candidates(self, image_level, template_level, min_score, limit):
+        """在粗层结果上依次取峰值并抑制邻域，返回候选左上角坐标（粗层坐标）"""
+        result = cv2.matchTemplate(image_level, template_level, cv2.TM_CCOEFF_NORMED)
+        th, tw = template_level.shape
+        candidates = []
+        while len(candidates) < limit:
+            _, max_val, _, max_loc = cv2.minMaxLoc(result)
+            # 至少保留一个候选，保证返回的最佳分数与全分辨率结果可比
+            if candidates and max_val < min_score:
+                break
+            candidates.append(max_loc)
+            x0 = max(0, max_loc[0] - tw // 2)
+            y0 = max(0, max_loc[1] - th // 2)
+            result[y0:max_loc[1] + th // 2 + 1, x0:max_loc[0] + tw // 2 + 1] = -1
+        return candidates
+
+    def _refine(self, image, template, coarse_loc, scale):
+        """在原分辨率下对候选位置附近的窗口做精确匹配"""
+        h, w = template.shape
+        radius = scale * 2
+        x0 = max(0, coarse_loc[0] * scale - radius)
+        y0 = max(0, coarse_loc[1] * scale - radius)
+        x1 = min(image.shape[1], coarse_loc[0] * scale + radius + w)
+        y1 = min(image.shape[0], coarse_loc[1] * scale + radius + h)
+        max_val, max_loc = match_template_brute(image[y0:y1, x0:x1], template)
+        if max_loc is None:
+            return -1.0, None
+        return max_val, (x0 + max_loc[0], y0 + max_loc[1])
+
+    def locate(self, image, template, threshold=0.85):
+        """查找模板的最佳匹配
+
+        Args:
+            image: 屏幕灰度图或prepare()返回的PyramidImage
+            template: 模板灰度图
+            threshold: 最终匹配阈值，用于确定粗匹配候选阈值
+
+        Returns:
+            tuple: (最大匹配值, 最佳匹配左上角坐标)；无法匹配时返回(-1.0, None)
+        """
+        pyramid = self.prepare(image)
+        selected = self._select_level(pyramid, template)
+        if selected is None:
+            return match_template_brute(pyramid.image, template)
+        index, image_level, template_level = selected
+        candidates = self._coarse_candidates(
+            image_level, template_level, threshold - self.coarse_margin, self.candidate_count)
+        best_val, best_loc = -1.0, None
+        for coarse_loc in candidates:
+            max_val, max_loc = self._refine(pyramid.image, template, coarse_loc, 2 ** index)
+            if max_loc is not None and max_val > best_val:
+                best_val, best_loc = max_val, max_loc
+        return best_val, best_loc
+
+    def find_all(self, image, template, threshold=0.85, limit=64):
+        """查找所有匹配度不低于阈值的位置
+
+        Returns:
+            list: [(匹配值, 左上角坐标), ...]，按匹配值从高到低排列，互不重叠
+        """
+        pyramid = self.prepare(image)
+        selected = self._select_level(pyramid, template)
+        if selected is None:
+            return find_all_brute(pyramid.image, template, threshold)
+        index, image_level, template_level = selected
+        candidates = self._coarse_candidates(
+            image_level, template_level, threshold - self.coarse_margin, limit)
+        refined = []
+        for coarse_loc in candidates:
+            max_val, max_loc = self._refine(pyramid.image, template, coarse_loc, 2 ** index)
+            if max_loc is not None and max_val >= threshold:
+                refined.append((max_val, max_loc))
+        # 与全分辨率实现一致：按分数从高到低保留，与已保留匹配重叠的结果丢弃
+        h, w = template.shape
+        refined.sort(key=lambda item: item[0], reverse=True)
+        matches = []
+        for max_val, max_loc in refined:
+            overlapped = any(abs(max_loc[0] - loc[0]) < w and abs(max_loc[1] - loc[1]) < h
+                             for _, loc in matches)
+            if not overlapped:
+                matches.append((max_val, max_loc))
+        return matches
+
+
+class SpectrumImage:
+    """一帧图像及其频谱和窗口统计量，同一帧匹配多个模板时只需计算一次
+
+    频谱（减去全局均值后补零到最优DFT尺寸的float32 DFT）在第一次使用时计算；
+    每种模板尺寸对应的窗口统计量也只计算一次。可被多个匹配线程同时读取。
+    """
+
+    def __init__(self, image):
+        self.image = image
+        self._lock = threading.Lock()
+        self.fft_shape = (cv2.getOptimalDFTSize(image.shape[0]), cv2.getOptimalDFTSize(image.shape[1]))
+        self._spectrum = None
+        self._inverse_std = {}  # (模板高, 模板宽) -> 各窗口偏差平方和的平方根倒数（平坦窗口为0）
+
+    def spectrum(self):
+        """图像的DFT（CCS压缩格式）"""
+        if self._spectrum is None:
+            with self._lock:
+                if self._spectrum is None:
+                    padded = np.zeros(self.fft_shape, dtype=np.float32)
+                    height, width = self.image.shape[:2]
+                    # 减去全局均值缩小数值范围，与去均值模板的互相关不受影响
+                    np.subtract(self.image, np.float32(self.image.mean()), out=padded[:height, :width],
+                                casting="unsafe")
+                    self._spectrum = cv2.dft(padded)
+        return self._spectrum
+
+    def inverse_std(self, template_shape):
+        """每个模板大小窗口的偏差平方和的平方根倒数（float32），灰度平坦的窗口为0"""
+        cached = self._inverse_std.get(template_shape)
+        if cached is not None:
+            return cached
+        h, w = template_shape
+        rows, cols = self.image.shape[0] - h + 1, self.image.shape[1] - w + 1
+        count = h * w
+        # 窗口和与平方和用盒式滤波（滑动求和）计算，结果不超过int32范围时为精确整数；
+        # 超过时改用float64输入（uint8输入的sqrBoxFilter内部按int32累加，即使输出为CV_64F也会溢出）
+        if count * 255 * 255 < 2 ** 31:
+            image, depth = self.image, cv2.CV_32S
+        else:
+            image, depth = self.image.astype(np.float64), cv2.CV_64F
+        window_sum = cv2.boxFilter(image, depth, (w, h), anchor=(0, 0), normalize=False,
+                                   borderType=cv2.BORDER_CONSTANT)[:rows, :cols]
+        window_squares = cv2.sqrBoxFilter(image, depth, (w, h), anchor=(0, 0), normalize=False,
+                                          borderType=cv2.BORDER_CONSTANT)[:rows, :cols]
+        # 窗口内偏离均值的平方和：平方和 - 和² / 像素数
+        deviation = cv2.subtract(window_squares, cv2.multiply(window_sum, window_sum, scale=1.0 / count,
+                                                               dtype=cv2.CV_64F), dtype=cv2.CV_64F)
+        deviation = deviation.astype(np.float32)
+        # 偏差平方和不足1个灰度级的窗口视为平坦，分数为0（与OpenCV一致）
+        _, textured = cv2.threshold(deviation, 0.5, 1.0, cv2.THRESH_BINARY)
+        result = cv2.multiply(cv2.pow(cv2.max(deviation, 0.5), -0.5), textured)
+        with self._lock:
+            self._inverse_std[template_shape] = result
+        return result
+
+
+class FFTMatcher:
+    """基于频域互相关的多模板匹配引擎
+
+    每帧只计算一次屏幕的DFT，每个模板只需与这份共享频谱相乘并做一次逆变换，
+    再乘以窗口标准差的倒数（同一帧中相同尺寸的模板共用），得到与cv2.matchTemplate(TM_CCOEFF_NORMED)相同的分数
+    （float32误差范围内）。cv2.matchTemplate对每个模板都要重新变换屏幕并计算窗口统计量，
+    模板越多、屏幕越大，共享的部分越划算。模板频谱按(模板对象, 频谱尺寸)缓存。
+    直接传入的小图像（ROI、变化区域等裁剪区域）没有可共享的频谱，退回空间域的cv2.matchTemplate。
+    """
+
+    def __init__(self):
+        self._template_spectra = {}  # key为id(template)，value为(模板弱引用, {频谱尺寸: (模板频谱, 去均值后的范数)})
+
+    def prepare(self, image):
+        """为一帧图像创建共享频谱的SpectrumImage，供多次locate/find_all复用"""
+        if isinstance(image, SpectrumImage):
+            return image
+        return SpectrumImage(getattr(image, "image", image))
+
+    def _template_spectrum(self, template, fft_shape):
+        """获取去均值模板在指定尺寸下的频谱和范数（按模板对象缓存）"""
+        key = id(template)
+        cached = self._template_spectra.get(key)
+        if cached is None or cached[0]() is not template:
+            try:
+                ref = weakref.ref(template, lambda _, key=key: self._template_spectra.pop(key, None))
+            except TypeError:
+                ref = None
+            cached = (ref, {})
+            if ref is not None:
+                self._template_spectra[key] = cached
+        spectra = cached[1]
+        entry = spectra.get(fft_shape)
+        if entry is None:
+            h, w = template.shape
+            centered = template.astype(np.float64)
+            centered -= centered.mean()
+            padded = np.zeros(fft_shape, dtype=np.float32)
+            padded[:h, :w] = centered
+            entry = (cv2.dft(padded, nonzeroRows=h), float(np.sqrt((centered * centered).sum())))
+            spectra[fft_shape] = entry
+        return entry
+
+    def score_map(self, image, template):
+        """计算完整的匹配分数图（与cv2.matchTemplate的TM_CCOEFF_NORMED结果形状相同），图像比模板小时返回None"""
+        prepared = self.prepare(image)
+        height, width = prepared.image.shape[:2]
+        h, w = template.shape
+        if h > height or w > width:
+            return None
+        spectrum, norm = self._template_spectrum(template, prepared.fft_shape)
+        if norm == 0:
+            # 纯色模板没有可比较的结构
+            return np.zeros((height - h + 1, width - w + 1), dtype=np.float32)
+        # 模板只在有效区域内移动，循环互相关的前rows行、cols列不会发生卷绕
+        product = cv2.mulSpectrums(prepared.spectrum(), spectrum, 0, conjB=True)
+        rows, cols = height - h + 1, width - w + 1
+        correlation = cv2.idft(product, flags=cv2.DFT_REAL_OUTPUT | cv2.DFT_SCALE)
+        inverse_std = prepared.inverse_std((h, w))
+        scores = cv2.multiply(correlation[:rows, :cols], inverse_std, scale=1.0 / norm)
+        np.clip(scores, -1.0, 1.0, out=scores)
+        return scores
+
+    def locate(self, image, template, threshold=0.85):
+        """查找模板的最佳匹配
+
+        Args:
+            image: 屏幕灰度图或prepare()返回的SpectrumImage
+            template: 模板灰度图
+            threshold: 与PyramidMatcher保持相同的接口，不影响结果
+
+        Returns:
+            tuple: (最大匹配值, 最佳匹配左上角坐标)；无法匹配时返回(-1.0, None)
+        """
+        if not isinstance(image, SpectrumImage):
+            return match_template_brute(getattr(image, "image", image), template)
+        scores = self.score_map(image, template)
+        if scores is None:
+            return -1.0, None
+        _, max_val, _, max_loc = cv2.minMaxLoc(scores)
+        return max_val, max_loc
+
+    def locate_many(self, image, templates, threshold=0.85):
+        """用同一份屏幕频谱查找多个模板的最佳匹配，返回与templates一一对应的[(最大匹配值, 左上角坐标), ...]"""
+        prepared = self.prepare(image)
+        return [self.locate(prepared, template, threshold) for template in templates]
+
+    def find_all(self, image, template, threshold=0.85, limit=64):
+        """查找所有匹配度不低于阈值的位置
+
+        Returns:
+            list: [(匹配值, 左上角坐标), ...]，按匹配值从高到低排列，互不重叠
+        """
+        if not isinstance(image, SpectrumImage):
+            return find_all_brute(getattr(image, "image", image), template, threshold)[:limit]
+        scores = self.score_map(image, template)
+        if scores is None:
+            return []
+        return collect_peaks(scores, template.shape, threshold, limit)
+
+
+if __name__ == "__main__":
+    # 一致性自检：金字塔匹配、频域匹配的locate()和find_all()必须与全分辨率实现一致，
+    # 包括模板与屏幕同样大小、模板比屏幕大的边界情况；任何不一致都以非零状态退出
+    import glob
+    import os
+    import sys
+    import time
+
+    base_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "img")
+    template_paths = sorted(glob.glob(os.path.join(base_dir, "*", "*.*"))
+                            + glob.glob(os.path.join(base_dir, "test", "*", "*.*")))
+    templates = [(os.path.relpath(path, base_dir), cv2.imread(path, cv2.IMREAD_GRAYSCALE))
+                 for path in template_paths]
+    templates = [(name, image) for name, image in templates if image is not None]
+
+    failures = []
+
+    def check(condition, message):
+        """记录一项检查结果，失败时打印原因"""
+        if not condition:
+            failures.append(message)
+            print(f"失败: {message}")
+
+    def same_locate(expected, actual, tolerance):
+        """两个locate()结果是否一致：同为无法匹配，或分数相差不超过tolerance且高于阈值时位置相同"""
+        (expected_val, expected_loc), (actual_val, actual_loc) = expected, actual
+        if expected_loc is None or actual_loc is None:
+            return expected_loc is None and actual_loc is None
+        if expected_val >= 0.85 and expected_loc != actual_loc:
+            return False
+        return tolerance is None or abs(expected_val - actual_val) <= tolerance
+
+    def same_matches(expected, actual):
+        """两个find_all()结果是否找到了相同的位置"""
+        return sorted(loc for _, loc in expected) == sorted(loc for _, loc in actual)
+
+    check(len(templates) >= 4, f"{base_dir} 下可用的模板不足4张")
+
+    rng = np.random.default_rng(0)
+    matcher = PyramidMatcher()
+    fft_matcher = FFTMatcher()
+    brute_time = pyramid_time = fft_time = 0.0
+    for trial in range(5 if len(templates) >= 4 else 0):
+        screen = cv2.GaussianBlur((rng.random((1080, 1920)) * 60 + 90).astype(np.uint8), (0, 0), 4)
+        placed = rng.choice(len(templates), size=4, replace=False)
+        # 前三个位置各放一张模板，第四个位置再放一次第一张模板，用于检查find_all()找到全部匹配
+        for slot, template_index in enumerate(list(placed[:3]) + [placed[0]]):
+            template = templates[template_index][1]
+            h, w = template.shape
+            x = int(rng.integers(slot * 460, slot * 460 + 460 - w))
+            y = int(rng.integers(0, 1080 - h))
+            screen[y:y + h, x:x + w] = template
+        screen = cv2.GaussianBlur(screen, (3, 3), 0)
+        prepared = matcher.prepare(screen)
+        fft_prepared = fft_matcher.prepare(screen)
+        started = time.perf_counter()
+        fft_results = fft_matcher.locate_many(fft_prepared, [template for _, template in templates])
+        fft_time += time.perf_counter() - started
+        for (name, template), fft_result in zip(templates, fft_results):
+            started = time.perf_counter()
+            brute_result = match_template_brute(screen, template)
+            brute_time += time.perf_counter() - started
+            started = time.perf_counter()
+            pyramid_result = matcher.locate(prepared, template)
+            pyramid_time += time.perf_counter() - started
+            check(same_locate(brute_result, pyramid_result, None) and
+                  (brute_result[0] >= 0.85) == (pyramid_result[0] >= 0.85),
+                  f"locate 金字塔与全分辨率不一致: {name} {pyramid_result} != {brute_result}")
+            check(same_locate(brute_result, fft_result, 1e-3),
+                  f"locate 频域与全分辨率不一致: {name} {fft_result} != {brute_result}")
+        # 模糊后个别低对比度模板的分数略低于0.85，find_all()的检查使用0.8的阈值保证放置的模板都能找到
+        for template_index in placed[:3]:
+            name, template = templates[template_index]
+            expected = find_all_brute(screen, template, 0.8)
+            check(len(expected) >= 1, f"find_all_brute 没有找到放置的模板: {name}")
+            check(same_matches(expected, matcher.find_all(prepared, template, 0.8)),
+                  f"find_all 金字塔与全分辨率不一致: {name}")
+            check(same_matches(expected, fft_matcher.find_all(fft_prepared, template, 0.8)),
+                  f"find_all 频域与全分辨率不一致: {name}")
+
+    # 边界情况：模板与屏幕同样大小时只有(0, 0)一个位置，模板比屏幕大时无法匹配
+    screen = cv2.GaussianBlur((rng.random((1080, 1920)) * 255).astype(np.uint8), (0, 0), 2)
+    for label, image in (("1080p", screen), ("小屏幕", screen[:90, :160].copy())):
+        template = image.copy()
+        for matcher_name, engine in (("金字塔", matcher), ("频域", fft_matcher)):
+            max_val, max_loc = engine.locate(engine.prepare(image), template)
+            check(max_loc == (0, 0) and max_val > 0.99,
+                  f"{matcher_name} locate 同尺寸模板（{label}）: {max_val}@{max_loc}")
+            matches = engine.find_all(engine.prepare(image), template)
+            check(same_matches(find_all_brute(image, template), matches) and len(matches) == 1,
+                  f"{matcher_name} find_all 同尺寸模板（{label}）: {matches}")
+            for larger in (image[:-1], image[:, :-1]):
+                larger = larger.copy()
+                check(engine.locate(engine.prepare(larger), template) == (-1.0, None),
+                      f"{matcher_name} locate 模板比屏幕大（{label} {larger.shape}）应无法匹配")
+                check(engine.find_all(engine.prepare(larger), template) == [],
+                      f"{matcher_name} find_all 模板比屏幕大（{label} {larger.shape}）应没有结果")
+        check(match_template_brute(image[:-1].copy(), template) == (-1.0, None) and
+              find_all_brute(image[:, :-1].copy(), template) == [],
+              f"全分辨率实现 模板比屏幕大（{label}）应无法匹配")
+
+    print(f"全分辨率匹配耗时: {brute_time * 1000:.0f}ms，金字塔匹配耗时: {pyramid_time * 1000:.0f}ms，"
+          f"频域批量匹配耗时: {fft_time * 1000:.0f}ms")
+    if failures:
+        print(f"自检失败: {len(failures)} 项不一致")
+        sys.exit(1)
+    print("自检通过")
@@ -0,0 +1,102 @@
+import os
+import threading
+import time
+import cv2
+
+from scale_calibration import scale_template
+
+
+class TemplateRegistry:
+    """模板图片注册表
+
+    按逻辑名称（如 "join"、"return"，或直接使用图片路径）缓存已解码的灰度模板，
+    以及按显示缩放比例预处理后的副本，避免控制循环中反复读取和解码 PNG。
+    通过文件修改时间（mtime）判断缓存是否失效，mtime 检查按 check_interval 节流。
+    """
+
+    def __init__(self, check_interval=1.0):
+        """初始化模板注册表
+
+        Args:
+            check_interval: 同一模板两次检查文件修改时间的最小间隔（秒）
+        """
+        self.check_interval = check_interval
+        self._paths = {}  # 逻辑名称 -> 图片路径
+        self._entries = {}  # 逻辑名称 -> {"mtime", "checked_at", "template", "scaled"}
+        self._lock = threading.Lock()
+
+    def register(self, name, path):
+        """注册逻辑名称对应的图片路径，路径变化时清除旧缓存"""
+        with self._lock:
+            if self._paths.get(name) != path:
+                self._paths[name] = path
+                self._entries.pop(name, None)
+
+    def preload(self):
+        """加载所有已注册的模板（启动时调用）"""
+        for name in list(self._paths):
+            self.get(name)
+
+    def get_path(self, name):
+        """获取逻辑名称对应的图片路径；未注册时按路径本身处理"""
+        return self._paths.get(name, name)
+
+    def exists(self, name):
+        """模板图片是否存在且可以解码"""
+        return self.get(name) is not None
+
+    def invalidate(self, name=None):
+        """使指定模板（或全部模板）的缓存失效"""
+        with self._lock:
+            if name is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(name, None)
+
+    def get(self, name, scale=1.0):
+        """获取模板灰度图
+
+        Args:
+            name: 逻辑名称；未注册的名称视为图片路径并自动注册
+            scale: 显示缩放比例，返回按该比例预处理后的模板
+
+        Returns:
+            numpy.ndarray: 模板灰度图；文件不存在或无法解码时返回None
+        """
+        if name not in self._paths:
+            self.register(name, name)
+        path = self._paths[name]
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None and now - entry["checked_at"] < self.check_interval:
+                return self._scaled(entry, scale)
+
+        # 检查文件修改时间，未变化时继续使用缓存
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            with self._lock:
+                self._entries.pop(name, None)
+            return None
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None and entry["mtime"] == mtime:
+                entry["checked_at"] = now
+                return self._scaled(entry, scale)
+
+        template = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+        if template is None:
+            return None
+        entry = {"mtime": mtime, "checked_at": now, "template": template, "scaled": {}}
+        with self._lock:
+            self._entries[name] = entry
+            return self._scaled(entry, scale)
+
+    def _scaled(self, entry, scale):
+        """获取按缩放比例预处理后的模板（每个比例只缩放一次）"""
+        scaled = entry["scaled"].get(scale)
+        if scaled is None:
+            scaled = scale_template(entry["template"], scale)
+            entry["scaled"][scale] = scaled
+        return scaled
@@ -0,0 +1,157 @@
+import bisect
+import datetime
+
+# 课程表中使用的星期名称，下标与datetime.weekday()一致
+DAY_NAMES = ("周一", "周二", "周三", "周四", "周五", "周六", "周日")
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+
+
+def day_name(moment):
+    """获取指定时间的星期名称，例如"周一" """
+    return DAY_NAMES[moment.weekday()]
+
+
+def parse_hhmm(text):
+    """把"HH:MM"转换为当天的分钟数，格式错误时返回None"""
+    try:
+        hours, minutes = text.strip().split(":")[:2]
+        value = int(hours) * 60 + int(minutes)
+    except (AttributeError, ValueError):
+        return None
+    if not 0 <= value < MINUTES_PER_DAY:
+        return None
+    return value
+
+
+def minute_of_week(moment):
+    """指定时间在一周中的分钟序号（周一00:00为0）"""
+    return moment.weekday() * MINUTES_PER_DAY + moment.hour * 60 + moment.minute
+
+
+class Timetable:
+    """不可变的周课表索引
+
+    每节课转换为一周内的分钟区间[开始, 结束]（与原来按"HH:MM"字符串比较一致，结束的那一分钟仍算上课），
+    按开始和结束时间分别排好序，查询当前、上一节、下一节课和距下一节课的时间都用二分查找完成。
+    课程变化时由CourseManager重新构建，图形界面和控制逻辑共用同一个实例。
+    """
+
+    def __init__(self, courses):
+        """
+        Args:
+            courses: 课程字典列表（day、start_time、end_time等字段），时间格式错误的课程被忽略
+        """
+        intervals = []
+        for course in courses:
+            if course.get("day") not in DAY_NAMES:
+                continue
+            start = parse_hhmm(course.get("start_time", ""))
+            end = parse_hhmm(course.get("end_time", ""))
+            if start is None or end is None or end < start:
+                continue
+            offset = DAY_NAMES.index(course["day"]) * MINUTES_PER_DAY
+            intervals.append((offset + start, offset + end, course))
+
+        # 按开始时间排序；同一时间开始的课程保持原来的顺序
+        intervals.sort(key=lambda interval: interval[0])
+        self._starts = [interval[0] for interval in intervals]
+        self._ends = [interval[1] for interval in intervals]
+        self._courses = tuple(interval[2] for interval in intervals)
+        # 开始时间不晚于第i节的课程中最晚的结束时间，用于快速排除"没有课程在进行"的情况
+        self._max_end = []
+        latest = -1
+        for end in self._ends:
+            latest = max(latest, end)
+            self._max_end.append(latest)
+        # 按结束时间排序的索引（查询上一节课）
+        self._end_order = sorted(range(len(intervals)), key=lambda i: self._ends[i])
+        self._sorted_ends = [self._ends[i] for i in self._end_order]
+        # 每天的课程（按开始时间排序）
+        self._by_day = {name: [] for name in DAY_NAMES}
+        for course in self._courses:
+            self._by_day[course["day"]].append(course)
+        self._by_day = {name: tuple(courses) for name, courses in self._by_day.items()}
+
+    def __len__(self):
+        return len(self._courses)
+
+    def courses_on(self, day):
+        """指定星期（"周一"等）的所有课程，按开始时间排序"""
+        return self._by_day.get(day, ())
+
+    def current_course(self, moment=None):
+        """指定时间正在进行的课程（有重叠时返回开始最晚的一节），没有时返回None"""
+        t = minute_of_week(moment or datetime.datetime.now())
+        i = bisect.bisect_right(self._starts, t) - 1
+        if i < 0 or self._max_end[i] < t:
+            return None
+        # 只有课程时间重叠时才需要向前查找
+        while i >= 0:
+            if self._ends[i] >= t:
+                return self._courses[i]
+            i -= 1
+        return None
+
+    def next_course(self, moment=None, same_day=True):
+        """指定时间之后最早开始的课程
+
+        Args:
+            moment: 查询时间，None表示当前时间
+            same_day: 只在当天查找；False时跨天（一周循环）查找
+
+        Returns:
+            dict: 课程；没有时返回None
+        """
+        if not self._courses:
+            return None
+        t = minute_of_week(moment or datetime.datetime.now())
+        i = bisect.bisect_right(self._starts, t)
+        if i == len(self._starts):
+            if same_day:
+                return None
+            i = 0  # 回到下周一
+        if same_day and self._starts[i] // MINUTES_PER_DAY != t // MINUTES_PER_DAY:
+            return None
+        return self._courses[i]
+
+    def previous_course(self, moment=None, same_day=True):
+        """指定时间之前最晚结束的课程
+
+        Args:
+            moment: 查询时间，None表示当前时间
+            same_day: 只在当天查找；False时跨天（一周循环）查找
+        """
+        if not self._courses:
+            return None
+        t = minute_of_week(moment or datetime.datetime.now())
+        i = bisect.bisect_left(self._sorted_ends, t) - 1
+        if i < 0:
+            if same_day:
+                return None
+            i = len(self._sorted_ends) - 1  # 上周日
+        if same_day and self._sorted_ends[i] // MINUTES_PER_DAY != t // MINUTES_PER_DAY:
+            return None
+        return self._courses[self._end_order[i]]
+
+    def minutes_until_next(self, moment=None):
+        """距下一节课开始还有多少分钟（跨天、一周循环），没有课程时返回None"""
+        if not self._courses:
+            return None
+        t = minute_of_week(moment or datetime.datetime.now())
+        i = bisect.bisect_right(self._starts, t)
+        if i == len(self._starts):
+            return self._starts[0] + MINUTES_PER_WEEK - t
+        return self._starts[i] - t
+
+    def status(self, moment=None):
+        """当前时间分类
+
+        Returns:
+            tuple: ("上课时间", 当前课程) 或 ("课间时间", (当天上一节课, 当天下一节课))
+        """
+        moment = moment or datetime.datetime.now()
+        current = self.current_course(moment)
+        if current is not None:
+            return "上课时间", current
+        return "课间时间", (self.previous_course(moment), self.next_course(moment))